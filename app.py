@@ -1,9 +1,54 @@
-from flask import Flask, jsonify, request, render_template_string, redirect
+from flask import Flask, Response, abort, jsonify, request, redirect, url_for, g, has_app_context, has_request_context, stream_with_context
 import os
+import threading
+import time
 import psycopg2
-from azure.storage.blob import BlobServiceClient
+import psycopg2.extensions
+import psycopg2.extras
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobBlock, BlobSasPermissions, BlobServiceClient, generate_blob_sas
+from markupsafe import Markup
+from werkzeug.utils import secure_filename
 import datetime
 import json
+import base64
+import click
+import concurrent.futures
+import csv
+import gzip
+import io
+import requests
+import requests.adapters
+import uuid
+import hashlib
+import random
+
+import collections
+import contextlib
+import functools
+import itertools
+import math
+import queue
+import re
+import select
+import prometheus_client
+from prometheus_client import multiprocess
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    from opentelemetry import context as otel_context, propagate as otel_propagate, trace as otel_trace
+except ImportError:
+    otel_trace = None
 
 # Charger les variables d'environnement depuis le fichier .env si présent
 def load_env_file():
@@ -28,96 +73,1595 @@ DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_NAME = os.getenv('DB_NAME', 'sbeldb')
 DB_USER = os.getenv('DB_USER', 'dbadmin')
 DB_PASS = os.getenv('DB_PASS', 'SecurePass123!')
+DB_PORT = int(os.getenv('DB_PORT', '5432'))
+DB_SSLMODE = os.getenv('DB_SSLMODE', 'require')
+
+# Configuration du pool de connexions (durées en secondes)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_MAX_AGE = float(os.getenv('DB_POOL_MAX_AGE', '1800'))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_CHECK_IDLE = float(os.getenv('DB_POOL_CHECK_IDLE', '30'))
 
 # Configuration pour Azure Storage
 STORAGE_ACCOUNT_NAME = os.getenv('STORAGE_ACCOUNT_NAME', 'sbelstorage')
 STORAGE_ACCOUNT_KEY = os.getenv('STORAGE_ACCOUNT_KEY', '')
+# Chaîne de connexion complète (ex. Azurite : UseDevelopmentStorage=true), prioritaire sur la clé
+STORAGE_CONNECTION_STRING = os.getenv('STORAGE_CONNECTION_STRING', '')
 CONTAINER_NAME = os.getenv('CONTAINER_NAME', 'staticfiles')
 
-# Connexion à la DB
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS,
-            port=5432,
-            sslmode='require'
-        )
+# Métriques Prometheus (/metrics) : latence par route et par requête SQL
+# (empreinte normalisée), connexions, appels Blob Storage et lignes lues.
+# Sous gunicorn, PROMETHEUS_MULTIPROC_DIR agrège les workers (gunicorn.conf.py).
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+
+def register_metric(kind, name, *args, **kwargs):
+    # Nouvel import de app.py dans le même processus (rechargement HUP du
+    # master gunicorn) : remplacer le collecteur enregistré sous ce nom au
+    # lieu d'échouer sur un doublon dans le registre
+    previous = prometheus_client.REGISTRY._names_to_collectors.get(name)
+    if previous is not None:
+        prometheus_client.REGISTRY.unregister(previous)
+    return kind(name, *args, **kwargs)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_SECONDS = register_metric(prometheus_client.Histogram,
+    'todolist_http_request_duration_seconds', 'Durée des requêtes HTTP',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+DB_QUERY_SECONDS = register_metric(prometheus_client.Histogram,
+    'todolist_db_query_duration_seconds', 'Durée des requêtes SQL par empreinte',
+    ['fingerprint'], buckets=LATENCY_BUCKETS)
+DB_QUERY_INFO = register_metric(prometheus_client.Gauge,
+    'todolist_db_query_info', 'Texte normalisé de chaque empreinte SQL',
+    ['fingerprint', 'statement'], multiprocess_mode='max')
+DB_SLOW_QUERIES = register_metric(prometheus_client.Counter,
+    'todolist_db_slow_queries', 'Requêtes SQL plus longues que SLOW_QUERY_MS', ['fingerprint'])
+DB_CONNECT_SECONDS = register_metric(prometheus_client.Histogram,
+    'todolist_db_connect_duration_seconds', "Ouverture d'une connexion PostgreSQL", buckets=LATENCY_BUCKETS)
+DB_CHECKOUT_SECONDS = register_metric(prometheus_client.Histogram,
+    'todolist_db_checkout_duration_seconds', "Emprunt d'une connexion au pool (attente, vérification ou connexion)",
+    buckets=LATENCY_BUCKETS)
+DB_ROWS_PER_REQUEST = register_metric(prometheus_client.Histogram,
+    'todolist_db_rows_per_request', 'Lignes lues en base par requête HTTP',
+    ['route'], buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000))
+DB_RETRIES = register_metric(prometheus_client.Counter,
+    'todolist_db_retries', 'Transactions rejouées après une erreur transitoire', ['error'])
+DB_READ_CHECKOUTS = register_metric(prometheus_client.Counter,
+    'todolist_db_read_checkouts', 'Connexions empruntées par les routes en lecture, par serveur', ['server'])
+DB_REPLICA_LAG = register_metric(prometheus_client.Gauge,
+    'todolist_db_replica_lag_seconds', 'Retard de réplication mesuré par réplique',
+    ['replica'], multiprocess_mode='max')
+HTTP_SHED_REQUESTS = register_metric(prometheus_client.Counter,
+    'todolist_http_shed_requests', 'Requêtes refusées par limitation de débit ou de concurrence', ['reason'])
+DB_HANDLERS_ACTIVE = register_metric(prometheus_client.Gauge,
+    'todolist_db_handlers_active', 'Requêtes en cours sur les routes en base', multiprocess_mode='livesum')
+DB_HANDLERS_QUEUED = register_metric(prometheus_client.Gauge,
+    'todolist_db_handlers_queued', "Requêtes en attente d'une place sur les routes en base", multiprocess_mode='livesum')
+JOB_SECONDS = register_metric(prometheus_client.Histogram,
+    'todolist_job_duration_seconds', "Durée d'exécution des travaux de fond",
+    ['kind', 'status'], buckets=LATENCY_BUCKETS + (30, 60, 300, 900))
+BLOB_REQUEST_SECONDS = register_metric(prometheus_client.Histogram,
+    'todolist_blob_request_duration_seconds', 'Durée des appels Blob Storage',
+    ['operation', 'status'], buckets=LATENCY_BUCKETS)
+
+# Traces OpenTelemetry si le module est installé (exportées selon la
+# configuration du SDK, sinon sans effet)
+tracer = otel_trace.get_tracer('todolist') if otel_trace else None
+
+def trace_span(name, **attributes):
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+def add_request_timing(name, elapsed):
+    if has_app_context():
+        setattr(g, name, g.get(name, 0.0) + elapsed)
+
+SQL_LITERALS = re.compile(r"(?:\bE)?'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s|\b(?:NULL|TRUE|FALSE)\b", re.IGNORECASE)
+SQL_VALUE_LISTS = re.compile(r'\(\?(?:\s*,\s*\?)*\)(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))+')
+
+# Empreinte d'une requête : littéraux et paramètres remplacés par ?, listes
+# VALUES d'execute_values réduites, pour regrouper les exécutions d'un même texte
+@functools.lru_cache(maxsize=1024)
+def sql_fingerprint(query):
+    statement = ' '.join(SQL_LITERALS.sub('?', query).split())
+    statement = SQL_VALUE_LISTS.sub('(?), ...', statement)
+    return hashlib.sha1(statement.encode()).hexdigest()[:12], statement
+
+_known_fingerprints = set()
+
+def record_query(fingerprint, statement, elapsed):
+    if fingerprint not in _known_fingerprints:
+        _known_fingerprints.add(fingerprint)
+        DB_QUERY_INFO.labels(fingerprint, statement[:200]).set(1)
+    DB_QUERY_SECONDS.labels(fingerprint).observe(elapsed)
+    if has_app_context():
+        g.db_time = g.get('db_time', 0.0) + elapsed
+        g.db_queries = g.get('db_queries', 0) + 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.labels(fingerprint).inc()
+        print(f"Requête lente ({elapsed * 1000:.1f} ms) [{fingerprint}]: {statement[:500]}")
+
+# Requêtes fréquentes préparées côté serveur (PREPARE puis EXECUTE) une fois
+# par connexion du pool : PostgreSQL n'analyse plus leur texte à chaque appel
+# et peut réutiliser un plan générique. PREPARED_STATEMENTS=0 derrière un
+# pooler en mode transaction (PgBouncer), qui ne garde pas la session.
+PREPARED_STATEMENTS = os.getenv('PREPARED_STATEMENTS', '1') == '1'
+PREPARED_MAX_PER_CONNECTION = int(os.getenv('PREPARED_MAX_PER_CONNECTION', '100'))
+
+def positional_query(sql):
+    # Paramètres psycopg2 (%s) vers $1, $2, ... (PREPARE, asyncpg)
+    parts = sql.replace('%%', '\0').split('%s')
+    query = parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], 1))
+    return query.replace('\0', '%')
+
+# Curseur chronométré : chaque execute est mesuré et rattaché à son empreinte,
+# les lignes lues sont comptées pour la requête HTTP en cours
+class InstrumentedCursorMixin:
+    def _timed(self, method, query, *args):
+        text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        fingerprint, statement = sql_fingerprint(text)
+        start = time.perf_counter()
+        try:
+            with trace_span('db.query', **{'db.system': 'postgresql', 'db.statement': statement}):
+                return method(query, *args)
+        finally:
+            record_query(fingerprint, statement, time.perf_counter() - start)
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(super().copy_expert, sql, file, size)
+
+    def execute_prepared(self, query, vars=()):
+        # Paramètres positionnels (%s) seulement ; requête préparée par son texte
+        prepared = getattr(self.connection, '_prepared', None)
+        if not PREPARED_STATEMENTS or prepared is None:
+            return self.execute(query, vars)
+        name = prepared.get(query)
+        if name is None:
+            name = 'todolist_' + hashlib.sha1(query.encode()).hexdigest()[:16]
+            self.execute(f'PREPARE {name} AS {positional_query(query)}')
+            prepared[query] = name
+            if len(prepared) > PREPARED_MAX_PER_CONNECTION:
+                _, oldest = prepared.popitem(last=False)
+                self.execute(f'DEALLOCATE {oldest}')
+        else:
+            prepared.move_to_end(query)
+        statement = f"EXECUTE {name} ({', '.join(['%s'] * len(vars))})" if vars else f'EXECUTE {name}'
+        execute = super().execute
+        # Mesures et traces rangées sous le texte de la requête, pas sous EXECUTE
+        return self._timed(lambda _, args: execute(statement, args), query, vars or None)
+
+    def _count_rows(self, count):
+        if count and has_app_context():
+            g.db_rows = g.get('db_rows', 0) + count
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count_rows(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count_rows(len(rows))
+        return rows
+
+_instrumented_cursors = {}
+
+def instrumented_cursor_class(factory):
+    if factory not in _instrumented_cursors:
+        _instrumented_cursors[factory] = type(f'Instrumented{factory.__name__}', (InstrumentedCursorMixin, factory), {})
+    return _instrumented_cursors[factory]
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Connexion psycopg2 dont close() rend la connexion au pool au lieu de la
+# fermer : les routes continuent d'appeler conn.close() comme avant.
+class PooledConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._created_at = time.monotonic()
+        self._last_used = self._created_at
+        self._checked_out = False
+        # Texte SQL -> nom de la requête préparée sur cette session
+        self._prepared = collections.OrderedDict()
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = instrumented_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._checked_out:
+            self._pool.putconn(self)
+
+    def _close_physical(self):
+        self._pool = None
+        try:
+            super().close()
+        except Exception:
+            pass
+
+
+class DBConnectionPool:
+    def __init__(self, minconn, maxconn, timeout, max_age, max_idle, check_idle, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+        self.conn_kwargs = conn_kwargs
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._pid = os.getpid()
+        self._orphans = []
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+        }
+
+    def _connect(self):
+        start = time.perf_counter()
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.conn_kwargs)
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start)
+        conn._pool = self
+        with self._cond:
+            self._stats['created'] += 1
         return conn
+
+    def _discard(self, conn):
+        conn._close_physical()
+        with self._cond:
+            self._size -= 1
+            self._stats['closed'] += 1
+            self._cond.notify()
+
+    def _expired(self, conn, now):
+        if conn.closed:
+            return True
+        if self.max_age and now - conn._created_at > self.max_age:
+            return True
+        # Les connexions au-delà du minimum sont recyclées après inactivité
+        if self.max_idle and now - conn._last_used > self.max_idle and self._size > self.minconn:
+            return True
+        return False
+
+    def _healthy(self, conn, now):
+        if self.check_idle and now - conn._last_used < self.check_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def getconn(self):
+        self._check_fork()
+        deadline = time.monotonic() + self.timeout
+        waited = None
+        while True:
+            conn = None
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    if waited is None:
+                        waited = time.monotonic()
+                        self._stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        self._stats['wait_time_total'] += time.monotonic() - waited
+                        raise PoolTimeout(f"aucune connexion libre après {self.timeout}s")
+                    self._cond.wait(remaining)
+                if waited is not None:
+                    wait_time = time.monotonic() - waited
+                    self._stats['wait_time_total'] += wait_time
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+                    waited = None
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    # Réserver la place avant de se connecter hors du verrou
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._expired(conn, now) or not self._healthy(conn, now):
+                    self._discard(conn)
+                    continue
+
+            conn._checked_out = True
+            with self._cond:
+                self._stats['checkouts'] += 1
+            return conn
+
+    def putconn(self, conn):
+        conn._checked_out = False
+        if os.getpid() != self._pid:
+            return
+        try:
+            if not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            pass
+        now = time.monotonic()
+        conn._last_used = now
+        if conn.closed or (self.max_age and now - conn._created_at > self.max_age):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def warm(self):
+        conns = []
+        try:
+            while self._size < self.minconn:
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+
+    def _reset_after_fork(self):
+        # Les sockets hérités appartiennent au processus parent : on garde une
+        # référence pour qu'ils ne soient jamais fermés (un PQfinish côté
+        # enfant enverrait un Terminate sur la session du parent).
+        self._orphans.extend(self._idle)
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        for key in self._stats:
+            self._stats[key] = 0
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return dict(self._stats,
+                        size=self._size,
+                        idle=idle,
+                        in_use=self._size - idle,
+                        min=self.minconn,
+                        max=self.maxconn)
+
+
+db_pool = DBConnectionPool(
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+    DB_POOL_MAX_AGE, DB_POOL_MAX_IDLE, DB_POOL_CHECK_IDLE,
+    host=DB_HOST,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASS,
+    port=DB_PORT,
+    sslmode=DB_SSLMODE
+)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=db_pool._reset_after_fork)
+
+# Répliques en lecture (DB_READ_HOSTS=hote1,hote2:5433) : les routes en
+# lecture seule empruntent une connexion à une réplique, sauf pour un client
+# qui vient d'écrire (il relit ses écritures sur le primaire) et sauf réplique
+# trop en retard, écartée jusqu'à ce qu'elle ait rattrapé le primaire
+DB_READ_HOSTS = [host.strip() for host in os.getenv('DB_READ_HOSTS', '').split(',') if host.strip()]
+DB_READ_STRATEGY = os.getenv('DB_READ_STRATEGY', 'least-loaded')
+DB_READ_MAX_LAG = float(os.getenv('DB_READ_MAX_LAG', '5'))
+DB_READ_CHECK_INTERVAL = float(os.getenv('DB_READ_CHECK_INTERVAL', '1'))
+# Au moins le retard toléré plus l'intervalle de mesure
+DB_READ_STICKY_SECONDS = float(os.getenv('DB_READ_STICKY_SECONDS', str(DB_READ_MAX_LAG + DB_READ_CHECK_INTERVAL)))
+READ_PRIMARY_COOKIE = 'todolist_read_primary'
+
+# Retard nul si tout le WAL reçu est rejoué et que la réception est active
+# (primaire inactif : l'horodatage de la dernière transaction vieillit seul)
+REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END
+'''
+
+class ReadReplica:
+    def __init__(self, address):
+        host, _, port = address.partition(':')
+        self.name = address
+        self.pool = DBConnectionPool(
+            DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+            DB_POOL_MAX_AGE, DB_POOL_MAX_IDLE, DB_POOL_CHECK_IDLE,
+            **dict(db_pool.conn_kwargs, host=host, port=int(port or DB_PORT))
+        )
+        # Hors rotation tant que le retard n'a pas été mesuré
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+
+    def mark(self, healthy, error=None):
+        if healthy != self.healthy:
+            print(f"Réplique {self.name} {'remise en rotation' if healthy else 'écartée'}"
+                  f"{f' ({error})' if error else ''}")
+        self.healthy = healthy
+        self.error = error
+        self.checked_at = datetime.datetime.now().isoformat()
+
+    def check(self):
+        try:
+            conn = self.pool.getconn()
+            try:
+                cur = conn.cursor()
+                cur.execute(REPLICA_LAG_QUERY)
+                self.lag = float(cur.fetchone()[0])
+                cur.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            self.lag = None
+            self.mark(False, ' '.join(str(e).split())[:200])
+            return
+        DB_REPLICA_LAG.labels(self.name).set(self.lag)
+        if self.lag > DB_READ_MAX_LAG:
+            self.mark(False, f'retard de {self.lag:.1f} s')
+        else:
+            self.mark(True)
+
+    def stats(self):
+        return {
+            'healthy': self.healthy,
+            'lag_seconds': self.lag,
+            'error': self.error,
+            'checked_at': self.checked_at,
+            'pool': self.pool.stats(),
+        }
+
+read_replicas = [ReadReplica(address) for address in DB_READ_HOSTS]
+_read_replica_turn = itertools.count()
+
+if hasattr(os, 'register_at_fork'):
+    for replica in read_replicas:
+        os.register_at_fork(after_in_child=replica.pool._reset_after_fork)
+
+def recent_writer():
+    # Client ayant écrit il y a moins de DB_READ_STICKY_SECONDS (cookie posé
+    # par stick_to_primary_after_write)
+    if not read_replicas or not has_request_context():
+        return False
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def choose_read_replica():
+    if recent_writer():
+        return None
+    candidates = [replica for replica in read_replicas if replica.healthy]
+    if not candidates:
+        return None
+    # Départ décalé à chaque appel : à tour de rôle, ou à charge égale
+    turn = next(_read_replica_turn) % len(candidates)
+    candidates = candidates[turn:] + candidates[:turn]
+    if DB_READ_STRATEGY == 'round-robin':
+        return candidates[0]
+    return min(candidates, key=lambda replica: replica.pool.stats()['in_use'])
+
+# Connexion à la DB (empruntée au pool, rendue par conn.close()). read_only :
+# route en lecture seule, servie par une réplique si possible
+def checkout_db_connection(read_only=False):
+    start = time.perf_counter()
+    replica = choose_read_replica() if read_only else None
+    conn = None
+    if replica is not None:
+        try:
+            conn = replica.pool.getconn()
+        except PoolTimeout:
+            pass
+        except Exception as e:
+            replica.mark(False, ' '.join(str(e).split())[:200])
+    if conn is None:
+        conn = db_pool.getconn()
+    if read_only:
+        DB_READ_CHECKOUTS.labels(replica.name if conn._pool is not db_pool else 'primary').inc()
+    elapsed = time.perf_counter() - start
+    DB_CHECKOUT_SECONDS.observe(elapsed)
+    add_request_timing('db_checkout_time', elapsed)
+    if has_app_context():
+        g.setdefault('db_conns', []).append(conn)
+    return conn
+
+def get_db_connection(read_only=False):
+    try:
+        return checkout_db_connection(read_only)
     except Exception as e:
         print(f"Erreur de connexion DB: {e}")
         return None
 
+# Transactions d'écriture rejouées après une erreur transitoire (connexion
+# perdue, conflit de sérialisation, interblocage), avec une attente
+# exponentielle bornée et aléatoire pour ne pas synchroniser les reprises
+DB_RETRY_ATTEMPTS = max(int(os.getenv('DB_RETRY_ATTEMPTS', '3')), 1)
+DB_RETRY_BASE_DELAY = float(os.getenv('DB_RETRY_BASE_DELAY', '0.05'))
+DB_RETRY_MAX_DELAY = float(os.getenv('DB_RETRY_MAX_DELAY', '1'))
+TRANSIENT_PGCODES = {'40001', '40P01'}
+
+def is_transient_error(e):
+    # Délai d'exécution dépassé : rejouer la requête ne ferait que recommencer
+    if isinstance(e, psycopg2.extensions.QueryCanceledError):
+        return False
+    return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) or e.pgcode in TRANSIENT_PGCODES
+
+def run_transaction(work, retry_commit=False):
+    # work(cur) exécute les requêtes ; le commit est fait ici. Une erreur
+    # pendant le commit laisse l'issue inconnue : la transaction n'est rejouée
+    # que si elle est idempotente (retry_commit)
+    delay = DB_RETRY_BASE_DELAY
+    for attempt in range(1, DB_RETRY_ATTEMPTS + 1):
+        conn = None
+        committing = False
+        try:
+            conn = checkout_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            result = work(cur)
+            committing = True
+            conn.commit()
+            cur.close()
+            return result
+        except psycopg2.Error as e:
+            if attempt == DB_RETRY_ATTEMPTS or not is_transient_error(e) or (committing and not retry_commit):
+                raise
+            DB_RETRIES.labels(type(e).__name__).inc()
+            print(f"Erreur transitoire ({' '.join(str(e).split())}), tentative {attempt + 1}/{DB_RETRY_ATTEMPTS}")
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(random.uniform(delay / 2, delay))
+        delay = min(delay * 2, DB_RETRY_MAX_DELAY)
+
+# Rendre au pool les connexions oubliées par une route (exception avant close())
+@app.teardown_appcontext
+def release_db_connections(exc):
+    for conn in g.pop('db_conns', []):
+        if conn._checked_out:
+            conn.close()
+
+# Mesures par requête HTTP ; enregistré avant compress_response pour que la
+# durée mesurée inclue la compression
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    if tracer is not None:
+        route = request.url_rule.rule if request.url_rule else request.path
+        span = tracer.start_span(f'{request.method} {route}', kind=otel_trace.SpanKind.SERVER,
+                                 context=otel_propagate.extract(request.headers),
+                                 attributes={'http.method': request.method, 'http.route': route})
+        g.otel_span = span
+        g.otel_token = otel_context.attach(otel_trace.set_span_in_context(span))
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(elapsed)
+    DB_ROWS_PER_REQUEST.labels(route).observe(g.get('db_rows', 0))
+    # Répartition visible dans l'onglet réseau du navigateur
+    timings = [
+        f"db-checkout;dur={g.get('db_checkout_time', 0.0) * 1000:.1f}",
+        f"db;dur={g.get('db_time', 0.0) * 1000:.1f};desc=\"{g.get('db_queries', 0)} SQL\"",
+        f"blob;dur={g.get('blob_time', 0.0) * 1000:.1f}",
+        f"total;dur={elapsed * 1000:.1f}",
+    ]
+    response.headers['Server-Timing'] = ', '.join(timings)
+    span = g.get('otel_span')
+    if span is not None:
+        span.set_attribute('http.status_code', response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_span(exc):
+    span = g.pop('otel_span', None)
+    if span is not None:
+        if exc is not None:
+            span.record_exception(exc)
+        span.end()
+        otel_context.detach(g.pop('otel_token'))
+
+# Threads de fond démarrés au premier appel de chaque processus (les threads
+# ne survivent pas au fork : un worker relance les siens)
+BACKGROUND_THREADS = {}
+_background_threads_pid = None
+_background_threads_lock = threading.Lock()
+
+def register_background_thread(name, target):
+    BACKGROUND_THREADS[name] = target
+
+@app.before_request
+def start_background_threads():
+    global _background_threads_pid
+    if _background_threads_pid == os.getpid():
+        return
+    with _background_threads_lock:
+        if _background_threads_pid != os.getpid():
+            _background_threads_pid = os.getpid()
+            for name, target in BACKGROUND_THREADS.items():
+                threading.Thread(target=target, name=name, daemon=True).start()
+
+# Répliques en lecture : mesure du retard, et lecture de ses propres écritures
+# sur le primaire pendant DB_READ_STICKY_SECONDS après une écriture réussie
+def replica_monitor_loop():
+    while True:
+        for replica in read_replicas:
+            replica.check()
+        time.sleep(DB_READ_CHECK_INTERVAL)
+
+@app.after_request
+def stick_to_primary_after_write(response):
+    if read_replicas and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        response.set_cookie(READ_PRIMARY_COOKIE, f'{time.time() + DB_READ_STICKY_SECONDS:.3f}',
+                            max_age=int(DB_READ_STICKY_SECONDS) + 1, httponly=True, samesite='Lax')
+    return response
+
+if read_replicas:
+    register_background_thread('replica-monitor', replica_monitor_loop)
+
+# Cache en lecture (catégories, statistiques, première page des tâches) :
+# LRU/TTL en mémoire ou Redis si CACHE_REDIS_URL est défini. Les écritures
+# invalident localement et préviennent les autres workers par NOTIFY.
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', '1') == '1'
+CACHE_TTL = float(os.getenv('CACHE_TTL', '30'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+CACHE_CHANNEL = 'todolist_cache'
+CACHE_NAMESPACES = ('tasks', 'categories')
+
+
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._entries[(namespace, key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[entry_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    # Clés préfixées par une génération par namespace : invalider = INCR
+    def __init__(self, url, ttl, prefix='todolist:cache:'):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def _key(self, namespace, key):
+        generation = int(self.client.get(f'{self.prefix}gen:{namespace}') or 0)
+        return f'{self.prefix}{namespace}:{generation}:{key}'
+
+    def get(self, namespace, key):
+        raw = self.client.get(self._key(namespace, key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, namespace, key, value):
+        self.client.set(self._key(namespace, key), json.dumps(value, default=str), ex=max(int(self.ttl), 1))
+
+    def invalidate(self, namespace):
+        self.client.incr(f'{self.prefix}gen:{namespace}')
+
+    def clear(self):
+        for namespace in CACHE_NAMESPACES:
+            self.invalidate(namespace)
+
+    def size(self):
+        return None
+
+
+def create_cache():
+    if not CACHE_ENABLED:
+        return None
+    if CACHE_REDIS_URL:
+        if redis is None:
+            print("CACHE_REDIS_URL défini mais le module redis n'est pas installé, cache en mémoire")
+        else:
+            return RedisCache(CACHE_REDIS_URL, CACHE_TTL)
+    return TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+app_cache = create_cache()
+cache_counters = {namespace: {'hits': 0, 'misses': 0} for namespace in CACHE_NAMESPACES}
+
+def cache_get(namespace, key):
+    # Un client qui vient d'écrire relit le primaire, pas une entrée qu'une
+    # autre requête a pu remplir depuis une réplique en retard
+    if app_cache is None or recent_writer():
+        return None
+    try:
+        value = app_cache.get(namespace, key)
+    except Exception as e:
+        print(f"Erreur de lecture du cache: {e}")
+        value = None
+    cache_counters[namespace]['hits' if value is not None else 'misses'] += 1
+    return value
+
+def cache_set(namespace, key, value):
+    if app_cache is None or value is None:
+        return
+    try:
+        app_cache.set(namespace, key, value)
+    except Exception as e:
+        print(f"Erreur d'écriture du cache: {e}")
+
+def invalidate_local_cache(*namespaces):
+    if app_cache is None:
+        return
+    try:
+        for namespace in namespaces:
+            app_cache.invalidate(namespace)
+    except Exception as e:
+        print(f"Erreur d'invalidation du cache: {e}")
+
+def invalidate_cache(cur, *namespaces):
+    # À appeler avant le commit : la notification part avec la transaction
+    invalidate_local_cache(*namespaces)
+    for namespace in namespaces:
+        cur.execute('SELECT pg_notify(%s, %s)', (CACHE_CHANNEL, namespace))
+
+def cache_stats():
+    return {
+        'backend': type(app_cache).__name__ if app_cache else None,
+        'entries': app_cache.size() if app_cache else 0,
+        'evictions': app_cache.evictions if app_cache else 0,
+        'namespaces': cache_counters,
+    }
+
+def cache_listener_loop():
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**db_pool.conn_kwargs)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f'LISTEN {CACHE_CHANNEL}')
+            # Des notifications ont pu être perdues avant l'écoute
+            invalidate_local_cache(*CACHE_NAMESPACES)
+            # Avec des répliques, seconde invalidation une fois le retard
+            # toléré écoulé : une entrée remplie entre-temps depuis une
+            # réplique qui n'avait pas encore l'écriture ne survit pas
+            deferred = {}
+            while True:
+                now = time.monotonic()
+                for namespace, due in list(deferred.items()):
+                    if due <= now:
+                        del deferred[namespace]
+                        invalidate_local_cache(namespace)
+                timeout = min([60] + [due - now for due in deferred.values()])
+                if select.select([conn], [], [], max(timeout, 0)) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    if notify.payload in CACHE_NAMESPACES:
+                        invalidate_local_cache(notify.payload)
+                        if read_replicas:
+                            deferred[notify.payload] = time.monotonic() + DB_READ_MAX_LAG + DB_READ_CHECK_INTERVAL
+        except Exception as e:
+            print(f"Écoute des invalidations du cache interrompue: {e}")
+            invalidate_local_cache(*CACHE_NAMESPACES)
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+if app_cache is not None:
+    register_background_thread('cache-listener', cache_listener_loop)
+
+# Protection de PostgreSQL contre les rafales : seau à jetons par client (en
+# mémoire par processus, ou Redis partagé entre workers et instances), puis
+# nombre borné de requêtes simultanées sur les routes en base, avec une courte
+# file d'attente. Au-delà, refus immédiat 429/503 avec Retry-After plutôt
+# qu'une attente sur le pool jusqu'à épuiser max_connections.
+RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', '20'))
+RATE_LIMIT_BURST = max(float(os.getenv('RATE_LIMIT_BURST', str(RATE_LIMIT_RATE * 2))), 1)
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '10000'))
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', CACHE_REDIS_URL)
+# Seaux en mémoire : un par processus, débit et rafale partagés entre les
+# workers (nombre fixé par gunicorn.conf.py, ou WEB_CONCURRENCY sous uvicorn)
+RATE_LIMIT_WORKERS = max(int(os.getenv('RATE_LIMIT_WORKERS') or os.getenv('WEB_CONCURRENCY') or '1'), 1)
+# Derrière un proxy : en-tête portant l'adresse du client (X-Forwarded-For)
+RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER', '')
+DB_CONCURRENCY_LIMIT = int(os.getenv('DB_CONCURRENCY_LIMIT', str(DB_POOL_MAX)))
+DB_QUEUE_MAX = int(os.getenv('DB_QUEUE_MAX', str(DB_CONCURRENCY_LIMIT * 2)))
+DB_QUEUE_TIMEOUT = float(os.getenv('DB_QUEUE_TIMEOUT', '1'))
+# Sondes, métriques et ressources statiques ne sont jamais limitées ; le flux
+# SSE, long et sans connexion dédiée, est borné par EVENTS_MAX_STREAMS
+SHEDDING_EXEMPT_ENDPOINTS = {'health_check', 'metrics', 'static_asset'}
+CONCURRENCY_EXEMPT_ENDPOINTS = SHEDDING_EXEMPT_ENDPOINTS | {'api_task_events'}
+
+
+class TokenBuckets:
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        # 0 si un jeton est pris, sinon le délai avant le prochain jeton
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def size(self):
+        return len(self._buckets)
+
+
+class RedisTokenBuckets:
+    # Recharge et prélèvement atomiques côté Redis, sur l'horloge du serveur
+    # Redis commune à toutes les instances
+    SCRIPT = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url, rate, burst, prefix='todolist:ratelimit:'):
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+
+    def take(self, client):
+        return float(self.script(keys=[self.prefix + client], args=[self.rate, self.burst]))
+
+    def size(self):
+        return None
+
+
+def create_rate_limiter():
+    if RATE_LIMIT_RATE <= 0:
+        return None
+    if RATE_LIMIT_REDIS_URL:
+        if redis is None:
+            print("RATE_LIMIT_REDIS_URL défini mais le module redis n'est pas installé, limitation en mémoire")
+        else:
+            return RedisTokenBuckets(RATE_LIMIT_REDIS_URL, RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+    return TokenBuckets(RATE_LIMIT_RATE / RATE_LIMIT_WORKERS, max(RATE_LIMIT_BURST / RATE_LIMIT_WORKERS, 1),
+                        RATE_LIMIT_MAX_CLIENTS)
+
+
+# Places et file d'attente ; semaphore : threading (Flask) ou asyncio
+# (app_async.py, qui redéfinit acquire)
+class ConcurrencyLimiter:
+    def __init__(self, limit, queue_max, timeout, semaphore=threading.BoundedSemaphore):
+        self.limit = limit
+        self.queue_max = queue_max
+        self.timeout = timeout
+        self.slots = semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def enter_queue(self):
+        with self._lock:
+            if self.waiting >= self.queue_max:
+                return False
+            self.waiting += 1
+        DB_HANDLERS_QUEUED.inc()
+        return True
+
+    def leave_queue(self):
+        with self._lock:
+            self.waiting -= 1
+        DB_HANDLERS_QUEUED.dec()
+
+    def admitted(self):
+        with self._lock:
+            self.active += 1
+        DB_HANDLERS_ACTIVE.inc()
+
+    def acquire(self):
+        # None si une place est obtenue, sinon la raison du refus
+        if not self.slots.acquire(blocking=False):
+            if not self.enter_queue():
+                return 'queue_full'
+            try:
+                acquired = self.slots.acquire(timeout=self.timeout)
+            finally:
+                self.leave_queue()
+            if not acquired:
+                return 'queue_timeout'
+        self.admitted()
+        return None
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        DB_HANDLERS_ACTIVE.dec()
+        self.slots.release()
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'waiting': self.waiting, 'queue_max': self.queue_max}
+
+
+rate_limiter = create_rate_limiter()
+db_limiter = ConcurrencyLimiter(DB_CONCURRENCY_LIMIT, DB_QUEUE_MAX, DB_QUEUE_TIMEOUT) if DB_CONCURRENCY_LIMIT > 0 else None
+
+def rate_limit_client(remote_addr, headers):
+    if RATE_LIMIT_CLIENT_HEADER:
+        # Dernière adresse de la liste : celle ajoutée par le proxy de confiance
+        forwarded = headers.get(RATE_LIMIT_CLIENT_HEADER, '').split(',')[-1].strip()
+        if forwarded:
+            return forwarded
+    return remote_addr or 'unknown'
+
+def take_rate_limit_token(client):
+    # Redis indisponible : la requête passe plutôt que de couper le service
+    try:
+        return rate_limiter.take(client)
+    except Exception as e:
+        print(f"Erreur de limitation de débit: {e}")
+        return 0.0
+
+def retry_after(seconds):
+    return str(max(math.ceil(seconds), 1))
+
+def shed_response(status, reason, message, wait):
+    HTTP_SHED_REQUESTS.labels(reason).inc()
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = retry_after(wait)
+    return response
+
+def load_shedding_stats():
+    return {
+        'rate_limit': {
+            'backend': type(rate_limiter).__name__ if rate_limiter else None,
+            'rate': RATE_LIMIT_RATE,
+            'burst': RATE_LIMIT_BURST,
+            'workers': RATE_LIMIT_WORKERS if isinstance(rate_limiter, TokenBuckets) else None,
+            'clients': rate_limiter.size() if rate_limiter else 0,
+        },
+        'db_handlers': db_limiter.stats() if db_limiter else None,
+    }
+
+@app.before_request
+def shed_excess_load():
+    if request.endpoint in SHEDDING_EXEMPT_ENDPOINTS:
+        return None
+    if rate_limiter is not None:
+        wait = take_rate_limit_token(rate_limit_client(request.remote_addr, request.headers))
+        if wait > 0:
+            return shed_response(429, 'rate_limit', 'Trop de requêtes, réessayez plus tard', wait)
+    if db_limiter is None or request.endpoint is None or request.endpoint in CONCURRENCY_EXEMPT_ENDPOINTS:
+        return None
+    reason = db_limiter.acquire()
+    if reason is not None:
+        return shed_response(503, reason, 'Serveur surchargé, réessayez plus tard', DB_QUEUE_TIMEOUT)
+    g.db_slot = True
+
+# Après la fin de la réponse (y compris un export en flux)
+@app.teardown_request
+def release_db_slot(exc):
+    if g.pop('db_slot', False):
+        db_limiter.release()
+
+# Statistiques matérialisées (migration 8) : compteurs tenus à jour par trigger
+# à chaque écriture sur tasks, et sur tasks_archive depuis la migration 12. Par
+# table : colonnes clés, colonne compteur et agrégat complet sur {source},
+# utilisé pour la reconstruction et la vérification.
+TASK_STATS_TABLES = {
+    'task_stats': ('category_id, priority, status', 'task_count', '''
+        SELECT COALESCE(category_id, 0), COALESCE(priority, ''), COALESCE(status, ''), COUNT(*)
+        FROM {source} GROUP BY 1, 2, 3
+    '''),
+    'task_due_stats': ('due_date', 'open_count', '''
+        SELECT due_date, COUNT(*) FROM {source}
+        WHERE due_date IS NOT NULL AND status IS DISTINCT FROM 'completed' GROUP BY 1
+    '''),
+    'task_completion_stats': ('day', 'completed_count', '''
+        SELECT completed_at::date, COUNT(*) FROM {source}
+        WHERE completed_at IS NOT NULL GROUP BY 1
+    '''),
+}
+
+# Tâches actives et archivées : un archivage ne change pas les compteurs
+TASK_STATS_SOURCE = '''(
+    SELECT category_id, priority, status, due_date, completed_at FROM tasks
+    UNION ALL
+    SELECT category_id, priority, status, due_date, completed_at FROM tasks_archive
+) t'''
+
+def task_stats_rebuild_statements(source=TASK_STATS_SOURCE):
+    statements = []
+    for table, (keys, counter, expected) in TASK_STATS_TABLES.items():
+        statements.append(f'DELETE FROM {table}')
+        statements.append(f'INSERT INTO {table} ({keys}, {counter}) {expected.format(source=source)}')
+    return statements
+
+# Migrations du schéma : chaque version est appliquée une seule fois, dans
+# une transaction, et enregistrée dans schema_migrations
+MIGRATIONS = [
+    (1, 'Tables initiales et catégories par défaut', [
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            color VARCHAR(7) DEFAULT '#007bff',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(200) NOT NULL,
+            description TEXT,
+            category_id INTEGER REFERENCES categories(id),
+            priority VARCHAR(10) DEFAULT 'medium',
+            status VARCHAR(20) DEFAULT 'pending',
+            due_date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS task_files (
+            id SERIAL PRIMARY KEY,
+            task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+            filename VARCHAR(255) NOT NULL,
+            blob_url TEXT,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        INSERT INTO categories (name, color) VALUES 
+        ('Personnel', '#28a745'),
+        ('Travail', '#007bff'),
+        ('Urgent', '#dc3545'),
+        ('Projets', '#6f42c1')
+        ON CONFLICT (name) DO NOTHING
+        ''',
+    ]),
+    (2, 'Rang de priorité et index des requêtes de l\'application', [
+        '''
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS priority_rank SMALLINT
+        GENERATED ALWAYS AS (
+            CASE priority WHEN 'high' THEN 1 WHEN 'medium' THEN 2 WHEN 'low' THEN 3 ELSE 4 END
+        ) STORED
+        ''',
+        # Statistiques par statut et filtre status
+        'CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)',
+        # Tri du tableau de bord (priorité puis date) et pagination par curseur
+        'CREATE INDEX IF NOT EXISTS idx_tasks_priority_created ON tasks (priority_rank, created_at DESC, id DESC)',
+        # Tri de /api/tasks et pagination par curseur
+        'CREATE INDEX IF NOT EXISTS idx_tasks_created_id ON tasks (created_at DESC, id DESC)',
+        # Filtre et jointure sur la catégorie
+        'CREATE INDEX IF NOT EXISTS idx_tasks_category_id ON tasks (category_id)',
+        # Filtres due_date / due_before / due_after
+        'CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)',
+        # ON DELETE CASCADE depuis tasks
+        'CREATE INDEX IF NOT EXISTS idx_task_files_task_id ON task_files (task_id)',
+    ]),
+    (3, 'Index des exports incrémentaux', [
+        'CREATE INDEX IF NOT EXISTS idx_tasks_updated_id ON tasks (updated_at, id)',
+    ]),
+    (4, 'Pièces jointes dans Blob Storage', [
+        'ALTER TABLE task_files ADD COLUMN IF NOT EXISTS blob_name TEXT',
+        'ALTER TABLE task_files ADD COLUMN IF NOT EXISTS content_type VARCHAR(255)',
+        'ALTER TABLE task_files ADD COLUMN IF NOT EXISTS size_bytes BIGINT',
+        "ALTER TABLE task_files ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'uploaded'",
+    ]),
+    (5, 'Recherche plein texte sur les tâches', [
+        # Titre pondéré plus fort que la description (configuration SEARCH_CONFIG)
+        '''
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('french', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('french', coalesce(description, '')), 'B')
+        ) STORED
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN (search_vector)',
+    ]),
+    (6, 'Index de trigrammes pour la recherche approchée', [
+        # Sur Azure, azure.extensions doit autoriser PG_TRGM (main.tf). Sans
+        # l'extension, la migration passe et la recherche reste plein texte.
+        '''
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS idx_tasks_title_trgm ON tasks USING GIN (title gin_trgm_ops);
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'pg_trgm indisponible, recherche approchée désactivée: %', SQLERRM;
+        END
+        $$
+        ''',
+    ]),
+    (7, 'Notifications des modifications de tâches', [
+        # Une notification par instruction (et non par ligne) : [id, statut
+        # précédent, nouveau statut] des tâches modifiées, ou "reload" au-delà
+        # de 300 lignes (la charge utile d'un NOTIFY est limitée à 8000 octets)
+        '''
+        CREATE OR REPLACE FUNCTION notify_task_changes() RETURNS trigger AS $$
+        DECLARE
+            changes json;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT json_agg(json_build_array(id, NULL, status)) INTO changes
+                FROM (SELECT id, status FROM new_rows LIMIT 301) r;
+            ELSIF TG_OP = 'UPDATE' THEN
+                SELECT json_agg(json_build_array(id, previous_status, status)) INTO changes
+                FROM (SELECT n.id, o.status AS previous_status, n.status
+                      FROM new_rows n JOIN old_rows o ON o.id = n.id LIMIT 301) r;
+            ELSE
+                SELECT json_agg(json_build_array(id, status, NULL)) INTO changes
+                FROM (SELECT id, status FROM old_rows LIMIT 301) r;
+            END IF;
+            IF changes IS NULL THEN
+                RETURN NULL;
+            ELSIF json_array_length(changes) > 300 THEN
+                PERFORM pg_notify('todolist_tasks', json_build_object('op', 'reload')::text);
+            ELSE
+                PERFORM pg_notify('todolist_tasks', json_build_object('op', lower(TG_OP), 'tasks', changes)::text);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        # Une table de transition par trigger : un trigger par opération
+        'DROP TRIGGER IF EXISTS tasks_notify_insert ON tasks',
+        '''
+        CREATE TRIGGER tasks_notify_insert AFTER INSERT ON tasks
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_task_changes()
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_notify_update ON tasks',
+        '''
+        CREATE TRIGGER tasks_notify_update AFTER UPDATE ON tasks
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_task_changes()
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_notify_delete ON tasks',
+        '''
+        CREATE TRIGGER tasks_notify_delete AFTER DELETE ON tasks
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_task_changes()
+        ''',
+    ]),
+    (8, 'Statistiques matérialisées et date de complétion', [
+        'ALTER TABLE tasks ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP',
+        "UPDATE tasks SET completed_at = updated_at WHERE status = 'completed' AND completed_at IS NULL",
+        # completed_at suit le statut : date de la modification qui termine la
+        # tâche (updated_at, conservé par une restauration), effacée si elle
+        # est rouverte
+        '''
+        CREATE OR REPLACE FUNCTION set_task_completed_at() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.status IS DISTINCT FROM 'completed' THEN
+                NEW.completed_at := NULL;
+            ELSIF TG_OP = 'INSERT' THEN
+                NEW.completed_at := COALESCE(NEW.completed_at, NEW.updated_at, CURRENT_TIMESTAMP);
+            ELSIF OLD.status IS DISTINCT FROM 'completed' THEN
+                NEW.completed_at := CASE WHEN NEW.updated_at IS DISTINCT FROM OLD.updated_at
+                                         THEN NEW.updated_at ELSE CURRENT_TIMESTAMP END;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_completed_at ON tasks',
+        '''
+        CREATE TRIGGER tasks_completed_at BEFORE INSERT OR UPDATE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION set_task_completed_at()
+        ''',
+        # Sans catégorie : category_id 0 (colonnes clés non nulles)
+        '''
+        CREATE TABLE IF NOT EXISTS task_stats (
+            category_id INTEGER NOT NULL,
+            priority VARCHAR(10) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            task_count INTEGER NOT NULL,
+            PRIMARY KEY (category_id, priority, status)
+        )
+        ''',
+        # Tâches non terminées par échéance (retards : due_date < aujourd'hui)
+        '''
+        CREATE TABLE IF NOT EXISTS task_due_stats (
+            due_date DATE PRIMARY KEY,
+            open_count INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS task_completion_stats (
+            day DATE PRIMARY KEY,
+            completed_count INTEGER NOT NULL
+        )
+        ''',
+        # Une mise à jour des compteurs par instruction : lignes ajoutées (+1)
+        # et retirées (-1) regroupées par clé. ORDER BY : les verrous des
+        # compteurs sont toujours pris dans le même ordre (pas d'interblocage
+        # entre écritures concurrentes).
+        '''
+        CREATE OR REPLACE FUNCTION maintain_task_stats() RETURNS trigger AS $$
+        DECLARE
+            changes text;
+        BEGIN
+            changes := CASE TG_OP
+                WHEN 'INSERT' THEN
+                    'SELECT category_id, priority, status, due_date, completed_at, 1 AS delta FROM new_rows'
+                WHEN 'DELETE' THEN
+                    'SELECT category_id, priority, status, due_date, completed_at, -1 AS delta FROM old_rows'
+                ELSE
+                    'SELECT category_id, priority, status, due_date, completed_at, 1 AS delta FROM new_rows
+                     UNION ALL
+                     SELECT category_id, priority, status, due_date, completed_at, -1 FROM old_rows'
+            END;
+            EXECUTE format($sql$
+                INSERT INTO task_stats AS s (category_id, priority, status, task_count)
+                SELECT COALESCE(category_id, 0), COALESCE(priority, ''), COALESCE(status, ''), SUM(delta)
+                FROM (%s) c
+                GROUP BY 1, 2, 3 HAVING SUM(delta) <> 0 ORDER BY 1, 2, 3
+                ON CONFLICT (category_id, priority, status)
+                DO UPDATE SET task_count = s.task_count + EXCLUDED.task_count
+            $sql$, changes);
+            EXECUTE format($sql$
+                INSERT INTO task_due_stats AS s (due_date, open_count)
+                SELECT due_date, SUM(delta)
+                FROM (%s) c
+                WHERE due_date IS NOT NULL AND status IS DISTINCT FROM 'completed'
+                GROUP BY 1 HAVING SUM(delta) <> 0 ORDER BY 1
+                ON CONFLICT (due_date) DO UPDATE SET open_count = s.open_count + EXCLUDED.open_count
+            $sql$, changes);
+            EXECUTE format($sql$
+                INSERT INTO task_completion_stats AS s (day, completed_count)
+                SELECT completed_at::date, SUM(delta)
+                FROM (%s) c
+                WHERE completed_at IS NOT NULL
+                GROUP BY 1 HAVING SUM(delta) <> 0 ORDER BY 1
+                ON CONFLICT (day) DO UPDATE SET completed_count = s.completed_count + EXCLUDED.completed_count
+            $sql$, changes);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_stats_insert ON tasks',
+        '''
+        CREATE TRIGGER tasks_stats_insert AFTER INSERT ON tasks
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_task_stats()
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_stats_update ON tasks',
+        '''
+        CREATE TRIGGER tasks_stats_update AFTER UPDATE ON tasks
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_task_stats()
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_stats_delete ON tasks',
+        '''
+        CREATE TRIGGER tasks_stats_delete AFTER DELETE ON tasks
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_task_stats()
+        ''',
+        # Compteurs initiaux (tasks_archive n'existe pas encore)
+        *task_stats_rebuild_statements('tasks'),
+    ]),
+    (9, "Clés d'idempotence des écritures", [
+        '''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key VARCHAR(255) PRIMARY KEY,
+            request_hash CHAR(64) NOT NULL,
+            status_code INTEGER,
+            response TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at)',
+    ]),
+    (10, 'File de travaux de fond', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}',
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            result JSONB,
+            error TEXT,
+            dedupe_key VARCHAR(255),
+            run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''',
+        # Seuls les travaux en attente ou en cours sont parcourus par la réservation
+        "CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (run_at, id) WHERE status = 'queued'",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs (kind, locked_until) WHERE status = 'running'",
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe_key ON jobs (dedupe_key) WHERE dedupe_key IS NOT NULL',
+    ]),
+    (11, 'Archive partitionnée des tâches terminées', [
+        # Une partition par mois de complétion, créée à l'archivage ; la clé de
+        # partition fait partie de la clé primaire. Pas de clé étrangère vers
+        # categories : l'historique garde l'identifiant d'une catégorie supprimée.
+        '''
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER NOT NULL,
+            title VARCHAR(200) NOT NULL,
+            description TEXT,
+            category_id INTEGER,
+            priority VARCHAR(10),
+            status VARCHAR(20),
+            due_date DATE,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            completed_at TIMESTAMP NOT NULL,
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, completed_at)
+        ) PARTITION BY RANGE (completed_at)
+        ''',
+        # Pagination de /api/tasks?include_archived=1 (fusion avec idx_tasks_created_id)
+        'CREATE INDEX IF NOT EXISTS idx_tasks_archive_created_id ON tasks_archive (created_at DESC, id DESC)',
+        # Sauvegardes incrémentales
+        'CREATE INDEX IF NOT EXISTS idx_tasks_archive_archived_at ON tasks_archive (archived_at)',
+        # Tâches à archiver
+        "CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks (completed_at) WHERE status = 'completed'",
+    ]),
+    (12, 'Statistiques sur les tâches archivées', [
+        # Mise à jour des compteurs depuis une requête de deltas (category_id,
+        # priority, status, due_date, completed_at, delta) sur une table, pour
+        # la suppression des partitions d'archive. Mêmes instructions que
+        # maintain_task_stats, qui ne peut pas l'appeler : les tables de
+        # transition ne sont visibles que dans la fonction du trigger.
+        '''
+        CREATE OR REPLACE FUNCTION apply_task_stats(changes text) RETURNS void AS $$
+        BEGIN
+            EXECUTE format($sql$
+                INSERT INTO task_stats AS s (category_id, priority, status, task_count)
+                SELECT COALESCE(category_id, 0), COALESCE(priority, ''), COALESCE(status, ''), SUM(delta)
+                FROM (%s) c
+                GROUP BY 1, 2, 3 HAVING SUM(delta) <> 0 ORDER BY 1, 2, 3
+                ON CONFLICT (category_id, priority, status)
+                DO UPDATE SET task_count = s.task_count + EXCLUDED.task_count
+            $sql$, changes);
+            EXECUTE format($sql$
+                INSERT INTO task_due_stats AS s (due_date, open_count)
+                SELECT due_date, SUM(delta)
+                FROM (%s) c
+                WHERE due_date IS NOT NULL AND status IS DISTINCT FROM 'completed'
+                GROUP BY 1 HAVING SUM(delta) <> 0 ORDER BY 1
+                ON CONFLICT (due_date) DO UPDATE SET open_count = s.open_count + EXCLUDED.open_count
+            $sql$, changes);
+            EXECUTE format($sql$
+                INSERT INTO task_completion_stats AS s (day, completed_count)
+                SELECT completed_at::date, SUM(delta)
+                FROM (%s) c
+                WHERE completed_at IS NOT NULL
+                GROUP BY 1 HAVING SUM(delta) <> 0 ORDER BY 1
+                ON CONFLICT (day) DO UPDATE SET completed_count = s.completed_count + EXCLUDED.completed_count
+            $sql$, changes);
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        # Mêmes triggers sur l'archive : le déplacement d'une tâche (retrait de
+        # tasks, ajout à tasks_archive) laisse les compteurs inchangés
+        'DROP TRIGGER IF EXISTS tasks_archive_stats_insert ON tasks_archive',
+        '''
+        CREATE TRIGGER tasks_archive_stats_insert AFTER INSERT ON tasks_archive
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_task_stats()
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_archive_stats_update ON tasks_archive',
+        '''
+        CREATE TRIGGER tasks_archive_stats_update AFTER UPDATE ON tasks_archive
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_task_stats()
+        ''',
+        'DROP TRIGGER IF EXISTS tasks_archive_stats_delete ON tasks_archive',
+        '''
+        CREATE TRIGGER tasks_archive_stats_delete AFTER DELETE ON tasks_archive
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_task_stats()
+        ''',
+        # Les tâches déjà archivées réintègrent les compteurs
+        'LOCK TABLE tasks, tasks_archive IN SHARE MODE',
+        *task_stats_rebuild_statements(),
+    ]),
+    (13, 'Version de la tâche dans les réponses idempotentes', [
+        'ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS etag VARCHAR(64)',
+    ]),
+]
+
+# Verrou consultatif partagé par tous les processus qui migrent
+MIGRATIONS_LOCK_ID = 482_017_001
+
+def run_migrations(conn):
+    cur = conn.cursor()
+    cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATIONS_LOCK_ID,))
+    try:
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        cur.execute('SELECT version FROM schema_migrations')
+        applied = {row[0] for row in cur.fetchall()}
+
+        for version, description, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute('INSERT INTO schema_migrations (version, description) VALUES (%s, %s)',
+                            (version, description))
+                conn.commit()
+                print(f"Migration {version} appliquée: {description}")
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATIONS_LOCK_ID,))
+        conn.commit()
+        cur.close()
+
 # Initialiser les tables
 def init_db():
     try:
         conn = get_db_connection()
         if conn:
-            cur = conn.cursor()
-            
-            # Table des catégories
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS categories (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL UNIQUE,
-                    color VARCHAR(7) DEFAULT '#007bff',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Table des tâches
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id SERIAL PRIMARY KEY,
-                    title VARCHAR(200) NOT NULL,
-                    description TEXT,
-                    category_id INTEGER REFERENCES categories(id),
-                    priority VARCHAR(10) DEFAULT 'medium',
-                    status VARCHAR(20) DEFAULT 'pending',
-                    due_date DATE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Table des fichiers attachés
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS task_files (
-                    id SERIAL PRIMARY KEY,
-                    task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
-                    filename VARCHAR(255) NOT NULL,
-                    blob_url TEXT,
-                    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Insérer des catégories par défaut
-            cur.execute('''
-                INSERT INTO categories (name, color) VALUES 
-                ('Personnel', '#28a745'),
-                ('Travail', '#007bff'),
-                ('Urgent', '#dc3545'),
-                ('Projets', '#6f42c1')
-                ON CONFLICT (name) DO NOTHING
-            ''')
-            
-            conn.commit()
-            cur.close()
-            conn.close()
+            try:
+                run_migrations(conn)
+            finally:
+                conn.close()
             print("Base de données initialisée avec succès")
     except Exception as e:
         print(f"Erreur lors de l'initialisation de la DB: {e}")
 
-# Configuration Azure Storage
-def get_blob_service_client():
+@app.cli.command('migrate')
+def migrate_command():
+    """Applique les migrations de schéma en attente."""
+    init_db()
+
+# Client Azure Storage partagé par processus, avec une session HTTP poolée
+STORAGE_HTTP_POOL_SIZE = int(os.getenv('STORAGE_HTTP_POOL_SIZE', '16'))
+
+_blob_service_client = None
+_blob_service_client_pid = None
+_blob_service_client_lock = threading.Lock()
+
+def blob_request_hook(pipeline_request):
+    pipeline_request.context['metrics_start'] = time.perf_counter()
+
+def blob_response_hook(pipeline_response):
+    start = pipeline_response.context.get('metrics_start')
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    http_request = pipeline_response.http_request
+    # Opération lisible : méthode + paramètre comp/restype (block, blocklist, container...)
+    comp = http_request.query.get('comp') or http_request.query.get('restype')
+    operation = f'{http_request.method} {comp}' if comp else http_request.method
+    BLOB_REQUEST_SECONDS.labels(operation, pipeline_response.http_response.status_code).observe(elapsed)
+    add_request_timing('blob_time', elapsed)
+
+def create_blob_service_client():
     try:
-        if STORAGE_ACCOUNT_KEY:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=STORAGE_HTTP_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        transport = RequestsTransport(session=session, session_owner=False)
+        if STORAGE_CONNECTION_STRING:
+            return BlobServiceClient.from_connection_string(
+                STORAGE_CONNECTION_STRING, transport=transport,
+                raw_request_hook=blob_request_hook, raw_response_hook=blob_response_hook)
+        elif STORAGE_ACCOUNT_KEY:
             account_url = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
             blob_service_client = BlobServiceClient(
                 account_url=account_url,
-                credential=STORAGE_ACCOUNT_KEY
+                credential=STORAGE_ACCOUNT_KEY,
+                transport=transport,
+                raw_request_hook=blob_request_hook,
+                raw_response_hook=blob_response_hook
             )
             return blob_service_client
         else:
@@ -127,6 +1671,393 @@ def get_blob_service_client():
         print(f"Erreur de connexion au stockage Azure: {e}")
         return None
 
+def get_blob_service_client():
+    global _blob_service_client, _blob_service_client_pid
+    # Recréé après un fork : la session HTTP du parent n'est pas partageable
+    if _blob_service_client_pid != os.getpid():
+        with _blob_service_client_lock:
+            if _blob_service_client_pid != os.getpid():
+                _blob_service_client = create_blob_service_client()
+                _blob_service_client_pid = os.getpid()
+    return _blob_service_client
+
+_storage_container_ready = False
+
+def get_storage_container():
+    global _storage_container_ready
+    blob_service_client = get_blob_service_client()
+    if not blob_service_client:
+        raise RuntimeError('Impossible de se connecter au stockage Azure')
+    container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+    # Création du conteneur vérifiée une seule fois par processus
+    if not _storage_container_ready:
+        try:
+            container_client.create_container()
+        except ResourceExistsError:
+            pass
+        _storage_container_ready = True
+    return container_client
+
+# Feuille de style servie à part avec un cache long (URL versionnée par son empreinte)
+APP_CSS = '''
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body { 
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    min-height: 100vh;
+    padding: 20px;
+}
+.container { 
+    max-width: 1200px; 
+    margin: 0 auto; 
+    background: white; 
+    border-radius: 20px; 
+    box-shadow: 0 20px 40px rgba(0,0,0,0.1);
+    overflow: hidden;
+}
+.header {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    padding: 30px;
+    text-align: center;
+}
+.header h1 { font-size: 2.5em; margin-bottom: 10px; }
+.header p { opacity: 0.9; font-size: 1.1em; }
+.status-bar {
+    background: #f8f9fa;
+    padding: 15px 30px;
+    border-bottom: 1px solid #dee2e6;
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    flex-wrap: wrap;
+}
+.status-item { 
+    display: flex; 
+    align-items: center; 
+    margin: 5px 0;
+}
+.status-item span { margin-left: 8px; }
+.main-content {
+    display: grid;
+    grid-template-columns: 1fr 2fr;
+    gap: 30px;
+    padding: 30px;
+}
+.sidebar {
+    background: #f8f9fa;
+    padding: 25px;
+    border-radius: 15px;
+    height: fit-content;
+}
+.task-form {
+    background: white;
+    padding: 20px;
+    border-radius: 10px;
+    box-shadow: 0 2px 10px rgba(0,0,0,0.05);
+    margin-bottom: 20px;
+}
+.form-group { margin-bottom: 15px; }
+.form-group label { 
+    display: block; 
+    margin-bottom: 5px; 
+    font-weight: 600;
+    color: #495057;
+}
+.form-control {
+    width: 100%;
+    padding: 12px;
+    border: 2px solid #e9ecef;
+    border-radius: 8px;
+    font-size: 14px;
+    transition: border-color 0.3s;
+}
+.form-control:focus {
+    outline: none;
+    border-color: #667eea;
+    box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
+}
+.btn {
+    padding: 12px 24px;
+    border: none;
+    border-radius: 8px;
+    font-weight: 600;
+    cursor: pointer;
+    transition: all 0.3s;
+    text-decoration: none;
+    display: inline-block;
+    text-align: center;
+}
+.btn-primary {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+}
+.btn-primary:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 5px 15px rgba(102, 126, 234, 0.3);
+}
+.btn-success { background: #28a745; color: white; }
+.btn-danger { background: #dc3545; color: white; }
+.btn-warning { background: #ffc107; color: #212529; }
+.btn-sm { padding: 6px 12px; font-size: 12px; }
+.tasks-container {
+    background: white;
+}
+.task-filters {
+    display: flex;
+    gap: 10px;
+    margin-bottom: 20px;
+    flex-wrap: wrap;
+}
+.filter-btn {
+    padding: 8px 16px;
+    border: 2px solid #e9ecef;
+    background: white;
+    color: #495057;
+    text-decoration: none;
+    border-radius: 20px;
+    cursor: pointer;
+    transition: all 0.3s;
+}
+.filter-btn.active {
+    background: #667eea;
+    color: white;
+    border-color: #667eea;
+}
+.task-item {
+    background: white;
+    border: 1px solid #e9ecef;
+    border-radius: 12px;
+    padding: 20px;
+    margin-bottom: 15px;
+    transition: all 0.3s;
+    position: relative;
+}
+.task-item:hover {
+    box-shadow: 0 5px 20px rgba(0,0,0,0.1);
+    transform: translateY(-2px);
+}
+.task-header {
+    display: flex;
+    justify-content: between;
+    align-items: flex-start;
+    margin-bottom: 10px;
+}
+.task-title {
+    font-size: 1.2em;
+    font-weight: 600;
+    color: #2c3e50;
+    margin-bottom: 5px;
+}
+.task-meta {
+    display: flex;
+    gap: 10px;
+    align-items: center;
+    margin-bottom: 10px;
+    flex-wrap: wrap;
+}
+.badge {
+    padding: 4px 12px;
+    border-radius: 20px;
+    font-size: 12px;
+    font-weight: 600;
+}
+.badge-priority-high { background: #ffebee; color: #c62828; }
+.badge-priority-medium { background: #fff3e0; color: #ef6c00; }
+.badge-priority-low { background: #e8f5e8; color: #2e7d32; }
+.badge-status-pending { background: #e3f2fd; color: #1565c0; }
+.badge-status-in-progress { background: #fff3e0; color: #ef6c00; }
+.badge-status-completed { background: #e8f5e8; color: #2e7d32; }
+.task-description {
+    color: #6c757d;
+    margin-bottom: 15px;
+    line-height: 1.5;
+}
+.task-actions {
+    display: flex;
+    gap: 8px;
+    flex-wrap: wrap;
+}
+.stats-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
+    gap: 15px;
+    margin-bottom: 20px;
+}
+.stat-card {
+    background: white;
+    padding: 20px;
+    border-radius: 10px;
+    text-align: center;
+    box-shadow: 0 2px 10px rgba(0,0,0,0.05);
+}
+.stat-number {
+    font-size: 2em;
+    font-weight: bold;
+    color: #667eea;
+}
+.stat-label {
+    color: #6c757d;
+    font-size: 0.9em;
+}
+@media (max-width: 768px) {
+    .main-content {
+        grid-template-columns: 1fr;
+    }
+    .header h1 { font-size: 2em; }
+    .status-bar {
+        flex-direction: column;
+        align-items: flex-start;
+    }
+}
+'''
+
+# Script de la page : actions en fetch et mises à jour en direct (flux /api/events)
+APP_JS = '''
+(function () {
+    var list = document.getElementById('tasks-list');
+    if (!list) { return; }
+    var filters = JSON.parse(list.dataset.filters || '{}');
+    var firstPage = list.dataset.firstPage === '1';
+    var PRIORITY_RANK = { high: 1, medium: 2, low: 3 };
+    var live = false;
+    var refreshTimer = null;
+
+    function matchesFilters(task) {
+        return ['status', 'priority', 'category_id', 'due_date'].every(function (name) {
+            return filters[name] === undefined || String(filters[name]) === String(task[name]);
+        })
+            && (!filters.due_before || (task.due_date && task.due_date < filters.due_before))
+            && (!filters.due_after || (task.due_date && task.due_date > filters.due_after));
+    }
+
+    function taskElement(id) {
+        return list.querySelector('[data-task-id="' + id + '"]');
+    }
+
+    function removeTask(id) {
+        var element = taskElement(id);
+        if (element) { element.remove(); }
+    }
+
+    // Remplace la carte affichée, ou l'insère à son rang de priorité sur la
+    // première page si la tâche correspond aux filtres
+    function showTask(task) {
+        var current = taskElement(task.id);
+        if (!matchesFilters(task)) {
+            if (current) { current.remove(); }
+            return;
+        }
+        var template = document.createElement('template');
+        template.innerHTML = task.html.trim();
+        var element = template.content.firstElementChild;
+        if (current) {
+            current.replaceWith(element);
+            return;
+        }
+        if (!firstPage) { return; }
+        var empty = list.querySelector('.tasks-empty');
+        if (empty) { empty.remove(); }
+        var next = Array.prototype.find.call(list.querySelectorAll('[data-task-id]'), function (other) {
+            return PRIORITY_RANK[other.dataset.priority] >= PRIORITY_RANK[task.priority];
+        });
+        list.insertBefore(element, next || null);
+    }
+
+    function adjustStat(name, delta) {
+        var element = document.querySelector('[data-stat="' + name + '"]');
+        if (element) { element.textContent = Number(element.textContent) + delta; }
+    }
+
+    // Resynchronisation complète (modification en masse, reconnexion),
+    // étalée sur 2 s pour que les onglets ne rechargent pas tous ensemble
+    function scheduleRefresh() {
+        if (refreshTimer) { return; }
+        refreshTimer = setTimeout(function () {
+            fetch(location.href, { headers: { 'Accept': 'text/html' } })
+                .then(function (response) { return response.text(); })
+                .then(function (html) {
+                    var page = new DOMParser().parseFromString(html, 'text/html');
+                    var fresh = page.getElementById('tasks-list');
+                    if (fresh) { list.innerHTML = fresh.innerHTML; }
+                    page.querySelectorAll('[data-stat]').forEach(function (stat) {
+                        var element = document.querySelector('[data-stat="' + stat.dataset.stat + '"]');
+                        if (element) { element.textContent = stat.textContent; }
+                    });
+                })
+                .catch(function () {})
+                .finally(function () { refreshTimer = null; });
+        }, Math.random() * 2000);
+    }
+
+    function applyEvent(event) {
+        if (event.op === 'reload') {
+            scheduleRefresh();
+            return;
+        }
+        if (event.op === 'insert') { adjustStat('total', 1); }
+        if (event.op === 'delete') { adjustStat('total', -1); }
+        if (event.previous_status) { adjustStat(event.previous_status, -1); }
+        if (event.status) { adjustStat(event.status, 1); }
+        if (event.op === 'delete') {
+            removeTask(event.id);
+        } else if (event.task) {
+            showTask(event.task);
+        }
+    }
+
+    function connect(resync) {
+        if (!window.EventSource) { return; }
+        var source = new EventSource('/api/events');
+        source.onopen = function () {
+            // Modifications manquées pendant la coupure
+            if (resync) { scheduleRefresh(); }
+            live = true;
+        };
+        source.onmessage = function (message) {
+            applyEvent(JSON.parse(message.data));
+        };
+        source.onerror = function () {
+            live = false;
+            resync = true;
+            // Refus du serveur (503) : le navigateur ne se reconnecte pas seul
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(function () { connect(true); }, 30000);
+            }
+        };
+    }
+
+    // Actions sans rechargement : la réponse contient la seule tâche modifiée
+    document.addEventListener('submit', function (e) {
+        var form = e.target;
+        var action = form.dataset.action;
+        if (!action || !window.fetch) { return; }
+        e.preventDefault();
+        var buttons = form.querySelectorAll('button');
+        buttons.forEach(function (button) { button.disabled = true; });
+        fetch(form.action, { method: 'POST', body: new FormData(form), headers: { 'Accept': 'application/json' } })
+            .then(function (response) {
+                return response.json().then(function (data) {
+                    if (!response.ok) { throw new Error(data.error || response.statusText); }
+                    return data;
+                });
+            })
+            .then(function (data) {
+                if (data.task) { showTask(data.task); } else { removeTask(data.id); }
+                if (action === 'create') { form.reset(); }
+                // Sans flux, les compteurs sont relus avec la page
+                if (!live) { scheduleRefresh(); }
+            })
+            .catch(function (error) { alert(error.message); })
+            .finally(function () {
+                buttons.forEach(function (button) { button.disabled = false; });
+            });
+    });
+
+    connect(false);
+})();
+'''
+
 # Template HTML moderne pour la TodoList
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -135,216 +2066,8 @@ HTML_TEMPLATE = '''
     <title>📝 TodoList Cloud - Démo Terraform & Ansible</title>
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1">
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { 
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        .container { 
-            max-width: 1200px; 
-            margin: 0 auto; 
-            background: white; 
-            border-radius: 20px; 
-            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-            overflow: hidden;
-        }
-        .header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 30px;
-            text-align: center;
-        }
-        .header h1 { font-size: 2.5em; margin-bottom: 10px; }
-        .header p { opacity: 0.9; font-size: 1.1em; }
-        .status-bar {
-            background: #f8f9fa;
-            padding: 15px 30px;
-            border-bottom: 1px solid #dee2e6;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            flex-wrap: wrap;
-        }
-        .status-item { 
-            display: flex; 
-            align-items: center; 
-            margin: 5px 0;
-        }
-        .status-item span { margin-left: 8px; }
-        .main-content {
-            display: grid;
-            grid-template-columns: 1fr 2fr;
-            gap: 30px;
-            padding: 30px;
-        }
-        .sidebar {
-            background: #f8f9fa;
-            padding: 25px;
-            border-radius: 15px;
-            height: fit-content;
-        }
-        .task-form {
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-            margin-bottom: 20px;
-        }
-        .form-group { margin-bottom: 15px; }
-        .form-group label { 
-            display: block; 
-            margin-bottom: 5px; 
-            font-weight: 600;
-            color: #495057;
-        }
-        .form-control {
-            width: 100%;
-            padding: 12px;
-            border: 2px solid #e9ecef;
-            border-radius: 8px;
-            font-size: 14px;
-            transition: border-color 0.3s;
-        }
-        .form-control:focus {
-            outline: none;
-            border-color: #667eea;
-            box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-        }
-        .btn {
-            padding: 12px 24px;
-            border: none;
-            border-radius: 8px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.3s;
-            text-decoration: none;
-            display: inline-block;
-            text-align: center;
-        }
-        .btn-primary {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-        }
-        .btn-primary:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(102, 126, 234, 0.3);
-        }
-        .btn-success { background: #28a745; color: white; }
-        .btn-danger { background: #dc3545; color: white; }
-        .btn-warning { background: #ffc107; color: #212529; }
-        .btn-sm { padding: 6px 12px; font-size: 12px; }
-        .tasks-container {
-            background: white;
-        }
-        .task-filters {
-            display: flex;
-            gap: 10px;
-            margin-bottom: 20px;
-            flex-wrap: wrap;
-        }
-        .filter-btn {
-            padding: 8px 16px;
-            border: 2px solid #e9ecef;
-            background: white;
-            border-radius: 20px;
-            cursor: pointer;
-            transition: all 0.3s;
-        }
-        .filter-btn.active {
-            background: #667eea;
-            color: white;
-            border-color: #667eea;
-        }
-        .task-item {
-            background: white;
-            border: 1px solid #e9ecef;
-            border-radius: 12px;
-            padding: 20px;
-            margin-bottom: 15px;
-            transition: all 0.3s;
-            position: relative;
-        }
-        .task-item:hover {
-            box-shadow: 0 5px 20px rgba(0,0,0,0.1);
-            transform: translateY(-2px);
-        }
-        .task-header {
-            display: flex;
-            justify-content: between;
-            align-items: flex-start;
-            margin-bottom: 10px;
-        }
-        .task-title {
-            font-size: 1.2em;
-            font-weight: 600;
-            color: #2c3e50;
-            margin-bottom: 5px;
-        }
-        .task-meta {
-            display: flex;
-            gap: 10px;
-            align-items: center;
-            margin-bottom: 10px;
-            flex-wrap: wrap;
-        }
-        .badge {
-            padding: 4px 12px;
-            border-radius: 20px;
-            font-size: 12px;
-            font-weight: 600;
-        }
-        .badge-priority-high { background: #ffebee; color: #c62828; }
-        .badge-priority-medium { background: #fff3e0; color: #ef6c00; }
-        .badge-priority-low { background: #e8f5e8; color: #2e7d32; }
-        .badge-status-pending { background: #e3f2fd; color: #1565c0; }
-        .badge-status-in-progress { background: #fff3e0; color: #ef6c00; }
-        .badge-status-completed { background: #e8f5e8; color: #2e7d32; }
-        .task-description {
-            color: #6c757d;
-            margin-bottom: 15px;
-            line-height: 1.5;
-        }
-        .task-actions {
-            display: flex;
-            gap: 8px;
-            flex-wrap: wrap;
-        }
-        .stats-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-            gap: 15px;
-            margin-bottom: 20px;
-        }
-        .stat-card {
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            text-align: center;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-        }
-        .stat-number {
-            font-size: 2em;
-            font-weight: bold;
-            color: #667eea;
-        }
-        .stat-label {
-            color: #6c757d;
-            font-size: 0.9em;
-        }
-        @media (max-width: 768px) {
-            .main-content {
-                grid-template-columns: 1fr;
-            }
-            .header h1 { font-size: 2em; }
-            .status-bar {
-                flex-direction: column;
-                align-items: flex-start;
-            }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+    <script src="{{ asset_url('app.js') }}" defer></script>
 </head>
 <body>
     <div class="container">
@@ -372,22 +2095,22 @@ HTML_TEMPLATE = '''
             <div class="sidebar">
                 <div class="stats-grid">
                     <div class="stat-card">
-                        <div class="stat-number">{{ stats.total }}</div>
+                        <div class="stat-number" data-stat="total">{{ stats.total }}</div>
                         <div class="stat-label">Total</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{{ stats.pending }}</div>
+                        <div class="stat-number" data-stat="pending">{{ stats.pending }}</div>
                         <div class="stat-label">En attente</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{{ stats.completed }}</div>
+                        <div class="stat-number" data-stat="completed">{{ stats.completed }}</div>
                         <div class="stat-label">Terminées</div>
                     </div>
                 </div>
                 
                 <div class="task-form">
                     <h3>➕ Nouvelle tâche</h3>
-                    <form action="/tasks" method="post">
+                    <form action="/tasks" method="post" data-action="create">
                         <div class="form-group">
                             <label>Titre *</label>
                             <input type="text" name="title" class="form-control" required>
@@ -401,7 +2124,7 @@ HTML_TEMPLATE = '''
                             <select name="category_id" class="form-control">
                                 <option value="">Aucune catégorie</option>
                                 {% for category in categories %}
-                                <option value="{{ category[0] }}">{{ category[1] }}</option>
+                                <option value="{{ category.id }}">{{ category.name }}</option>
                                 {% endfor %}
                             </select>
                         </div>
@@ -424,72 +2147,548 @@ HTML_TEMPLATE = '''
             
             <div class="tasks-container">
                 <div class="task-filters">
-                    <button class="filter-btn active" onclick="filterTasks('all')">Toutes</button>
-                    <button class="filter-btn" onclick="filterTasks('pending')">En attente</button>
-                    <button class="filter-btn" onclick="filterTasks('in-progress')">En cours</button>
-                    <button class="filter-btn" onclick="filterTasks('completed')">Terminées</button>
+                    {% for label, url, active in status_links %}
+                    <a href="{{ url }}" class="filter-btn{% if active %} active{% endif %}">{{ label }}</a>
+                    {% endfor %}
                 </div>
+                <form class="task-filters" method="get" action="/">
+                    {% if filters.status %}
+                    <input type="hidden" name="status" value="{{ filters.status }}">
+                    {% endif %}
+                    <select name="priority" class="filter-btn">
+                        <option value="">Toutes priorités</option>
+                        {% for value, label in [('high', '🔴 Élevée'), ('medium', '🟡 Moyenne'), ('low', '🟢 Faible')] %}
+                        <option value="{{ value }}" {% if filters.priority == value %}selected{% endif %}>{{ label }}</option>
+                        {% endfor %}
+                    </select>
+                    <select name="category_id" class="filter-btn">
+                        <option value="">Toutes catégories</option>
+                        {% for category in categories %}
+                        <option value="{{ category.id }}" {% if filters.category_id == category.id %}selected{% endif %}>{{ category.name }}</option>
+                        {% endfor %}
+                    </select>
+                    <input type="date" name="due_date" class="filter-btn" value="{{ filters.due_date or '' }}">
+                    <button type="submit" class="filter-btn">Filtrer</button>
+                </form>
                 
-                <div id="tasks-list">
+                <div id="tasks-list" data-filters='{{ filters|tojson }}' data-first-page="{{ 0 if first_page_url else 1 }}">
                     {% for task in tasks %}
-                    <div class="task-item" data-status="{{ task[6] }}">
-                        <div class="task-header">
-                            <div class="task-title">{{ task[1] }}</div>
-                        </div>
-                        <div class="task-meta">
-                            <span class="badge badge-priority-{{ task[4] }}">{{ task[4]|title }}</span>
-                            <span class="badge badge-status-{{ task[6] }}">{{ task[6]|replace('-', ' ')|title }}</span>
-                            {% if task[7] %}
-                            <span class="badge" style="background: #f8f9fa; color: #495057;">📅 {{ task[7] }}</span>
-                            {% endif %}
-
-                        </div>
-                        {% if task[2] %}
-                        <div class="task-description">{{ task[2] }}</div>
-                        {% endif %}
-                        <div class="task-actions">
-                            {% if task[6] != 'completed' %}
-                            <form action="/tasks/{{ task[0] }}/complete" method="post" style="display: inline;">
-                                <button type="submit" class="btn btn-success btn-sm">✅ Terminer</button>
-                            </form>
-                            {% endif %}
-                            {% if task[6] == 'pending' %}
-                            <form action="/tasks/{{ task[0] }}/start" method="post" style="display: inline;">
-                                <button type="submit" class="btn btn-warning btn-sm">▶️ Commencer</button>
-                            </form>
-                            {% endif %}
-                            <form action="/tasks/{{ task[0] }}/delete" method="post" style="display: inline;">
-                                <button type="submit" class="btn btn-danger btn-sm" onclick="return confirm('Supprimer cette tâche ?')">🗑️ Supprimer</button>
-                            </form>
-                        </div>
-                    </div>
+                    {{ render_task(task) }}
+                    {% else %}
+                    <p class="task-description tasks-empty">Aucune tâche ne correspond à ces filtres.</p>
                     {% endfor %}
                 </div>
+                
+                <div class="task-filters">
+                    {% if first_page_url %}
+                    <a href="{{ first_page_url }}" class="filter-btn">⏮️ Première page</a>
+                    {% endif %}
+                    {% if next_page_url %}
+                    <a href="{{ next_page_url }}" class="filter-btn">Page suivante ▶️</a>
+                    {% endif %}
+                </div>
             </div>
         </div>
     </div>
-    
-    <script>
-        function filterTasks(status) {
-            const tasks = document.querySelectorAll('.task-item');
-            const buttons = document.querySelectorAll('.filter-btn');
-            
-            buttons.forEach(btn => btn.classList.remove('active'));
-            event.target.classList.add('active');
-            
-            tasks.forEach(task => {
-                if (status === 'all' || task.dataset.status === status) {
-                    task.style.display = 'block';
-                } else {
-                    task.style.display = 'none';
-                }
-            });
-        }
-    </script>
 </body>
 </html>
 '''
 
+# Carte d'une tâche : rendue dans la page et renvoyée seule aux actions
+# fetch et aux flux de mises à jour
+TASK_ITEM_HTML = '''
+<div class="task-item" data-task-id="{{ task.id }}" data-status="{{ task.status }}" data-priority="{{ task.priority }}">
+    <div class="task-header">
+        <div class="task-title">{{ task.title }}</div>
+    </div>
+    <div class="task-meta">
+        <span class="badge badge-priority-{{ task.priority }}">{{ task.priority|title }}</span>
+        <span class="badge badge-status-{{ task.status }}">{{ task.status|replace('-', ' ')|title }}</span>
+        {% if task.due_date %}
+        <span class="badge" style="background: #f8f9fa; color: #495057;">📅 {{ task.due_date }}</span>
+        {% endif %}
+    </div>
+    {% if task.description %}
+    <div class="task-description">{{ task.description }}</div>
+    {% endif %}
+    <div class="task-actions">
+        {% if task.status != 'completed' %}
+        <form action="/tasks/{{ task.id }}/complete" method="post" data-action="complete" style="display: inline;">
+            <button type="submit" class="btn btn-success btn-sm">✅ Terminer</button>
+        </form>
+        {% endif %}
+        {% if task.status == 'pending' %}
+        <form action="/tasks/{{ task.id }}/start" method="post" data-action="start" style="display: inline;">
+            <button type="submit" class="btn btn-warning btn-sm">▶️ Commencer</button>
+        </form>
+        {% endif %}
+        <form action="/tasks/{{ task.id }}/delete" method="post" data-action="delete" style="display: inline;">
+            <button type="submit" class="btn btn-danger btn-sm" onclick="return confirm('Supprimer cette tâche ?')">🗑️ Supprimer</button>
+        </form>
+    </div>
+</div>
+'''
+
+# Pagination par curseur (keyset) et filtres côté serveur
+TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', '50'))
+TASKS_PAGE_MAX = int(os.getenv('TASKS_PAGE_MAX', '500'))
+
+# Colonne générée par la migration 2 (high=1, medium=2, low=3)
+PRIORITY_RANK = 't.priority_rank'
+
+# Ordres de tri disponibles : (expression SQL, alias, sens)
+TASK_ORDERINGS = {
+    'created': [
+        ('t.created_at', 'created_at', 'DESC'),
+        ('t.id', 'id', 'DESC'),
+    ],
+    'priority': [
+        (PRIORITY_RANK, 'priority_rank', 'ASC'),
+        ('t.created_at', 'created_at', 'DESC'),
+        ('t.id', 'id', 'DESC'),
+    ],
+    # Recherche : pertinence plein texte, ou similarité des trigrammes du titre
+    # en repli (float8 pour que le rang relu depuis le curseur soit identique)
+    'relevance': [
+        ('ts_rank(t.search_vector, t.query)::float8', 'rank', 'DESC'),
+        ('t.id', 'id', 'DESC'),
+    ],
+    'similarity': [
+        ('word_similarity(t.term, t.title)::float8', 'rank', 'DESC'),
+        ('t.id', 'id', 'DESC'),
+    ],
+}
+
+# Configuration de la colonne search_vector (migration 5)
+SEARCH_CONFIG = 'french'
+SEARCH_MAX_TERMS = 8
+SEARCH_FUZZY_THRESHOLD = float(os.getenv('SEARCH_FUZZY_THRESHOLD', '0.4'))
+SEARCH_MAX_MATCHES = int(os.getenv('SEARCH_MAX_MATCHES', '5000'))
+
+# Condition de correspondance de chaque mode, servie par les index GIN
+SEARCH_MATCHES = {
+    'relevance': 't.search_vector @@ s.query',
+    'similarity': 's.term <%% t.title',
+}
+
+TASK_COLUMNS = '''
+    t.id, t.title, t.description, t.category_id, t.priority, t.status,
+    t.due_date, t.created_at, t.updated_at, c.name AS category_name, c.color AS category_color
+'''
+
+TASK_PRIORITIES = ('low', 'medium', 'high')
+TASK_STATUSES = ('pending', 'in-progress', 'completed')
+
+TASK_FILTERS = {
+    'status': 't.status = %s',
+    'priority': 't.priority = %s',
+    'category_id': 't.category_id = %s',
+    'due_date': 't.due_date = %s',
+    'due_before': 't.due_date < %s',
+    'due_after': 't.due_date > %s',
+}
+
+# Tâches actives et archivées (migration 11), pour include_archived=1
+ARCHIVE_COLUMNS = 'id, title, description, category_id, priority, status, due_date, created_at, updated_at, completed_at'
+
+TASKS_WITH_ARCHIVE = f'''(
+            SELECT {ARCHIVE_COLUMNS} FROM tasks
+            UNION ALL
+            SELECT {ARCHIVE_COLUMNS} FROM tasks_archive
+        ) t'''
+
+def parse_include_archived(args):
+    value = args.get('include_archived') or '0'
+    if value not in ('0', '1'):
+        raise ValueError(f"Paramètre include_archived invalide: {value}")
+    return value == '1'
+
+def parse_task_filter(name, value):
+    if name == 'category_id':
+        if not value.isdigit():
+            raise ValueError(f"Filtre {name} invalide: {value}")
+        return int(value)
+    if name == 'status' and value not in TASK_STATUSES:
+        raise ValueError(f"Filtre {name} invalide: {value}")
+    if name == 'priority' and value not in TASK_PRIORITIES:
+        raise ValueError(f"Filtre {name} invalide: {value}")
+    if name.startswith('due_'):
+        try:
+            datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Filtre {name} invalide: {value}")
+    return value
+
+def parse_task_filters(args, skip_invalid=False):
+    # skip_invalid : la page HTML ignore seulement le filtre fautif, l'API répond 400
+    filters = {}
+    for name in TASK_FILTERS:
+        value = args.get(name)
+        if not value:
+            continue
+        try:
+            filters[name] = parse_task_filter(name, value)
+        except ValueError:
+            if not skip_invalid:
+                raise
+    return filters
+
+def parse_page_limit(args):
+    value = args.get('limit')
+    if not value:
+        return TASKS_PAGE_SIZE
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f"Paramètre limit invalide: {value}")
+    return min(int(value), TASKS_PAGE_MAX)
+
+def parse_search_terms(args):
+    # Mots seulement : la syntaxe tsquery (&, |, !, :) n'est pas exposée
+    terms = re.findall(r'[^\W_]+', args.get('q') or '')[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise ValueError('Paramètre q requis')
+    return terms
+
+def search_params(terms):
+    # Chaque mot comme préfixe : "proj rap" trouve "projet rapport"
+    return [' & '.join(f'{term}:*' for term in terms), ' '.join(terms)]
+
+def encode_cursor(ordering, row):
+    keys = [row[alias] for _, alias, _ in TASK_ORDERINGS[ordering]]
+    raw = json.dumps({'o': ordering, 'k': keys}, default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def valid_cursor_key(alias, value):
+    # Types attendus par colonne de tri : sinon erreur de cast côté PostgreSQL (500)
+    if isinstance(value, bool):
+        return False
+    if alias == 'created_at':
+        if not isinstance(value, str):
+            return False
+        try:
+            datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return False
+        return True
+    if alias == 'rank':
+        return isinstance(value, (int, float))
+    return isinstance(value, int)
+
+def decode_cursor(ordering, cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        keys = data['k']
+        columns = TASK_ORDERINGS[ordering]
+        valid = (data['o'] == ordering and isinstance(keys, list) and len(keys) == len(columns)
+                 and all(valid_cursor_key(alias, key) for (_, alias, _), key in zip(columns, keys)))
+    except Exception:
+        valid = False
+    if not valid:
+        raise ValueError("Curseur de pagination invalide")
+    return keys
+
+def cursor_ordering(cursor, orderings):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ordering = json.loads(raw)['o']
+    except Exception:
+        ordering = None
+    if ordering not in orderings:
+        raise ValueError("Curseur de pagination invalide")
+    return ordering
+
+def build_task_page_query(filters, ordering='created', cursor=None, limit=TASKS_PAGE_SIZE, search=None,
+                          archived=False):
+    columns = TASK_ORDERINGS[ordering]
+    where = []
+    params = []
+    for name, value in filters.items():
+        where.append(TASK_FILTERS[name])
+        params.append(value)
+
+    # Archives : tri par date de création seulement (pas de priority_rank ni
+    # de search_vector dans tasks_archive)
+    source = TASKS_WITH_ARCHIVE if archived else 'tasks t'
+    if search:
+        # Au plus SEARCH_MAX_MATCHES correspondances lues dans l'index puis
+        # classées : un terme présent dans toute la table (peu discriminant)
+        # ne coûte pas le classement de toute la table
+        source = f'''(
+            SELECT t.*, s.query, s.term
+            FROM tasks t
+            CROSS JOIN (SELECT to_tsquery('{SEARCH_CONFIG}', %s) AS query, %s::text AS term) s
+            WHERE {' AND '.join([SEARCH_MATCHES[ordering]] + where)}
+            LIMIT {SEARCH_MAX_MATCHES}
+        ) t'''
+        params = search_params(search) + params
+        where = []
+
+    if cursor:
+        # (a > x) OR (a = x AND b < y) OR ... pour des sens de tri mélangés
+        keys = decode_cursor(ordering, cursor)
+        # Borne large sur la première clé, utilisable par l'index (les
+        # branches OR ne le sont pas) : la lecture commence au curseur
+        first, _, first_direction = columns[0]
+        where.append(f"{first} {'>=' if first_direction == 'ASC' else '<='} %s")
+        params.append(keys[0])
+        branches = []
+        for i, (expr, _, direction) in enumerate(columns):
+            terms = [f'{prev} = %s' for prev, _, _ in columns[:i]]
+            terms.append(f"{expr} {'>' if direction == 'ASC' else '<'} %s")
+            branches.append('(' + ' AND '.join(terms) + ')')
+            params.extend(keys[:i + 1])
+        where.append('(' + ' OR '.join(branches) + ')')
+
+    sort_keys = ', '.join(f'{expr} AS {alias}' for expr, alias, _ in columns if alias not in ('id', 'created_at'))
+    order_by = ', '.join(f'{expr} {direction}' for expr, _, direction in columns)
+    sql = f'''
+        SELECT {TASK_COLUMNS}{', ' + sort_keys if sort_keys else ''}
+        FROM {source}
+        LEFT JOIN categories c ON t.category_id = c.id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order_by}
+        LIMIT {int(limit) + 1}
+    '''
+    # Une ligne de plus pour savoir s'il existe une page suivante. Limite
+    # écrite dans le texte : avec LIMIT $n, le plan générique d'une requête
+    # préparée suppose une grande partie de la table et n'est jamais retenu
+    return sql, params
+
+def split_task_page(ordering, rows, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(ordering, rows[-1])
+    return rows, None
+
+# Réponses JSON construites par PostgreSQL : une chaîne JSON par tâche, avec
+# seulement les champs demandés (?fields=id,title,status), assemblées telles
+# quelles sans décodage ni réencodage en Python
+TASK_FIELDS = (
+    'id', 'title', 'description', 'category_id', 'priority', 'status',
+    'due_date', 'created_at', 'updated_at', 'category_name', 'category_color',
+)
+
+def parse_task_fields(args, allowed=TASK_FIELDS):
+    value = args.get('fields')
+    if not value:
+        return list(allowed)
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"Paramètre fields invalide: {', '.join(unknown) or value}")
+    return fields
+
+def task_json_sql(fields, alias):
+    # row_to_json : sortie compacte, clés dans l'ordre des colonnes
+    columns = ', '.join(f'{alias}.{field}' for field in fields)
+    return f'(SELECT row_to_json(j) FROM (SELECT {columns}) j)::text'
+
+def build_task_json_page_query(filters, ordering='created', cursor=None, limit=TASKS_PAGE_SIZE, fields=TASK_FIELDS,
+                               archived=False):
+    page_sql, params = build_task_page_query(filters, ordering, cursor, limit, archived=archived)
+    columns = TASK_ORDERINGS[ordering]
+    keys = ', '.join(f'p.{alias}' for _, alias, _ in columns)
+    order_by = ', '.join(f'p.{alias} {direction}' for _, alias, direction in columns)
+    sql = f'SELECT {task_json_sql(fields, "p")} AS json, {keys} FROM ({page_sql}) p ORDER BY {order_by}'
+    return sql, params
+
+def task_page_body(rows, next_cursor):
+    return '{"tasks":[' + ','.join(row['json'] for row in rows) + '],"next_cursor":' + json.dumps(next_cursor) + '}'
+
+CATEGORIES_LIST_QUERY = 'SELECT id, name, color, created_at FROM categories ORDER BY name'
+
+CATEGORIES_JSON_QUERY = '''
+    SELECT COALESCE(json_agg(json_build_object(
+                'id', id, 'name', name, 'color', color) ORDER BY name), '[]')
+    FROM categories
+'''
+
+# Version du tableau de bord (nombre de tâches, dernier updated_at et dernier archivage) pour l'ETag,
+# calculée sans lire la liste des tâches
+DASHBOARD_STAMP_QUERY = f'''
+    SELECT
+        json_build_object(
+            'total', (SELECT COALESCE(SUM(task_count), 0) FROM task_stats),
+            'last_update', (SELECT MAX(updated_at) FROM tasks),
+            'last_archive', (SELECT MAX(archived_at) FROM tasks_archive)),
+        ({CATEGORIES_JSON_QUERY})
+'''
+
+def dashboard_etag(stamp, categories, storage_probe):
+    # État de la sonde (ok/error) et non son libellé, qui contient la latence
+    storage_state = storage_probe['status'] if storage_probe else None
+    # Un archivage retire des tâches de la page sans changer le total
+    raw = json.dumps([stamp['total'], stamp['last_update'], stamp['last_archive'], categories, storage_state,
+                      request.query_string.decode()])
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Statistiques du tableau de bord lues dans les compteurs matérialisés
+# (quelques lignes par catégorie) ; MAX(updated_at) par l'index idx_tasks_updated_id
+DASHBOARD_STATS_QUERY = '''
+    SELECT json_build_object(
+                'total', COALESCE(SUM(task_count), 0),
+                'pending', COALESCE(SUM(task_count) FILTER (WHERE status = 'pending'), 0),
+                'completed', COALESCE(SUM(task_count) FILTER (WHERE status = 'completed'), 0),
+                'last_update', (SELECT MAX(updated_at) FROM tasks),
+                'last_archive', (SELECT MAX(archived_at) FROM tasks_archive))
+    FROM task_stats
+'''
+
+# Statistiques détaillées (/api/stats) : par statut, priorité et catégorie,
+# retards par échéance et tâches terminées par jour sur les `days` derniers jours
+STATS_DAYS = int(os.getenv('STATS_DAYS', '30'))
+STATS_MAX_DAYS = 366
+
+STATS_QUERY = '''
+    SELECT json_build_object(
+        'total', (SELECT COALESCE(SUM(task_count), 0) FROM task_stats),
+        'by_status', (
+            SELECT COALESCE(json_object_agg(status, count), '{}')
+            FROM (SELECT status, SUM(task_count) AS count FROM task_stats
+                  GROUP BY status HAVING SUM(task_count) > 0) s),
+        'by_priority', (
+            SELECT COALESCE(json_object_agg(priority, count), '{}')
+            FROM (SELECT priority, SUM(task_count) AS count FROM task_stats
+                  GROUP BY priority HAVING SUM(task_count) > 0) s),
+        'by_category', (
+            SELECT COALESCE(json_agg(json_build_object(
+                        'id', c.id, 'name', c.name, 'color', c.color,
+                        'total', COALESCE(s.total, 0),
+                        'pending', COALESCE(s.pending, 0),
+                        'in_progress', COALESCE(s.in_progress, 0),
+                        'completed', COALESCE(s.completed, 0))
+                    ORDER BY c.name NULLS LAST), '[]')
+            FROM categories c
+            FULL JOIN (
+                SELECT NULLIF(category_id, 0) AS category_id,
+                       SUM(task_count) AS total,
+                       SUM(task_count) FILTER (WHERE status = 'pending') AS pending,
+                       SUM(task_count) FILTER (WHERE status = 'in-progress') AS in_progress,
+                       SUM(task_count) FILTER (WHERE status = 'completed') AS completed
+                FROM task_stats GROUP BY category_id HAVING SUM(task_count) > 0
+            ) s ON s.category_id = c.id),
+        'overdue', json_build_object(
+            'total', (SELECT COALESCE(SUM(open_count), 0) FROM task_due_stats
+                      WHERE due_date < CURRENT_DATE),
+            'by_due_date', (
+                SELECT COALESCE(json_agg(json_build_object('due_date', due_date, 'count', open_count)
+                                         ORDER BY due_date DESC), '[]')
+                FROM task_due_stats
+                WHERE due_date < CURRENT_DATE AND due_date >= CURRENT_DATE - %s::integer AND open_count > 0)),
+        'completed_per_day', (
+            SELECT COALESCE(json_agg(json_build_object('day', day, 'count', completed_count)
+                                     ORDER BY day), '[]')
+            FROM task_completion_stats
+            WHERE day > CURRENT_DATE - %s::integer AND completed_count > 0)
+    )
+'''
+
+# Données du tableau de bord : statistiques, catégories et page de tâches
+# renvoyées en JSON dans la même ligne
+def build_home_query(filters, cursor=None, limit=TASKS_PAGE_SIZE):
+    page_sql, params = build_task_page_query(filters, 'priority', cursor, limit)
+    sql = f'''
+        SELECT
+            ({DASHBOARD_STATS_QUERY}) AS stats,
+            ({CATEGORIES_JSON_QUERY}) AS categories,
+            (SELECT COALESCE(json_agg(p ORDER BY p.priority_rank, p.created_at DESC, p.id DESC), '[]')
+             FROM ({page_sql}) p) AS tasks
+    '''
+    return sql, params
+
+# Compression des réponses : brotli si le module est installé, sinon gzip
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+COMPRESS_MIMETYPES = {'text/html', 'text/css', 'text/csv', 'application/json', 'application/javascript'}
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.set_data(compress_body(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Ressources statiques : contenu, type et empreinte calculés au démarrage
+STATIC_ASSETS = {
+    'app.css': (APP_CSS.encode(), 'text/css'),
+    'app.js': (APP_JS.encode(), 'application/javascript'),
+}
+ASSET_VERSIONS = {name: hashlib.sha1(content).hexdigest()[:12] for name, (content, _) in STATIC_ASSETS.items()}
+_compressed_assets = {}
+
+@app.template_global()
+def asset_url(name):
+    return url_for('static_asset', name=name, v=ASSET_VERSIONS[name])
+
+@app.route('/assets/<name>')
+def static_asset(name):
+    if name not in STATIC_ASSETS:
+        abort(404)
+    content, mimetype = STATIC_ASSETS[name]
+    response = Response(content, mimetype=mimetype)
+    encoding = choose_encoding()
+    if encoding:
+        # Version compressée mise en cache : le contenu ne change pas
+        key = (name, encoding)
+        if key not in _compressed_assets:
+            _compressed_assets[key] = compress_body(content, encoding)
+        response.set_data(_compressed_assets[key])
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# Templates compilés une seule fois au démarrage
+HOME_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+TASK_ITEM_TEMPLATE = app.jinja_env.from_string(TASK_ITEM_HTML)
+
+@app.template_global('render_task')
+def render_task_item(task):
+    return Markup(TASK_ITEM_TEMPLATE.render(task=task))
+
+STATUS_FILTERS = [
+    ('', 'Toutes'),
+    ('pending', 'En attente'),
+    ('in-progress', 'En cours'),
+    ('completed', 'Terminées'),
+]
+
+def status_links(filters):
+    links = []
+    for status, label in STATUS_FILTERS:
+        args = {k: v for k, v in filters.items() if k != 'status'}
+        if status:
+            args['status'] = status
+        links.append((label, url_for('home', **args), filters.get('status', '') == status))
+    return links
+
 @app.route('/')
 def home():
     # Tester la connexion DB
@@ -497,67 +2696,210 @@ def home():
     tasks = []
     categories = []
     stats = {'total': 0, 'pending': 0, 'completed': 0}
+    next_cursor = None
     
+    # Page HTML : filtres ou curseur invalides ignorés (l'API répond 400)
+    filters = parse_task_filters(request.args, skip_invalid=True)
+    cursor = request.args.get('cursor')
     try:
-        conn = get_db_connection()
-        if conn:
-            db_status = "✅ Connecté"
-            cur = conn.cursor()
-            
-            # Récupérer les tâches avec catégories
-            cur.execute('''
-                SELECT t.*, c.name as category_name, c.color as category_color
-                FROM tasks t
-                LEFT JOIN categories c ON t.category_id = c.id
-                ORDER BY 
-                    CASE t.priority 
-                        WHEN 'high' THEN 1
-                        WHEN 'medium' THEN 2
-                        WHEN 'low' THEN 3
-                    END,
-                    t.created_at DESC
-            ''')
-            tasks = cur.fetchall()
-            
-            # Récupérer les catégories
-            cur.execute('SELECT * FROM categories ORDER BY name')
-            categories = cur.fetchall()
-            
-            # Calculer les statistiques
-            cur.execute('SELECT COUNT(*) FROM tasks')
-            stats['total'] = cur.fetchone()[0]
-            
-            cur.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'")
-            stats['pending'] = cur.fetchone()[0]
-            
-            cur.execute("SELECT COUNT(*) FROM tasks WHERE status = 'completed'")
-            stats['completed'] = cur.fetchone()[0]
-            
-            cur.close()
-            conn.close()
-    except Exception as e:
-        db_status = f"❌ Erreur: {str(e)[:50]}..."
+        query, params = build_home_query(filters, cursor)
+    except ValueError:
+        cursor = None
+        query, params = build_home_query(filters, cursor)
     
-    # Tester la connexion Storage
-    storage_status = "❌ Déconnecté"
-    try:
-        blob_client = get_blob_service_client()
-        if blob_client:
-            storage_status = "✅ Connecté"
-    except Exception as e:
-        storage_status = f"❌ Erreur: {str(e)[:50]}..."
+    # Dernier état connu du stockage (sonde en arrière-plan)
+    storage_probe = health_probes['storage']
+    storage_status = probe_status_label(storage_probe)
+    etag = None
     
-    return render_template_string(HTML_TEMPLATE, 
+    # Première page (quels que soient les filtres) servie depuis le cache
+    cache_key = None if cursor else 'dashboard:' + json.dumps(filters, sort_keys=True)
+    dashboard = cache_get('tasks', cache_key) if cache_key else None
+    if dashboard is not None:
+        db_status = probe_status_label(health_probes['database'])
+    else:
+        try:
+            conn = get_db_connection(read_only=True)
+            if conn:
+                db_status = "✅ Connecté"
+                cur = conn.cursor()
+                
+                # Requête conditionnelle : comparer la version sans charger les tâches
+                if request.if_none_match:
+                    cur.execute_prepared(DASHBOARD_STAMP_QUERY)
+                    stamp, categories = cur.fetchone()
+                    etag = dashboard_etag(stamp, categories, storage_probe)
+                    if request.if_none_match.contains_weak(etag):
+                        cur.close()
+                        conn.close()
+                        return not_modified(etag)
+                
+                # Tâches, catégories et statistiques en un seul aller-retour
+                cur.execute_prepared(query, params)
+                dashboard = cur.fetchone()
+                if cache_key:
+                    cache_set('tasks', cache_key, dashboard)
+                
+                cur.close()
+                conn.close()
+        except Exception as e:
+            db_status = f"❌ Erreur: {str(e)[:50]}..."
+    
+    if dashboard is not None:
+        stats, categories, tasks = dashboard
+        tasks, next_cursor = split_task_page('priority', tasks, TASKS_PAGE_SIZE)
+        etag = dashboard_etag(stats, categories, storage_probe)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+    
+    response = Response(HOME_TEMPLATE.render(
                                 db_status=db_status,
                                 storage_status=storage_status,
                                 tasks=tasks,
                                 categories=categories,
                                 stats=stats,
-                                timestamp=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                                filters=filters,
+                                status_links=status_links(filters),
+                                first_page_url=url_for('home', **filters) if cursor else None,
+                                next_page_url=url_for('home', cursor=next_cursor, **filters) if next_cursor else None,
+                                timestamp=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                        mimetype='text/html')
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# CRUD pour les tâches : formulaire classique (redirection) ou appel fetch
+# (Accept: application/json) qui ne reçoit que la tâche modifiée
+def wants_json():
+    return request.is_json or request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def task_write_query(statement):
+    # Écriture (RETURNING *) et relecture de la tâche complète en une requête
+    return f'WITH t AS ({statement}) SELECT {TASK_COLUMNS} FROM t LEFT JOIN categories c ON c.id = t.category_id'
+
+def task_payload(task):
+    data = task_dict(task)
+    data['html'] = render_task_item(data)
+    return data
+
+def task_action_response(response):
+    return response if wants_json() else redirect('/')
+
+def task_action_error(message, status=500):
+    print(message)
+    if not wants_json():
+        return redirect('/')
+    return jsonify({'error': message}), status
+
+# Idempotency-Key : la réponse d'une écriture est enregistrée dans la même
+# transaction que l'écriture, une nouvelle tentative avec la même clé la
+# rejoue au lieu de recréer la tâche. Une requête concurrente portant la même
+# clé attend sur la clé primaire que la première soit validée ou annulée.
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_CLEANUP_INTERVAL = float(os.getenv('IDEMPOTENCY_CLEANUP_INTERVAL', '600'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_MISMATCH = 'Idempotency-Key déjà utilisée pour une autre requête'
+
+IDEMPOTENCY_CLAIM_QUERY = '''
+    INSERT INTO idempotency_keys (key, request_hash) VALUES (%s, %s)
+    ON CONFLICT (key) DO NOTHING RETURNING key
+'''
+IDEMPOTENCY_LOOKUP_QUERY = 'SELECT request_hash, status_code, response, etag FROM idempotency_keys WHERE key = %s'
+# etag : version de la tâche écrite, renvoyée avec la réponse rejouée
+IDEMPOTENCY_STORE_QUERY = 'UPDATE idempotency_keys SET status_code = %s, response = %s, etag = %s WHERE key = %s'
+
+def idempotency_key(method, path, headers, body):
+    key = headers.get('Idempotency-Key')
+    if key is None:
+        return None
+    if not key.strip() or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError('En-tête Idempotency-Key invalide')
+    # Empreinte de la requête : une clé réutilisée pour un autre contenu est refusée
+    return key, hashlib.sha256(f'{method} {path}\n'.encode() + body).hexdigest()
+
+def request_idempotency_key():
+    # Corps lu et gardé en mémoire avant request.form / request.json
+    return idempotency_key(request.method, request.path, request.headers, request.get_data(cache=True))
+
+def run_write(work, idempotency=None, retry_commit=True):
+    # work(cur) -> (données JSON, statut HTTP), exécuté par run_transaction
+    def transaction(cur):
+        if idempotency:
+            cur.execute(IDEMPOTENCY_CLAIM_QUERY, idempotency)
+            if cur.fetchone() is None:
+                cur.execute(IDEMPOTENCY_LOOKUP_QUERY, (idempotency[0],))
+                stored = cur.fetchone()
+                if stored['request_hash'] != idempotency[1]:
+                    return app.json.dumps({'error': IDEMPOTENCY_MISMATCH}), 422, None, False
+                return stored['response'], stored['status_code'], stored['etag'], True
+        data, status = work(cur)
+        body = app.json.dumps(data)
+        task = data.get('task') if status < 300 else None
+        version = task and task['updated_at']
+        if idempotency:
+            cur.execute(IDEMPOTENCY_STORE_QUERY, (status, body, version, idempotency[0]))
+        return body, status, version, False
+
+    # Avec une clé, rejouer un commit incertain est sans risque : la clé est
+    # déjà enregistrée si la première tentative a abouti
+    body, status, version, replayed = run_transaction(transaction, retry_commit or idempotency is not None)
+    response = Response(body, status=status, mimetype='application/json')
+    if version:
+        response.set_etag(version)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def idempotency_cleanup_loop():
+    while True:
+        time.sleep(IDEMPOTENCY_CLEANUP_INTERVAL)
+        conn = get_db_connection()
+        if not conn:
+            continue
+        try:
+            cur = conn.cursor()
+            cur.execute('DELETE FROM idempotency_keys WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)',
+                        (IDEMPOTENCY_TTL,))
+            if cur.rowcount:
+                print(f"{cur.rowcount} clés d'idempotence expirées supprimées")
+            conn.commit()
+            cur.close()
+        except Exception as e:
+            print(f"Erreur lors du nettoyage des clés d'idempotence: {e}")
+        finally:
+            conn.close()
+
+register_background_thread('idempotency-cleanup', idempotency_cleanup_loop)
+
+# If-Match : l'ETag d'une tâche est son updated_at. Une modification portant
+# une version périmée est refusée (412) au lieu d'écraser celle d'un autre.
+def request_task_version():
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    versions = request.if_match.as_set()
+    try:
+        if len(versions) != 1:
+            raise ValueError
+        return datetime.datetime.fromisoformat(versions.pop())
+    except ValueError:
+        raise ValueError('En-tête If-Match invalide')
+
+def missing_task_error(cur, task_id, version):
+    # Aucune ligne écrite : tâche absente, ou version périmée si If-Match
+    if version is not None:
+        cur.execute('SELECT updated_at FROM tasks WHERE id = %s', (task_id,))
+        row = cur.fetchone()
+        if row:
+            return {'error': 'Tâche modifiée entre-temps', 'updated_at': row['updated_at'].isoformat()}, 412
+    return {'error': 'Tâche introuvable'}, 404
 
-# CRUD pour les tâches
 @app.route('/tasks', methods=['POST'])
 def create_task():
+    try:
+        idempotency = request_idempotency_key()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         if request.is_json:
             data = request.json
@@ -573,204 +2915,1744 @@ def create_task():
         if not data.get('title'):
             return jsonify({'error': 'Titre requis'}), 400
         
+        def work(cur):
+            cur.execute(task_write_query('''
+                INSERT INTO tasks (title, description, category_id, priority, due_date) 
+                VALUES (%s, %s, %s, %s, %s) RETURNING *
+            '''), (data['title'], data['description'], data['category_id'], 
+                  data['priority'], data['due_date']))
+            task = cur.fetchone()
+            invalidate_cache(cur, 'tasks')
+            return {'id': task['id'], 'message': 'Tâche créée avec succès', 'task': task_payload(task)}, 201
+        
+        # Sans clé d'idempotence, un commit interrompu n'est pas rejoué (doublon possible)
+        return task_action_response(run_write(work, idempotency, retry_commit=False))
+    except Exception as e:
+        return jsonify({'error': f'Erreur lors de la création: {str(e)}'}), 500
+
+TASK_STATUS_UPDATE = task_write_query('''
+    UPDATE tasks SET status = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s AND (%s::timestamp IS NULL OR updated_at = %s::timestamp) RETURNING *
+''')
+
+def update_task_status(task_id, status):
+    try:
+        version = request_task_version()
+        idempotency = request_idempotency_key()
+    except ValueError as e:
+        return task_action_error(str(e), 400)
+    
+    def work(cur):
+        cur.execute_prepared(TASK_STATUS_UPDATE, (status, task_id, version, version))
+        task = cur.fetchone()
+        if task is None:
+            return missing_task_error(cur, task_id, version)
+        invalidate_cache(cur, 'tasks')
+        return {'task': task_payload(task)}, 200
+    
+    try:
+        return task_action_response(run_write(work, idempotency))
+    except Exception as e:
+        return task_action_error(f'Erreur lors de la mise à jour: {str(e)}')
+
+@app.route('/tasks/<int:task_id>/complete', methods=['POST'])
+def complete_task(task_id):
+    return update_task_status(task_id, 'completed')
+
+@app.route('/tasks/<int:task_id>/start', methods=['POST'])
+def start_task(task_id):
+    return update_task_status(task_id, 'in-progress')
+
+@app.route('/tasks/<int:task_id>/delete', methods=['POST'])
+def delete_task(task_id):
+    try:
+        version = request_task_version()
+        idempotency = request_idempotency_key()
+    except ValueError as e:
+        return task_action_error(str(e), 400)
+    
+    def work(cur):
+        # La cascade supprime les lignes task_files : leurs blobs sont confiés
+        # à la file de travaux dans la même transaction
+        cur.execute('''
+            WITH deleted AS (
+                DELETE FROM tasks WHERE id = %s AND (%s::timestamp IS NULL OR updated_at = %s::timestamp)
+                RETURNING id
+            )
+            SELECT EXISTS (SELECT 1 FROM deleted) AS deleted,
+                   ARRAY(SELECT blob_name FROM task_files
+                         WHERE task_id = %s AND blob_name IS NOT NULL AND EXISTS (SELECT 1 FROM deleted)) AS blob_names
+        ''', (task_id, version, version, task_id))
+        row = cur.fetchone()
+        if not row['deleted']:
+            return missing_task_error(cur, task_id, version)
+        if row['blob_names']:
+            enqueue_job(cur.connection, 'delete_blobs', {'blobs': row['blob_names']})
+        invalidate_cache(cur, 'tasks')
+        return {'id': task_id, 'deleted': True}, 200
+    
+    try:
+        return task_action_response(run_write(work, idempotency))
+    except Exception as e:
+        return task_action_error(f'Erreur lors de la suppression: {str(e)}')
+
+# API endpoints
+def task_dict(task):
+    return {
+        'id': task['id'],
+        'title': task['title'],
+        'description': task['description'],
+        'category_id': task['category_id'],
+        'priority': task['priority'],
+        'status': task['status'],
+        'due_date': task['due_date'].isoformat() if task['due_date'] else None,
+        'created_at': task['created_at'].isoformat() if task['created_at'] else None,
+        'updated_at': task['updated_at'].isoformat() if task['updated_at'] else None,
+        'category_name': task['category_name'],
+        'category_color': task['category_color']
+    }
+
+@app.route('/api/tasks', methods=['GET'])
+def api_get_tasks():
+    try:
+        filters = parse_task_filters(request.args)
+        limit = parse_page_limit(request.args)
+        fields = parse_task_fields(request.args)
+        archived = parse_include_archived(request.args)
+        cursor = request.args.get('cursor')
+        query, params = build_task_json_page_query(filters, 'created', cursor, limit, fields, archived)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    cache_key = None if cursor else f'api:{limit}:{",".join(fields)}:{int(archived)}:' + json.dumps(filters, sort_keys=True)
+    body = cache_get('tasks', cache_key) if cache_key else None
+    if body is not None:
+        return Response(body, mimetype='application/json')
+    
+    try:
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
+        
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute_prepared(query, params)
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        
+        rows, next_cursor = split_task_page('created', rows, limit)
+        body = task_page_body(rows, next_cursor)
+        if cache_key:
+            cache_set('tasks', cache_key, body)
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+# Recherche classée par pertinence (tsvector + GIN), avec repli par trigrammes
+# quand la première page plein texte est vide (fautes de frappe)
+SEARCH_MODES = {'relevance': 'fulltext', 'similarity': 'fuzzy'}
+
+_trigram_search = None
+
+def trigram_search_available(cur):
+    # Vérifié une fois par processus (migration 6 sans effet si pg_trgm manque)
+    global _trigram_search
+    if _trigram_search is None:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS available")
+        _trigram_search = cur.fetchone()['available']
+    return _trigram_search
+
+@app.route('/api/tasks/search', methods=['GET'])
+def api_search_tasks():
+    try:
+        filters = parse_task_filters(request.args)
+        limit = parse_page_limit(request.args)
+        terms = parse_search_terms(request.args)
+        cursor = request.args.get('cursor')
+        # Une page suivante reste dans le mode choisi pour la première
+        orderings = [cursor_ordering(cursor, SEARCH_MODES)] if cursor else list(SEARCH_MODES)
+        queries = [build_task_page_query(filters, ordering, cursor, limit, terms) for ordering in orderings]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
+        
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        tasks = []
+        mode = orderings[0]
+        for ordering, (query, params) in zip(orderings, queries):
+            if ordering == 'similarity':
+                if not trigram_search_available(cur):
+                    break
+                cur.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                            (str(SEARCH_FUZZY_THRESHOLD),))
+            cur.execute(query, params)
+            tasks = cur.fetchall()
+            mode = ordering
+            if tasks:
+                break
+        cur.close()
+        conn.close()
+        
+        tasks, next_cursor = split_task_page(mode, tasks, limit)
+        return jsonify({
+            'tasks': [dict(task_dict(task), rank=round(task['rank'], 4)) for task in tasks],
+            'next_cursor': next_cursor,
+            'mode': SEARCH_MODES[mode]
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+# Mises à jour en direct (Server-Sent Events) : les triggers de la migration 7
+# publient les modifications de tâches sur TASK_EVENTS_CHANNEL ; un thread par
+# processus écoute, relit une seule fois les tâches modifiées et diffuse
+# l'événement à tous les flux ouverts. Un flux occupe un thread (gthread) :
+# EVENTS_MAX_STREAMS flux au plus par processus, 0 pour désactiver.
+TASK_EVENTS_CHANNEL = 'todolist_tasks'
+EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', '2'))
+EVENTS_KEEPALIVE = float(os.getenv('EVENTS_KEEPALIVE', '15'))
+EVENTS_QUEUE_SIZE = 100
+RELOAD_EVENT = {'op': 'reload'}
+
+class EventBroker:
+    def __init__(self, max_subscribers):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = queue.Queue(EVENTS_QUEUE_SIZE)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def count(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Client trop lent : ses événements en attente sont remplacés
+                # par une resynchronisation complète
+                with contextlib.suppress(queue.Empty, queue.Full):
+                    while not subscriber.empty():
+                        subscriber.get_nowait()
+                    subscriber.put_nowait(RELOAD_EVENT)
+
+task_events = EventBroker(EVENTS_MAX_STREAMS)
+
+# Requête de relecture des tâches modifiées (partagée avec app_async.py)
+TASK_EVENTS_QUERY = f'''
+    SELECT {TASK_COLUMNS}
+    FROM tasks t LEFT JOIN categories c ON c.id = t.category_id
+    WHERE t.id = ANY(%s)
+'''
+
+def parse_task_changes(changes):
+    # (opération, id, statut précédent, nouveau statut) par tâche, ou None
+    # quand seule une resynchronisation complète est possible
+    if any(change['op'] == 'reload' for change in changes):
+        return None
+    return [(change['op'], *task) for change in changes for task in change['tasks']]
+
+def build_task_events(rows, tasks):
+    # Les statuts viennent du trigger (compteurs exacts) ; la tâche relue,
+    # état le plus récent, sert seulement à l'affichage
+    events = []
+    for op, task_id, previous_status, status in rows:
+        event = {'op': op, 'id': task_id, 'previous_status': previous_status, 'status': status}
+        if task_id in tasks:
+            event['task'] = tasks[task_id]
+        events.append(event)
+    return events
+
+def task_change_events(changes):
+    rows = parse_task_changes(changes)
+    if rows is None:
+        return [RELOAD_EVENT]
+    
+    tasks = {}
+    ids = [task_id for op, task_id, _, _ in rows if op != 'delete']
+    if ids:
+        conn = get_db_connection()
+        if not conn:
+            return [RELOAD_EVENT]
+        try:
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.execute(TASK_EVENTS_QUERY, (ids,))
+            tasks = {task['id']: task_payload(task) for task in cur.fetchall()}
+            cur.close()
+        finally:
+            conn.close()
+    return build_task_events(rows, tasks)
+
+def task_events_loop():
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**db_pool.conn_kwargs)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f'LISTEN {TASK_EVENTS_CHANNEL}')
+            # Des modifications ont pu être manquées avant l'écoute
+            task_events.publish(RELOAD_EVENT)
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                changes = []
+                while conn.notifies:
+                    changes.append(json.loads(conn.notifies.pop(0).payload))
+                # Relecture des tâches seulement si un flux est ouvert
+                if changes and task_events.count():
+                    for event in task_change_events(changes):
+                        task_events.publish(event)
+        except Exception as e:
+            print(f"Écoute des modifications de tâches interrompue: {e}")
+            task_events.publish(RELOAD_EVENT)
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+if EVENTS_MAX_STREAMS > 0:
+    register_background_thread('task-events', task_events_loop)
+
+@app.route('/api/events', methods=['GET'])
+def api_task_events():
+    subscriber = task_events.subscribe()
+    if subscriber is None:
+        response = jsonify({'error': 'Trop de flux de mises à jour ouverts'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    def stream():
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = subscriber.get(timeout=EVENTS_KEEPALIVE)
+            except queue.Empty:
+                # Commentaire SSE : garde la connexion ouverte à travers les
+                # proxys et détecte les clients partis
+                yield ': keepalive\n\n'
+                continue
+            yield f'data: {json.dumps(event)}\n\n'
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.call_on_close(lambda: task_events.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Export complet en flux : curseur serveur nommé lu par lots, réponse chunked
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+
+EXPORT_COLUMNS = [
+    'id', 'title', 'description', 'category_id', 'category_name', 'priority',
+    'status', 'due_date', 'created_at', 'updated_at',
+]
+
+# Repère du prochain export incrémental, renvoyé dans cet en-tête et à
+# repasser tel quel dans since= (calculé comme pour les sauvegardes, voir
+# BACKUP_WATERMARK_QUERY : updated_at est l'heure de début de la transaction
+# qui écrit, pas celle de son commit)
+EXPORT_WATERMARK_HEADER = 'X-Export-Watermark'
+
+def build_export_query(since=None, fields=EXPORT_COLUMNS, as_json=False):
+    # NDJSON : une ligne JSON déjà sérialisée par PostgreSQL et par tâche
+    columns = task_json_sql(fields, 'e') if as_json else ', '.join(f'e.{field}' for field in fields)
+    sql = '''
+        SELECT t.id, t.title, t.description, t.category_id, c.name AS category_name,
+               t.priority, t.status, t.due_date, t.created_at, t.updated_at
+        FROM tasks t
+        LEFT JOIN categories c ON t.category_id = c.id
+    '''
+    params = []
+    # >= : une ligne au repère exact n'est pas perdue (au prix d'un doublon)
+    if since:
+        sql += ' WHERE t.updated_at >= %s'
+        params.append(since)
+    sql = f'SELECT {columns} FROM ({sql}) e ORDER BY e.updated_at, e.id'
+    return sql, params
+
+def export_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+def export_batches(conn, query, params):
+    cur = conn.cursor(name='tasks_export')
+    cur.itersize = EXPORT_BATCH_SIZE
+    try:
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+        conn.close()
+
+def export_ndjson(batches, fields=EXPORT_COLUMNS):
+    for rows in batches:
+        yield ''.join(row[0] + '\n' for row in rows)
+
+def export_csv(batches, fields=EXPORT_COLUMNS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in batches:
+        writer.writerows([[export_value(value) for value in row] for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Export vide : envoyer au moins l'en-tête
+    if buffer.tell():
+        yield buffer.getvalue()
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', True),
+    'csv': (export_csv, 'text/csv', False),
+}
+
+@app.route('/api/tasks/export', methods=['GET'])
+def api_export_tasks():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Format non supporté: {export_format}'}), 400
+    
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({'error': f'Paramètre since invalide: {since}'}), 400
+    try:
+        fields = parse_task_fields(request.args, EXPORT_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Primaire : les transactions ouvertes n'apparaissent pas dans le
+    # pg_stat_activity d'une réplique, dont le retard ferait aussi perdre des
+    # lignes antérieures au repère
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
+    try:
+        cur = conn.cursor()
+        cur.execute(BACKUP_WATERMARK_QUERY)
+        watermark = cur.fetchone()[0].isoformat()
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        conn.close()
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+    
+    serializer, mimetype, as_json = EXPORT_FORMATS[export_format]
+    query, params = build_export_query(since, fields, as_json)
+    filename = f"tasks-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(serializer(export_batches(conn, query, params), fields)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            EXPORT_WATERMARK_HEADER: watermark,
+        }
+    )
+
+# Opérations en masse : une transaction et une requête par lot, résultat par élément
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '5000'))
+TASK_TITLE_MAX = 200
+
+def validate_bulk_task(item):
+    if not isinstance(item, dict) or not item.get('title'):
+        raise ValueError('Titre requis')
+    if not isinstance(item['title'], str) or len(item['title']) > TASK_TITLE_MAX:
+        raise ValueError(f'Titre invalide ({TASK_TITLE_MAX} caractères au plus)')
+    priority = item.get('priority') or 'medium'
+    if priority not in TASK_PRIORITIES:
+        raise ValueError(f'Priorité invalide: {priority}')
+    status = item.get('status') or 'pending'
+    if status not in TASK_STATUSES:
+        raise ValueError(f'Statut invalide: {status}')
+    category_id = item.get('category_id')
+    if category_id is not None:
+        if not str(category_id).isdigit() or int(category_id) > 2147483647:
+            raise ValueError(f'Catégorie invalide: {category_id}')
+        category_id = int(category_id)
+    due_date = item.get('due_date') or None
+    if due_date:
+        datetime.date.fromisoformat(due_date)
+    return (item['title'], item.get('description', ''), category_id, priority, status, due_date)
+
+# Catégories existantes parmi celles d'un lot, verrouillées jusqu'au commit
+# pour qu'une suppression concurrente ne fasse pas échouer l'insertion
+BULK_CATEGORIES_QUERY = 'SELECT id FROM categories WHERE id = ANY(%s::int[]) FOR KEY SHARE'
+
+def reject_unknown_categories(rows, indexes, results, known_ids):
+    kept_rows, kept_indexes = [], []
+    for row, index in zip(rows, indexes):
+        if row[2] is not None and row[2] not in known_ids:
+            results[index] = {'index': index, 'status': 'error', 'error': f'Catégorie inexistante: {row[2]}'}
+        else:
+            kept_rows.append(row)
+            kept_indexes.append(index)
+    return kept_rows, kept_indexes
+
+def parse_bulk_ids(data):
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('Liste ids requise')
+    if len(ids) > BULK_MAX_ITEMS:
+        raise ValueError(f'Au plus {BULK_MAX_ITEMS} éléments par requête')
+    if not all(isinstance(task_id, int) for task_id in ids):
+        raise ValueError('Les ids doivent être des entiers')
+    return ids
+
+def bulk_id_results(ids, done_ids, done_status):
+    done_ids = set(done_ids)
+    return [{'id': task_id, 'status': done_status if task_id in done_ids else 'not_found'}
+            for task_id in ids]
+
+@app.route('/api/tasks/bulk', methods=['POST'])
+def api_bulk_create_tasks():
+    try:
+        idempotency = request_idempotency_key()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    data = request.get_json(silent=True) or {}
+    items = data.get('tasks') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Liste tasks requise'}), 400
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({'error': f'Au plus {BULK_MAX_ITEMS} éléments par requête'}), 400
+    
+    results = [None] * len(items)
+    rows = []
+    indexes = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(validate_bulk_task(item))
+            indexes.append(index)
+        except (ValueError, TypeError) as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+    
+    if not rows:
+        return jsonify({'created': 0, 'results': results}), 400
+    
+    def work(cur):
+        created = list(results)
+        cur.execute(BULK_CATEGORIES_QUERY, (sorted({row[2] for row in rows if row[2] is not None}),))
+        valid_rows, valid_indexes = reject_unknown_categories(rows, indexes, created, {row['id'] for row in cur.fetchall()})
+        if not valid_rows:
+            return {'created': 0, 'results': created}, 400
+        # RETURNING conserve l'ordre des VALUES d'un même INSERT
+        ids = psycopg2.extras.execute_values(cur, '''
+            INSERT INTO tasks (title, description, category_id, priority, status, due_date)
+            VALUES %s RETURNING id
+        ''', valid_rows, page_size=len(valid_rows), fetch=True)
+        invalidate_cache(cur, 'tasks')
+        for index, row in zip(valid_indexes, ids):
+            created[index] = {'index': index, 'status': 'created', 'id': row['id']}
+        return {'created': len(valid_rows), 'results': created}, 201
+    
+    try:
+        return run_write(work, idempotency, retry_commit=False)
+    except Exception as e:
+        return jsonify({'error': f'Erreur lors de la création: {str(e)}'}), 500
+
+@app.route('/api/tasks/bulk/status', methods=['POST'])
+def api_bulk_update_status():
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_bulk_ids(data)
+        if data.get('status') not in TASK_STATUSES:
+            raise ValueError(f"Statut invalide: {data.get('status')}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
+        
+        cur = conn.cursor()
+        cur.execute('''
+            UPDATE tasks SET status = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ANY(%s)
+            RETURNING id
+        ''', (data['status'], ids))
+        updated = [row[0] for row in cur.fetchall()]
+        invalidate_cache(cur, 'tasks')
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return jsonify({'updated': len(updated), 'results': bulk_id_results(ids, updated, 'updated')})
+    except Exception as e:
+        return jsonify({'error': f'Erreur lors de la mise à jour: {str(e)}'}), 500
+
+@app.route('/api/tasks/bulk/delete', methods=['POST'])
+def api_bulk_delete_tasks():
+    try:
+        ids = parse_bulk_ids(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
         
         cur = conn.cursor()
         cur.execute('''
-            INSERT INTO tasks (title, description, category_id, priority, due_date) 
-            VALUES (%s, %s, %s, %s, %s) RETURNING id
-        ''', (data['title'], data['description'], data['category_id'], 
-              data['priority'], data['due_date']))
-        
-        task_id = cur.fetchone()[0]
+            WITH deleted AS (DELETE FROM tasks WHERE id = ANY(%s) RETURNING id)
+            SELECT id, NULL FROM deleted
+            UNION ALL
+            SELECT NULL, blob_name FROM task_files WHERE task_id = ANY(%s) AND blob_name IS NOT NULL
+        ''', (ids, ids))
+        rows = cur.fetchall()
+        deleted = [task_id for task_id, _ in rows if task_id is not None]
+        blob_names = [blob_name for _, blob_name in rows if blob_name is not None]
+        if blob_names:
+            enqueue_job(conn, 'delete_blobs', {'blobs': blob_names})
+        invalidate_cache(cur, 'tasks')
         conn.commit()
         cur.close()
         conn.close()
         
-        if request.is_json:
-            return jsonify({'id': task_id, 'message': 'Tâche créée avec succès'}), 201
-        else:
-            return redirect('/')
+        return jsonify({'deleted': len(deleted), 'results': bulk_id_results(ids, deleted, 'deleted')})
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de la création: {str(e)}'}), 500
+        return jsonify({'error': f'Erreur lors de la suppression: {str(e)}'}), 500
 
-@app.route('/tasks/<int:task_id>/complete', methods=['POST'])
-def complete_task(task_id):
+@app.route('/api/categories', methods=['GET'])
+def api_get_categories():
+    categories_list = cache_get('categories', 'list')
+    if categories_list is not None:
+        return jsonify({'categories': categories_list})
+    
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         if not conn:
-            return redirect('/')
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
         
-        cur = conn.cursor()
-        cur.execute('''
-            UPDATE tasks SET status = 'completed', updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s
-        ''', (task_id,))
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute_prepared(CATEGORIES_LIST_QUERY)
+        categories = cur.fetchall()
+        cur.close()
+        conn.close()
         
-        conn.commit()
+        categories_list = []
+        for cat in categories:
+            categories_list.append({
+                'id': cat['id'],
+                'name': cat['name'],
+                'color': cat['color'],
+                'created_at': cat['created_at'].isoformat() if cat['created_at'] else None
+            })
+        
+        cache_set('categories', 'list', categories_list)
+        return jsonify({'categories': categories_list})
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+def parse_stats_days(args):
+    value = args.get('days')
+    if not value:
+        return STATS_DAYS
+    if not value.isdigit() or not 1 <= int(value) <= STATS_MAX_DAYS:
+        raise ValueError(f"Paramètre days invalide: {value}")
+    return int(value)
+
+@app.route('/api/stats', methods=['GET'])
+def api_get_stats():
+    try:
+        days = parse_stats_days(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
+        
+        cur = conn.cursor()
+        cur.execute_prepared(STATS_QUERY, (days, days))
+        stats = cur.fetchone()[0]
         cur.close()
         conn.close()
         
-        return redirect('/')
+        stats['days'] = days
+        return jsonify(stats)
     except Exception as e:
-        return redirect('/')
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
-@app.route('/tasks/<int:task_id>/start', methods=['POST'])
-def start_task(task_id):
+# Sondes de santé exécutées en arrière-plan : les pages lisent le dernier
+# résultat au lieu de payer la latence de la sonde
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '15'))
+
+health_probes = {'database': None, 'storage': None}
+
+def probe_database():
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Erreur de connexion à la base de données')
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.close()
+    finally:
+        conn.close()
+
+def probe_storage():
+    blob_service_client = get_blob_service_client()
+    if not blob_service_client:
+        return 'disabled'
+    try:
+        blob_service_client.get_container_client(CONTAINER_NAME).get_container_properties()
+    except ResourceNotFoundError:
+        # Compte joignable, conteneur pas encore créé
+        pass
+
+HEALTH_PROBES = {
+    'database': probe_database,
+    'storage': probe_storage,
+}
+
+def run_health_probes():
+    for name, probe in HEALTH_PROBES.items():
+        start = time.perf_counter()
+        try:
+            result = {'status': probe() or 'ok'}
+        except Exception as e:
+            result = {'status': 'error', 'error': str(e)[:200]}
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        result['checked_at'] = datetime.datetime.now().isoformat()
+        health_probes[name] = result
+
+def health_probe_loop():
+    while True:
+        run_health_probes()
+        time.sleep(HEALTH_PROBE_INTERVAL)
+
+register_background_thread('health-prober', health_probe_loop)
+
+def probe_status_label(result):
+    if result is None:
+        return "⏳ Vérification en cours"
+    if result['status'] == 'ok':
+        return f"✅ Connecté ({result['latency_ms']} ms)"
+    if result['status'] == 'disabled':
+        return "❌ Non configuré"
+    return f"❌ Erreur: {result['error'][:50]}..."
+
+@app.route('/health')
+def health_check():
+    checks = dict(health_probes)
+    if any(check is None for check in checks.values()):
+        status = 'starting'
+    elif all(check['status'] in ('ok', 'disabled') for check in checks.values()):
+        status = 'healthy'
+    else:
+        status = 'degraded'
+    return jsonify({
+        'status': status, 
+        'message': 'TodoList Cloud opérationnelle',
+        'timestamp': datetime.datetime.now().isoformat(),
+        'version': '2.0.0',
+        'checks': checks,
+        'db_pool': db_pool.stats(),
+        'db_replicas': {replica.name: replica.stats() for replica in read_replicas},
+        'cache': cache_stats(),
+        'load_shedding': load_shedding_stats(),
+        'event_streams': task_events.count()
+    })
+
+def metrics_payload():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # Agrégation des fichiers de tous les workers gunicorn
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_payload(), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+# Écriture de test dans le stockage, exécutée par la file de travaux
+@app.route('/test-storage', methods=['POST'])
+def test_storage():
+    if not get_blob_service_client():
+        return jsonify({'error': 'Impossible de se connecter au stockage Azure'}), 500
+    return job_accepted('storage_test')
+
+# Sauvegardes de la base vers Blob Storage : COPY TO STDOUT compressé à la
+# volée, découpé en blocs envoyés en parallèle puis validés par commit_block_list
+BACKUP_PREFIX = 'backups'
+BACKUP_BLOCK_SIZE = int(os.getenv('BACKUP_BLOCK_SIZE', str(4 * 1024 * 1024)))
+BACKUP_UPLOAD_CONCURRENCY = int(os.getenv('BACKUP_UPLOAD_CONCURRENCY', '4'))
+
+# Colonnes sauvegardées (hors colonnes générées) et colonne de l'incrémental
+BACKUP_TABLES = [
+    ('categories', ['id', 'name', 'color', 'created_at'], None),
+    ('tasks', ['id', 'title', 'description', 'category_id', 'priority', 'status',
+               'due_date', 'created_at', 'updated_at'], 'updated_at'),
+    ('task_files', ['id', 'task_id', 'filename', 'blob_url', 'uploaded_at', 'blob_name',
+                    'content_type', 'size_bytes', 'status'], 'uploaded_at'),
+    ('tasks_archive', ARCHIVE_COLUMNS.split(', ') + ['archived_at'], 'archived_at'),
+]
+
+# Clé des upserts de la restauration (clé primaire de la table)
+BACKUP_CONFLICT_KEYS = {'tasks_archive': 'id, completed_at'}
+
+# Point de départ de l'incrémentale suivante. updated_at vaut l'heure de début
+# de la transaction qui écrit : une transaction en cours pendant l'instantané
+# n'y est pas visible, mais son horodatage peut lui être antérieur. Le repère
+# est donc le début de la plus ancienne transaction ouverte, lu avant
+# l'instantané (au prix de quelques lignes exportées deux fois).
+BACKUP_WATERMARK_QUERY = '''
+    SELECT LEAST(LOCALTIMESTAMP, MIN(xact_start)::timestamp)
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL
+'''
+
+
+class BlockBlobWriter:
+    # Fichier en écriture seule : chaque bloc plein est envoyé par stage_block
+    # dans un pool de threads, au plus BACKUP_UPLOAD_CONCURRENCY à la fois.
+    def __init__(self, blob_client, executor, block_size=BACKUP_BLOCK_SIZE,
+                 concurrency=BACKUP_UPLOAD_CONCURRENCY):
+        self.blob_client = blob_client
+        self.executor = executor
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.block_ids = []
+        self.futures = []
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.size += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._stage(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _stage(self, data):
+        block_id = base64.b64encode(f'{len(self.block_ids):08d}'.encode()).decode()
+        self.block_ids.append(block_id)
+        self.slots.acquire()
+        future = self.executor.submit(self.blob_client.stage_block, block_id, data)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def commit(self):
+        if self.buffer or not self.block_ids:
+            self._stage(bytes(self.buffer))
+            self.buffer.clear()
+        for future in self.futures:
+            future.result()
+        self.blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in self.block_ids])
+
+
+class ChunkReader(io.RawIOBase):
+    # Adapte le flux de download_blob().chunks() en fichier lisible
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def read_json_blob(container_client, name):
+    try:
+        return json.loads(container_client.get_blob_client(name).download_blob().readall())
+    except ResourceNotFoundError:
+        return None
+
+def copy_to_blob(cur, query, blob_client, executor):
+    writer = BlockBlobWriter(blob_client, executor)
+    with gzip.GzipFile(fileobj=writer, mode='wb') as compressed:
+        cur.copy_expert(f'COPY ({query}) TO STDOUT WITH CSV HEADER', compressed)
+    rows = cur.rowcount
+    writer.commit()
+    return rows, writer.size
+
+def copy_from_blob(cur, table, columns, blob_client):
+    chunks = blob_client.download_blob().chunks()
+    with gzip.GzipFile(fileobj=io.BufferedReader(ChunkReader(chunks)), mode='rb') as data:
+        cur.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH CSV HEADER', data)
+
+def backup_database(full=False):
+    container_client = get_storage_container()
+    latest = None if full else read_json_blob(container_client, f'{BACKUP_PREFIX}/latest.json')
+    since = latest.get('watermark', latest['snapshot_at']) if latest else None
+
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Erreur de connexion à la base de données')
+    cur = conn.cursor()
+    backup_id = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    manifest = {
+        'id': backup_id,
+        'type': 'incremental' if since else 'full',
+        'since': since,
+        'tables': {},
+    }
+    try:
+        cur.execute(BACKUP_WATERMARK_QUERY)
+        manifest['watermark'] = cur.fetchone()[0].isoformat()
+        conn.commit()
+        # Instantané cohérent entre les tables
+        cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        cur.execute('SELECT LOCALTIMESTAMP')
+        manifest['snapshot_at'] = cur.fetchone()[0].isoformat()
+
+        with concurrent.futures.ThreadPoolExecutor(BACKUP_UPLOAD_CONCURRENCY) as executor:
+            for table, columns, changed_column in BACKUP_TABLES:
+                query = f"SELECT {', '.join(columns)} FROM {table}"
+                if since and changed_column:
+                    query += cur.mogrify(f' WHERE {changed_column} >= %s', (since,)).decode()
+                blob_name = f'{BACKUP_PREFIX}/{backup_id}/{table}.csv.gz'
+                rows, size = copy_to_blob(cur, query, container_client.get_blob_client(blob_name), executor)
+                manifest['tables'][table] = {'blob': blob_name, 'rows': rows, 'bytes': size}
+                if since and changed_column:
+                    # Clés présentes dans l'instantané : la restauration en
+                    # déduit les lignes supprimées depuis la sauvegarde précédente
+                    keys_blob = f'{BACKUP_PREFIX}/{backup_id}/{table}.keys.csv.gz'
+                    keys, _ = copy_to_blob(cur, f"SELECT {BACKUP_CONFLICT_KEYS.get(table, 'id')} FROM {table}",
+                                           container_client.get_blob_client(keys_blob), executor)
+                    manifest['tables'][table].update({'keys_blob': keys_blob, 'keys': keys})
+    finally:
+        cur.close()
+        conn.close()
+
+    manifest_json = json.dumps(manifest, indent=2)
+    container_client.upload_blob(f'{BACKUP_PREFIX}/{backup_id}/manifest.json', manifest_json, overwrite=True)
+    container_client.upload_blob(f'{BACKUP_PREFIX}/latest.json', manifest_json, overwrite=True)
+    return manifest
+
+def restore_backup(backup_id):
+    container_client = get_storage_container()
+    manifest = read_json_blob(container_client, f'{BACKUP_PREFIX}/{backup_id}/manifest.json')
+    if not manifest:
+        raise ValueError(f'Sauvegarde introuvable: {backup_id}')
+
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Erreur de connexion à la base de données')
+    cur = conn.cursor()
+    try:
+        # COPY dans une table temporaire puis upsert : une sauvegarde
+        # incrémentale s'applique par-dessus la précédente
+        key_tables = {}
+        for table, columns, changed_column in BACKUP_TABLES:
+            if table not in manifest['tables']:
+                # Sauvegarde antérieure à la table
+                continue
+            column_list = ', '.join(columns)
+            conflict_key = BACKUP_CONFLICT_KEYS.get(table, 'id')
+            updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns
+                                if column not in conflict_key.split(', '))
+            cur.execute(f'CREATE TEMP TABLE restore_{table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP')
+            copy_from_blob(cur, f'restore_{table}', column_list,
+                           container_client.get_blob_client(manifest['tables'][table]['blob']))
+            # Clés de l'instantané : toutes les lignes d'une sauvegarde complète,
+            # ou la liste jointe à l'incrémentale (absente avant son ajout)
+            if manifest['type'] == 'full' or not changed_column:
+                key_tables[table] = f'restore_{table}'
+            elif 'keys_blob' in manifest['tables'][table]:
+                cur.execute(f'CREATE TEMP TABLE restore_keys_{table} ON COMMIT DROP AS SELECT {conflict_key} FROM {table} WITH NO DATA')
+                copy_from_blob(cur, f'restore_keys_{table}', conflict_key,
+                               container_client.get_blob_client(manifest['tables'][table]['keys_blob']))
+                key_tables[table] = f'restore_keys_{table}'
+            if table == 'tasks_archive':
+                cur.execute("SELECT DISTINCT date_trunc('month', completed_at)::date FROM restore_tasks_archive")
+                create_archive_partitions(conn, [month for (month,) in cur.fetchall()])
+            cur.execute(f'''
+                INSERT INTO {table} ({column_list})
+                SELECT {column_list} FROM restore_{table}
+                ON CONFLICT ({conflict_key}) DO UPDATE SET {updates}
+            ''')
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}")
+        # Lignes supprimées avant l'instantané, en commençant par les tables
+        # qui référencent les autres
+        for table, _, _ in reversed(BACKUP_TABLES):
+            if table in key_tables:
+                matches = ' AND '.join(f'k.{column} = t.{column}' for column in BACKUP_CONFLICT_KEYS.get(table, 'id').split(', '))
+                cur.execute(f'DELETE FROM {table} t WHERE NOT EXISTS (SELECT 1 FROM {key_tables[table]} k WHERE {matches})')
+        # Tâches archivées après la sauvegarde complète : l'incrémentale les
+        # contient dans l'archive, elles quittent la table active
+        cur.execute('DELETE FROM tasks t USING tasks_archive a WHERE a.id = t.id')
+        invalidate_cache(cur, *CACHE_NAMESPACES)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    return manifest
+
+# Pièces jointes : le client envoie et télécharge les fichiers directement
+# dans Blob Storage avec des URL SAS courtes, sans passer par Flask
+ATTACHMENT_SAS_TTL = int(os.getenv('ATTACHMENT_SAS_TTL', '900'))
+# Au-delà, le client découpe l'envoi en Put Block + Put Block List
+ATTACHMENT_SINGLE_PUT_MAX = int(os.getenv('ATTACHMENT_SINGLE_PUT_MAX', str(8 * 1024 * 1024)))
+ATTACHMENT_BLOCK_SIZE = int(os.getenv('ATTACHMENT_BLOCK_SIZE', str(8 * 1024 * 1024)))
+
+def parse_attachment_request(data):
+    # Validé avant l'insertion de la ligne pending : une erreur ne laisse rien en base
+    filename = secure_filename(data.get('filename') or '')
+    if not filename:
+        raise ValueError('Nom de fichier requis')
+    content_type = data.get('content_type') or 'application/octet-stream'
+    if not isinstance(content_type, str) or len(content_type) > 255:
+        raise ValueError('Type de contenu invalide')
+    size = data.get('size')
+    if size is not None:
+        if isinstance(size, bool) or not str(size).isdigit():
+            raise ValueError(f'Taille invalide: {size}')
+        size = int(size)
+    return filename, content_type, size
+
+def attachment_sas_url(blob_client, permission, **kwargs):
+    now = datetime.datetime.utcnow()
+    sas = generate_blob_sas(
+        account_name=blob_client.account_name,
+        container_name=blob_client.container_name,
+        blob_name=blob_client.blob_name,
+        account_key=blob_client.credential.account_key,
+        permission=permission,
+        # Marge pour le décalage d'horloge du client
+        start=now - datetime.timedelta(minutes=5),
+        expiry=now + datetime.timedelta(seconds=ATTACHMENT_SAS_TTL),
+        **kwargs
+    )
+    return f'{blob_client.url}?{sas}'
+
+def attachment_dict(row):
+    return {
+        'id': row['id'],
+        'task_id': row['task_id'],
+        'filename': row['filename'],
+        'content_type': row['content_type'],
+        'size_bytes': row['size_bytes'],
+        'status': row['status'],
+        'uploaded_at': row['uploaded_at'].isoformat() if row['uploaded_at'] else None,
+        'download_url': url_for('api_download_task_file', task_id=row['task_id'], file_id=row['id'])
+    }
+
+def delete_blobs(blob_names):
+    # Renvoie les blobs non supprimés (le travail delete_blobs est alors rejoué)
+    container_client = get_storage_container()
+    failed = []
+    for blob_name in blob_names:
+        try:
+            container_client.delete_blob(blob_name, delete_snapshots='include')
+        except ResourceNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur lors de la suppression du blob {blob_name}: {e}")
+            failed.append(blob_name)
+    return failed
+
+@app.route('/api/tasks/<int:task_id>/files', methods=['POST'])
+def api_create_task_file(task_id):
+    data = request.get_json(silent=True)
+    try:
+        filename, content_type, size = parse_attachment_request(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
+        container_client = get_storage_container()
+        blob_name = f'attachments/{task_id}/{uuid.uuid4().hex}/{filename}'
+        blob_client = container_client.get_blob_client(blob_name)
+        
         conn = get_db_connection()
         if not conn:
-            return redirect('/')
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
         
-        cur = conn.cursor()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute('''
-            UPDATE tasks SET status = 'in-progress', updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s
-        ''', (task_id,))
-        
+            INSERT INTO task_files (task_id, filename, blob_name, blob_url, content_type, status)
+            SELECT id, %s, %s, %s, %s, 'pending' FROM tasks WHERE id = %s
+            RETURNING id
+        ''', (filename, blob_name, blob_client.url, content_type, task_id))
+        row = cur.fetchone()
         conn.commit()
         cur.close()
         conn.close()
+        if not row:
+            return jsonify({'error': 'Tâche introuvable'}), 404
         
-        return redirect('/')
+        chunked = size is not None and size > ATTACHMENT_SINGLE_PUT_MAX
+        return jsonify({
+            'id': row['id'],
+            'upload_url': attachment_sas_url(blob_client, BlobSasPermissions(create=True, write=True)),
+            'expires_in': ATTACHMENT_SAS_TTL,
+            'method': 'PUT',
+            'headers': {'x-ms-blob-type': 'BlockBlob', 'x-ms-blob-content-type': content_type},
+            'chunked': chunked,
+            'block_size': ATTACHMENT_BLOCK_SIZE,
+            'complete_url': url_for('api_complete_task_file', task_id=task_id, file_id=row['id'])
+        }), 201
     except Exception as e:
-        return redirect('/')
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
-@app.route('/tasks/<int:task_id>/delete', methods=['POST'])
-def delete_task(task_id):
+@app.route('/api/tasks/<int:task_id>/files/<int:file_id>/complete', methods=['POST'])
+def api_complete_task_file(task_id, file_id):
     try:
         conn = get_db_connection()
         if not conn:
-            return redirect('/')
+            return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
         
-        cur = conn.cursor()
-        cur.execute('DELETE FROM tasks WHERE id = %s', (task_id,))
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute('SELECT blob_name FROM task_files WHERE id = %s AND task_id = %s', (file_id, task_id))
+        row = cur.fetchone()
+        if not row:
+            return jsonify({'error': 'Fichier introuvable'}), 404
         
+        # Le blob doit avoir été validé par le client (Put Blob ou Put Block List)
+        try:
+            properties = get_storage_container().get_blob_client(row['blob_name']).get_blob_properties()
+        except ResourceNotFoundError:
+            return jsonify({'error': 'Envoi du fichier non terminé'}), 409
+        
+        cur.execute('''
+            UPDATE task_files
+            SET status = 'uploaded', size_bytes = %s, content_type = %s, uploaded_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            RETURNING *
+        ''', (properties.size, properties.content_settings.content_type, file_id))
+        task_file = cur.fetchone()
         conn.commit()
         cur.close()
         conn.close()
         
-        return redirect('/')
+        return jsonify(attachment_dict(task_file))
     except Exception as e:
-        return redirect('/')
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
-# API endpoints
-@app.route('/api/tasks', methods=['GET'])
-def api_get_tasks():
+@app.route('/api/tasks/<int:task_id>/files', methods=['GET'])
+def api_get_task_files(task_id):
     try:
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
         
-        cur = conn.cursor()
-        cur.execute('''
-            SELECT t.*, c.name as category_name, c.color as category_color
-            FROM tasks t
-            LEFT JOIN categories c ON t.category_id = c.id
-            ORDER BY t.created_at DESC
-        ''')
-        tasks = cur.fetchall()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute('SELECT * FROM task_files WHERE task_id = %s ORDER BY uploaded_at, id', (task_id,))
+        files = cur.fetchall()
         cur.close()
         conn.close()
         
-        tasks_list = []
-        for task in tasks:
-            tasks_list.append({
-                'id': task[0],
-                'title': task[1],
-                'description': task[2],
-                'category_id': task[3],
-                'priority': task[4],
-                'status': task[6],
-                'due_date': task[7].isoformat() if task[7] else None,
-                'created_at': task[8].isoformat() if task[8] else None,
-                'category_name': task[10] if len(task) > 10 else None,
-                'category_color': task[11] if len(task) > 11 else None
-            })
-        
-        return jsonify({'tasks': tasks_list})
+        return jsonify({'files': [attachment_dict(row) for row in files]})
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
-@app.route('/api/categories', methods=['GET'])
-def api_get_categories():
+@app.route('/api/tasks/<int:task_id>/files/<int:file_id>', methods=['GET'])
+def api_download_task_file(task_id, file_id):
     try:
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
         
         cur = conn.cursor()
-        cur.execute('SELECT * FROM categories ORDER BY name')
-        categories = cur.fetchall()
+        cur.execute('''
+            SELECT blob_name, filename FROM task_files
+            WHERE id = %s AND task_id = %s AND status = 'uploaded'
+        ''', (file_id, task_id))
+        row = cur.fetchone()
         cur.close()
         conn.close()
+        if not row:
+            return jsonify({'error': 'Fichier introuvable'}), 404
         
-        categories_list = []
-        for cat in categories:
-            categories_list.append({
-                'id': cat[0],
-                'name': cat[1],
-                'color': cat[2],
-                'created_at': cat[3].isoformat() if cat[3] else None
-            })
-        
-        return jsonify({'categories': categories_list})
+        blob_name, filename = row
+        blob_client = get_storage_container().get_blob_client(blob_name)
+        return redirect(attachment_sas_url(
+            blob_client, BlobSasPermissions(read=True),
+            content_disposition=f'attachment; filename="{filename}"'
+        ))
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
-@app.route('/health')
-def health_check():
-    return jsonify({
-        'status': 'healthy', 
-        'message': 'TodoList Cloud opérationnelle',
+@app.route('/api/backups', methods=['POST'])
+def api_create_backup():
+    return job_accepted('backup', {'full': request.args.get('full') == '1'})
+
+@app.cli.command('backup')
+@click.option('--full', is_flag=True, help="Sauvegarde complète même si une sauvegarde existe.")
+def backup_command(full):
+    """Sauvegarde la base dans le conteneur Blob Storage."""
+    manifest = backup_database(full=full)
+    print(json.dumps(manifest, indent=2))
+
+@app.cli.command('restore')
+@click.argument('backup_id')
+def restore_command(backup_id):
+    """Restaure une sauvegarde (appliquer la complète puis les incrémentales)."""
+    manifest = restore_backup(backup_id)
+    print(f"Sauvegarde {manifest['id']} ({manifest['type']}) restaurée")
+
+# Requêtes représentatives de l'application pour la vérification des plans
+def app_query_samples():
+    today = datetime.date.today().isoformat()
+    cursor_created = encode_cursor('created', {'created_at': datetime.datetime.now(), 'id': 1})
+    cursor_priority = encode_cursor('priority', {'priority_rank': 2, 'created_at': datetime.datetime.now(), 'id': 1})
+    samples = [
+        ('home', *build_home_query({})),
+        ('home page suivante', *build_home_query({}, cursor_priority)),
+        ('home filtrée', *build_home_query({'status': 'pending', 'category_id': 1})),
+        ('api tasks', *build_task_page_query({})),
+        ('api tasks page suivante', *build_task_page_query({}, 'created', cursor_created)),
+        ('api tasks par catégorie', *build_task_page_query({'category_id': 1})),
+        ('api tasks par échéance', *build_task_page_query({'due_date': today})),
+        ('api tasks avec archives', *build_task_page_query({}, archived=True)),
+        ('api tasks avec archives page suivante', *build_task_page_query({}, 'created', cursor_created, archived=True)),
+        ('api categories', CATEGORIES_LIST_QUERY, []),
+        ('recherche plein texte', *build_task_page_query({}, 'relevance', search=['projet'])),
+        ('recherche approchée', *build_task_page_query({}, 'similarity', search=['projte'])),
+        ('statistiques', STATS_QUERY, [STATS_DAYS, STATS_DAYS]),
+        ('fichiers d\'une tâche', 'SELECT * FROM task_files WHERE task_id = %s', [1]),
+        ('export incrémental', *build_export_query(datetime.datetime.now())),
+    ]
+    return samples
+
+def find_seq_scans(plan):
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child))
+    return found
+
+@app.cli.command('check-query-plans')
+@click.option('--max-rows', default=1000, show_default=True,
+              help="Taille de table au-delà de laquelle un Seq Scan est refusé.")
+def check_query_plans_command(max_rows):
+    """Échoue si une requête de l'application prévoit un Seq Scan sur une grande table."""
+    conn = get_db_connection()
+    if not conn:
+        raise click.ClickException("Erreur de connexion à la base de données")
+    cur = conn.cursor()
+    failures = []
+    try:
+        for name, query, params in app_query_samples():
+            try:
+                cur.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+            except psycopg2.errors.UndefinedFunction:
+                # Extension optionnelle absente (pg_trgm)
+                conn.rollback()
+                print(f"⏭️ {name} (extension absente)")
+                continue
+            plan = cur.fetchone()[0][0]['Plan']
+            problems = []
+            for relation in find_seq_scans(plan):
+                cur.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', (relation,))
+                rows = cur.fetchone()[0]
+                if rows > max_rows:
+                    problems.append(f"{name}: Seq Scan sur {relation} (~{rows} lignes)")
+            print(f"{'❌' if problems else '✅'} {name}")
+            failures.extend(problems)
+    finally:
+        cur.close()
+        conn.close()
+    if failures:
+        raise click.ClickException('\n'.join(failures))
+
+def check_task_stats(cur):
+    # Nombre d'écarts par table entre les compteurs et un recalcul complet
+    mismatches = {}
+    for table, (keys, counter, expected) in TASK_STATS_TABLES.items():
+        cur.execute(f'''
+            WITH stored AS (SELECT {keys}, {counter} FROM {table} WHERE {counter} <> 0),
+                 expected AS ({expected.format(source=TASK_STATS_SOURCE)})
+            SELECT COUNT(*) FROM (
+                (TABLE stored EXCEPT TABLE expected)
+                UNION ALL
+                (TABLE expected EXCEPT TABLE stored)
+            ) d
+        ''')
+        mismatches[table] = cur.fetchone()[0]
+    return mismatches
+
+def verify_task_stats(conn, rebuild=False):
+    cur = conn.cursor()
+    try:
+        # Compteurs et tâches lus dans le même instantané
+        cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        mismatches = check_task_stats(cur)
+        conn.rollback()
+        if any(mismatches.values()) and rebuild:
+            # Écritures sur tasks suspendues pendant le recalcul, lectures possibles
+            cur.execute('LOCK TABLE tasks, tasks_archive IN SHARE MODE')
+            for statement in task_stats_rebuild_statements():
+                cur.execute(statement)
+            conn.commit()
+    finally:
+        cur.close()
+    return mismatches
+
+@app.cli.command('check-stats')
+@click.option('--rebuild', is_flag=True, help="Reconstruire les compteurs en cas d'écart.")
+def check_stats_command(rebuild):
+    """Compare les statistiques matérialisées à un recalcul complet sur tasks."""
+    conn = get_db_connection()
+    if not conn:
+        raise click.ClickException("Erreur de connexion à la base de données")
+    try:
+        mismatches = verify_task_stats(conn, rebuild)
+    finally:
+        conn.close()
+    for table, count in mismatches.items():
+        print(f"{'❌' if count else '✅'} {table}" + (f" ({count} écarts)" if count else ''))
+    if any(mismatches.values()) and rebuild:
+        print("🔧 Statistiques reconstruites")
+    if any(mismatches.values()) and not rebuild:
+        raise click.ClickException("Statistiques incohérentes : relancer avec --rebuild")
+
+# Archivage : les tâches terminées depuis plus de ARCHIVE_AFTER_DAYS jours
+# (sans pièce jointe) quittent tasks pour tasks_archive, partitionnée par mois
+# de complétion. Une partition entièrement plus ancienne que
+# ARCHIVE_RETENTION_DAYS est supprimée d'un bloc (0 : historique conservé).
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '0'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+ARCHIVE_INTERVAL = float(os.getenv('ARCHIVE_INTERVAL', '3600'))
+ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', '0'))
+
+ARCHIVE_CANDIDATES = '''
+    FROM tasks t
+    WHERE status = 'completed' AND completed_at < %s
+      AND NOT EXISTS (SELECT 1 FROM task_files f WHERE f.task_id = t.id)
+'''
+
+# Un lot par transaction : tâches verrouillées (SKIP LOCKED : une tâche en
+# cours de modification attend le passage suivant), partitions de leurs mois,
+# puis déplacement par une seule instruction
+ARCHIVE_LOCK_BATCH_QUERY = f'''
+    SELECT id, date_trunc('month', completed_at)::date AS month {ARCHIVE_CANDIDATES}
+    ORDER BY completed_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+'''
+
+ARCHIVE_BATCH_QUERY = f'''
+    WITH moved AS (
+        DELETE FROM tasks WHERE id = ANY(%s)
+        RETURNING {ARCHIVE_COLUMNS}
+    )
+    INSERT INTO tasks_archive ({ARCHIVE_COLUMNS}) SELECT {ARCHIVE_COLUMNS} FROM moved
+'''
+
+def archive_partition_name(month):
+    return f'tasks_archive_{month:%Y_%m}'
+
+def create_archive_partitions(conn, months):
+    # Partitions manquantes, créées dans la transaction qui y insère : elles
+    # disparaissent avec elle en cas d'échec. Une partition existante n'est
+    # pas recréée (CREATE ... PARTITION OF verrouille toute l'archive).
+    cur = conn.cursor()
+    for month in sorted(set(months)):
+        cur.execute('SELECT to_regclass(%s)', (archive_partition_name(month),))
+        if cur.fetchone()[0] is not None:
+            continue
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {archive_partition_name(month)}
+            PARTITION OF tasks_archive FOR VALUES FROM (%s) TO (%s)
+        ''', (month, next_month))
+    cur.close()
+
+def drop_archive_partitions(conn, before):
+    # Partitions dont tout le mois précède before : DROP, sans DELETE ligne à ligne
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'tasks_archive'::regclass ORDER BY 1
+    ''')
+    dropped = []
+    for (name,) in cur.fetchall():
+        match = re.fullmatch(r'tasks_archive_(\d{4})_(\d{2})', name)
+        if not match:
+            continue
+        month = datetime.date(int(match[1]), int(match[2]), 1)
+        if (month + datetime.timedelta(days=32)).replace(day=1) <= before:
+            # DROP ne déclenche pas les triggers : retirer les lignes des
+            # compteurs, partition verrouillée jusqu'à sa suppression
+            cur.execute(f'LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE')
+            cur.execute('SELECT apply_task_stats(%s)', (
+                f'SELECT category_id, priority, status, due_date, completed_at, -1 AS delta FROM {name}',))
+            cur.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+    cur.close()
+    return dropped
+
+def archive_completed_tasks(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+
+    def move_batch(cur):
+        cur.execute(ARCHIVE_LOCK_BATCH_QUERY, (cutoff, batch_size))
+        batch = cur.fetchall()
+        if not batch:
+            return 0
+        create_archive_partitions(cur.connection, [row['month'] for row in batch])
+        cur.execute(ARCHIVE_BATCH_QUERY, ([row['id'] for row in batch],))
+        invalidate_cache(cur, 'tasks')
+        return len(batch)
+
+    archived = 0
+    while True:
+        moved = run_transaction(move_batch, retry_commit=True)
+        archived += moved
+        if moved < batch_size:
+            break
+
+    dropped = []
+    if ARCHIVE_RETENTION_DAYS > 0:
+        before = datetime.date.today() - datetime.timedelta(days=ARCHIVE_RETENTION_DAYS)
+        dropped = run_transaction(lambda cur: drop_archive_partitions(cur.connection, before))
+    return {'archived': archived, 'cutoff': cutoff.isoformat(), 'dropped_partitions': dropped}
+
+@app.cli.command('archive')
+@click.option('--days', type=int, default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help="Ancienneté minimale de la complétion, en jours.")
+def archive_command(days):
+    """Déplace les tâches terminées anciennes vers tasks_archive."""
+    if days <= 0:
+        raise click.ClickException("Préciser --days ou ARCHIVE_AFTER_DAYS")
+    print(json.dumps(archive_completed_tasks(days), indent=2))
+
+# File de travaux en base : les opérations lentes (stockage, sauvegardes,
+# maintenance) sont enregistrées dans la table jobs et la requête rend aussitôt
+# leur identifiant. Chaque processus réserve ses travaux par FOR UPDATE SKIP
+# LOCKED sous un bail prolongé tant qu'ils tournent : le travail d'un processus
+# arrêté redevient disponible à l'expiration du bail.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '5'))
+JOB_LEASE = float(os.getenv('JOB_LEASE', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', '30'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+JOB_SCHEDULE_CHECK = 60
+JOBS_CHANNEL = 'todolist_jobs'
+JOBS_CLAIM_LOCK_ID = 482_017_002
+
+BACKUP_INTERVAL = float(os.getenv('BACKUP_INTERVAL', '0'))
+ATTACHMENT_GC_INTERVAL = float(os.getenv('ATTACHMENT_GC_INTERVAL', '3600'))
+ATTACHMENT_PENDING_TTL = float(os.getenv('ATTACHMENT_PENDING_TTL', '86400'))
+
+JOB_ENQUEUE_QUERY = '''
+    INSERT INTO jobs (kind, payload, max_attempts, dedupe_key) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+    RETURNING id
+'''
+
+JOB_STATUS_QUERY = '''
+    SELECT row_to_json(j)::text FROM (
+        SELECT id, kind, status, attempts, max_attempts, result, error,
+               created_at, run_at, started_at, finished_at
+        FROM jobs WHERE id = %s
+    ) j
+'''
+
+# Un seul travail réservé par requête. Les réservations sont sérialisées par
+# un verrou consultatif de transaction pour que le nombre de travaux d'un même
+# type en cours ne dépasse jamais sa limite, sur l'ensemble des processus.
+JOB_CLAIM_QUERY = '''
+    WITH limits AS (
+        SELECT * FROM unnest(%s::text[], %s::int[]) AS l(kind, max_running)
+    ), running AS (
+        SELECT kind, COUNT(*) AS running FROM jobs
+        WHERE status = 'running' AND locked_until > CURRENT_TIMESTAMP
+        GROUP BY kind
+    )
+    UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP,
+                    locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+    WHERE id = (
+        SELECT j.id FROM jobs j
+        JOIN limits l ON l.kind = j.kind
+        LEFT JOIN running r ON r.kind = j.kind
+        WHERE ((j.status = 'queued' AND j.run_at <= CURRENT_TIMESTAMP)
+               OR (j.status = 'running' AND j.locked_until <= CURRENT_TIMESTAMP))
+          AND COALESCE(r.running, 0) < l.max_running
+        ORDER BY j.run_at, j.id
+        LIMIT 1
+        FOR UPDATE OF j SKIP LOCKED
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+'''
+
+JOB_FINISH_QUERY = '''
+    UPDATE jobs SET status = %(status)s, result = %(result)s, error = %(error)s, locked_until = NULL,
+                    run_at = CURRENT_TIMESTAMP + make_interval(secs => %(delay)s),
+                    finished_at = CASE WHEN %(status)s = 'queued' THEN NULL ELSE CURRENT_TIMESTAMP END
+    WHERE id = %(id)s AND attempts = %(attempts)s AND status = 'running'
+'''
+
+def enqueue_job(conn, kind, payload=None, dedupe_key=None):
+    # Dans la transaction de l'appelant : le travail n'existe que si elle est
+    # validée. None si un travail porte déjà la même dedupe_key.
+    cur = conn.cursor()
+    cur.execute(JOB_ENQUEUE_QUERY, (kind, json.dumps(payload or {}), JOB_MAX_ATTEMPTS, dedupe_key))
+    row = cur.fetchone()
+    if row:
+        cur.execute('SELECT pg_notify(%s, %s)', (JOBS_CHANNEL, kind))
+    cur.close()
+    return row[0] if row else None
+
+def job_accepted(kind, payload=None):
+    try:
+        job_id = run_transaction(lambda cur: enqueue_job(cur.connection, kind, payload))
+    except Exception as e:
+        return jsonify({'error': f"Erreur lors de l'enregistrement du travail: {str(e)}"}), 500
+    status_url = url_for('api_get_job', job_id=job_id)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url}), 202, {'Location': status_url}
+
+def finish_job(job, result=None, error=None):
+    if error is None:
+        status, delay = 'succeeded', 0
+    elif job['attempts'] < job['max_attempts']:
+        status, delay = 'queued', JOB_RETRY_DELAY * 2 ** (job['attempts'] - 1)
+    else:
+        status, delay = 'failed', 0
+    
+    def work(cur):
+        # Bail perdu entre-temps (travail repris ailleurs) : ne rien écraser
+        cur.execute(JOB_FINISH_QUERY, {
+            'status': status,
+            'result': json.dumps(result, default=str) if result is not None else None,
+            'error': error,
+            'delay': delay,
+            'id': job['id'],
+            'attempts': job['attempts'],
+        })
+        # Place libérée : réveiller les processus en attente de ce type
+        cur.execute('SELECT pg_notify(%s, %s)', (JOBS_CHANNEL, job['kind']))
+    
+    run_transaction(work, retry_commit=True)
+    return status
+
+def run_job(job):
+    start = time.perf_counter()
+    function, _ = JOB_KINDS[job['kind']]
+    if job['attempts'] > job['max_attempts']:
+        # Bail expiré à la dernière tentative (processus arrêté en cours de route)
+        status = finish_job(job, error='Bail expiré')
+    else:
+        try:
+            status = finish_job(job, result=function(job['payload']))
+        except Exception as e:
+            print(f"Travail {job['id']} ({job['kind']}) en échec, tentative {job['attempts']}/{job['max_attempts']}: {e}")
+            status = finish_job(job, error=str(e)[:1000])
+    JOB_SECONDS.labels(job['kind'], status).observe(time.perf_counter() - start)
+
+def schedule_jobs(conn):
+    # Une clé par période : un seul processus enregistre le travail périodique
+    now = time.time()
+    for kind, interval in JOB_SCHEDULES.items():
+        if interval > 0:
+            enqueue_job(conn, kind, dedupe_key=f'{kind}:{int(now // interval)}')
+    cur = conn.cursor()
+    cur.execute('''
+        DELETE FROM jobs WHERE status IN ('succeeded', 'failed')
+        AND finished_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+    ''', (JOB_RETENTION_DAYS,))
+    cur.close()
+
+def job_dispatcher_loop(workers=JOB_WORKERS):
+    executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='job')
+    running = {}
+    kinds = list(JOB_KINDS)
+    limits = [JOB_KINDS[kind][1] for kind in kinds]
+    last_heartbeat = last_schedule = 0
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**db_pool.conn_kwargs)
+            conn.autocommit = True
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.execute(f'LISTEN {JOBS_CHANNEL}')
+            while True:
+                for job_id in [job_id for job_id, future in running.items() if future.done()]:
+                    del running[job_id]
+                now = time.monotonic()
+                if running and now - last_heartbeat >= JOB_LEASE / 3:
+                    cur.execute('''
+                        UPDATE jobs SET locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                        WHERE id = ANY(%s) AND status = 'running'
+                    ''', (JOB_LEASE, list(running)))
+                    last_heartbeat = now
+                if now - last_schedule >= JOB_SCHEDULE_CHECK:
+                    schedule_jobs(conn)
+                    last_schedule = now
+                while len(running) < workers:
+                    cur.execute('BEGIN')
+                    cur.execute('SELECT pg_advisory_xact_lock(%s)', (JOBS_CLAIM_LOCK_ID,))
+                    cur.execute(JOB_CLAIM_QUERY, (kinds, limits, JOB_LEASE))
+                    job = cur.fetchone()
+                    cur.execute('COMMIT')
+                    if job is None:
+                        break
+                    running[job['id']] = executor.submit(run_job, job)
+                # Réveil par NOTIFY à chaque travail ajouté ou terminé, sinon toutes
+                # les JOB_POLL_INTERVAL secondes (reprises différées, baux expirés)
+                if select.select([conn], [], [], JOB_POLL_INTERVAL) != ([], [], []):
+                    conn.poll()
+                    conn.notifies.clear()
+        except Exception as e:
+            print(f"File de travaux interrompue: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def storage_test_job(payload):
+    container_client = get_storage_container()
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Erreur de connexion à la base de données')
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) FROM tasks')
+        task_count = cur.fetchone()[0]
+        cur.close()
+    finally:
+        conn.close()
+    
+    backup_data = {
         'timestamp': datetime.datetime.now().isoformat(),
-        'version': '2.0.0'
-    })
+        'task_count': task_count,
+        'backup_type': 'test'
+    }
+    blob_name = f"backup-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    container_client.upload_blob(blob_name, json.dumps(backup_data), overwrite=True)
+    return {'backup_created': True, 'blob': blob_name, 'task_count': task_count}
 
-@app.route('/test-storage', methods=['POST'])
-def test_storage():
+def backup_job(payload):
+    return backup_database(full=bool(payload.get('full')))
+
+def delete_blobs_job(payload):
+    failed = delete_blobs(payload['blobs'])
+    if failed:
+        raise RuntimeError(f"{len(failed)} blobs non supprimés")
+    return {'deleted': len(payload['blobs'])}
+
+def attachments_gc_job(payload):
+    # Pièces jointes déclarées mais jamais validées : lignes supprimées et
+    # blobs confiés à un travail delete_blobs dans la même transaction
+    def work(cur):
+        cur.execute('''
+            DELETE FROM task_files
+            WHERE status = 'pending' AND uploaded_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            RETURNING blob_name
+        ''', (ATTACHMENT_PENDING_TTL,))
+        blob_names = [row['blob_name'] for row in cur.fetchall() if row['blob_name']]
+        if blob_names:
+            enqueue_job(cur.connection, 'delete_blobs', {'blobs': blob_names})
+        return {'files': cur.rowcount, 'blobs': len(blob_names)}
+    return run_transaction(work)
+
+def archive_job(payload):
+    return archive_completed_tasks(int(payload.get('days') or ARCHIVE_AFTER_DAYS))
+
+def stats_rebuild_job(payload):
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Erreur de connexion à la base de données')
+    try:
+        mismatches = verify_task_stats(conn, rebuild=True)
+    finally:
+        conn.close()
+    return {'mismatches': mismatches, 'rebuilt': any(mismatches.values())}
+
+# Type de travail -> (fonction(payload) -> résultat JSON, travaux simultanés au plus)
+JOB_KINDS = {
+    'storage_test': (storage_test_job, 2),
+    'backup': (backup_job, 1),
+    'delete_blobs': (delete_blobs_job, 4),
+    'attachments_gc': (attachments_gc_job, 1),
+    'stats_rebuild': (stats_rebuild_job, 1),
+    'archive': (archive_job, 1),
+}
+
+# Travaux périodiques (intervalle en secondes, 0 pour désactiver)
+JOB_SCHEDULES = {
+    'backup': BACKUP_INTERVAL,
+    'attachments_gc': ATTACHMENT_GC_INTERVAL,
+    'archive': ARCHIVE_INTERVAL if ARCHIVE_AFTER_DAYS > 0 else 0,
+}
+
+if JOB_WORKERS > 0:
+    register_background_thread('jobs', job_dispatcher_loop)
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def api_get_job(job_id):
     try:
-        blob_service_client = get_blob_service_client()
-        if not blob_service_client:
-            return jsonify({'error': 'Impossible de se connecter au stockage Azure'}), 500
-        
-        # Créer un backup des tâches
         conn = get_db_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute('SELECT COUNT(*) FROM tasks')
-            task_count = cur.fetchone()[0]
-            cur.close()
-            conn.close()
-            
-            backup_data = {
-                'timestamp': datetime.datetime.now().isoformat(),
-                'task_count': task_count,
-                'backup_type': 'test'
-            }
-            
-            container_client = blob_service_client.get_container_client(CONTAINER_NAME)
-            
-            try:
-                container_client.create_container()
-            except:
-                pass
-            
-            blob_client = container_client.get_blob_client(f"backup-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
-            blob_client.upload_blob(json.dumps(backup_data), overwrite=True)
-            
-            return jsonify({
-                'message': 'Test de stockage réussi!',
-                'backup_created': True,
-                'task_count': task_count
-            })
-        else:
+        if not conn:
             return jsonify({'error': 'Erreur de connexion à la base de données'}), 500
-            
+        
+        cur = conn.cursor()
+        cur.execute(JOB_STATUS_QUERY, (job_id,))
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+        
+        if row is None:
+            return jsonify({'error': 'Travail introuvable'}), 404
+        return Response(row[0], mimetype='application/json')
     except Exception as e:
-        return jsonify({'error': f'Erreur de stockage: {str(e)}'}), 500
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+@app.route('/api/stats/rebuild', methods=['POST'])
+def api_rebuild_stats():
+    return job_accepted('stats_rebuild')
+
+@app.cli.command('jobs')
+@click.option('--workers', type=int, default=JOB_WORKERS, show_default=True, help="Travaux exécutés en parallèle.")
+def jobs_command(workers):
+    """Exécute la file de travaux (processus dédié, JOB_WORKERS=0 côté web)."""
+    print(f"File de travaux : {workers} workers ({', '.join(JOB_KINDS)})")
+    job_dispatcher_loop(max(workers, 1))
 
 if __name__ == '__main__':
     print("Initialisation de la TodoList Cloud...")
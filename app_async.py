@@ -0,0 +1,793 @@
+# =============================================================================
+# TodoList Cloud - variante ASGI de l'API (/api/*)
+# =============================================================================
+# Mêmes routes et mêmes réponses JSON que app.py, servies par Starlette sur
+# asyncpg et le client asynchrone azure.storage.blob.aio : une attente réseau
+# (PostgreSQL, Blob Storage) ne bloque plus un worker, et les requêtes
+# indépendantes partent en parallèle.
+#
+#   uvicorn app_async:app --workers 2
+#   GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py app_async:app
+#
+# Les requêtes SQL, la pagination et la validation sont partagées avec app.py.
+# Le schéma est migré par app.py (master gunicorn ou `flask --app app migrate`).
+# =============================================================================
+
+import asyncio
+import csv
+import datetime
+import io
+import json
+import uuid
+from contextlib import asynccontextmanager
+
+import asyncpg
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobSasPermissions
+from azure.storage.blob.aio import BlobServiceClient
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as todo_app
+
+DB_CONNECT_KWARGS = {
+    'host': todo_app.DB_HOST,
+    'database': todo_app.DB_NAME,
+    'user': todo_app.DB_USER,
+    'password': todo_app.DB_PASS,
+    'port': todo_app.DB_PORT,
+    'ssl': todo_app.DB_SSLMODE,
+}
+
+db_pool = None
+blob_service_client = None
+health_probes = {'database': None, 'storage': None}
+background_tasks = set()
+
+# Paramètres psycopg2 (%s) vers asyncpg ($1, $2, ...) : les requêtes de app.py
+# sont réutilisées telles quelles
+def pg_query(sql, params=()):
+    return todo_app.positional_query(sql), list(params)
+
+def parse_timestamp(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f' if '.' in value else '%Y-%m-%d %H:%M:%S')
+
+async def init_connection(conn):
+    # JSON décodé comme psycopg2 ; dates et timestamps en format texte pour
+    # accepter les chaînes ISO des filtres et des curseurs de pagination
+    await conn.set_type_codec('json', schema='pg_catalog', encoder=json.dumps, decoder=json.loads)
+    await conn.set_type_codec('date', schema='pg_catalog', format='text',
+                              encoder=str, decoder=datetime.date.fromisoformat)
+    await conn.set_type_codec('timestamp', schema='pg_catalog', format='text',
+                              encoder=str, decoder=parse_timestamp)
+
+def create_blob_service_client():
+    try:
+        if todo_app.STORAGE_CONNECTION_STRING:
+            return BlobServiceClient.from_connection_string(todo_app.STORAGE_CONNECTION_STRING)
+        elif todo_app.STORAGE_ACCOUNT_KEY:
+            account_url = f"https://{todo_app.STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
+            return BlobServiceClient(account_url=account_url, credential=todo_app.STORAGE_ACCOUNT_KEY)
+        else:
+            print("Clé de stockage Azure non configurée")
+            return None
+    except Exception as e:
+        print(f"Erreur de connexion au stockage Azure: {e}")
+        return None
+
+_storage_container_ready = False
+
+async def get_storage_container():
+    global _storage_container_ready
+    if not blob_service_client:
+        raise RuntimeError('Impossible de se connecter au stockage Azure')
+    container_client = blob_service_client.get_container_client(todo_app.CONTAINER_NAME)
+    # Création du conteneur vérifiée une seule fois par processus
+    if not _storage_container_ready:
+        try:
+            await container_client.create_container()
+        except ResourceExistsError:
+            pass
+        _storage_container_ready = True
+    return container_client
+
+def spawn(coro):
+    # Garder une référence : asyncio ne conserve que des références faibles
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def fetch(query, params=()):
+    query, args = pg_query(query, params)
+    async with db_pool.acquire(timeout=todo_app.DB_POOL_TIMEOUT) as conn:
+        return await conn.fetch(query, *args)
+
+async def fetchval(query, params=()):
+    query, args = pg_query(query, params)
+    async with db_pool.acquire(timeout=todo_app.DB_POOL_TIMEOUT) as conn:
+        return await conn.fetchval(query, *args)
+
+async def notify_cache(conn, *namespaces):
+    # Les workers Flask servent leur cache : les prévenir avec la transaction
+    for namespace in namespaces:
+        await conn.execute('SELECT pg_notify($1, $2)', todo_app.CACHE_CHANNEL, namespace)
+
+async def api_get_tasks(request):
+    try:
+        filters = todo_app.parse_task_filters(request.query_params)
+        limit = todo_app.parse_page_limit(request.query_params)
+        fields = todo_app.parse_task_fields(request.query_params)
+        archived = todo_app.parse_include_archived(request.query_params)
+        query, params = todo_app.build_task_json_page_query(
+            filters, 'created', request.query_params.get('cursor'), limit, fields, archived)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        tasks, next_cursor = todo_app.split_task_page('created', await fetch(query, params), limit)
+        return Response(todo_app.task_page_body(tasks, next_cursor), media_type='application/json')
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+async def api_get_dashboard(request):
+    try:
+        filters = todo_app.parse_task_filters(request.query_params)
+        limit = todo_app.parse_page_limit(request.query_params)
+        query, params = todo_app.build_task_page_query(
+            filters, 'priority', request.query_params.get('cursor'), limit)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        # Statistiques, catégories et tâches : trois connexions en parallèle
+        stats, categories, tasks = await asyncio.gather(
+            fetchval(todo_app.DASHBOARD_STATS_QUERY),
+            fetchval(todo_app.CATEGORIES_JSON_QUERY),
+            fetch(query, params),
+        )
+        tasks, next_cursor = todo_app.split_task_page('priority', tasks, limit)
+        return JSONResponse({
+            'stats': stats,
+            'categories': categories,
+            'tasks': [todo_app.task_dict(task) for task in tasks],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+async def export_stream(query, params, export_format, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(fields)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    query, args = pg_query(query, params)
+    async with db_pool.acquire(timeout=todo_app.DB_POOL_TIMEOUT) as conn:
+        # Curseur serveur : il n'existe que dans une transaction
+        async with conn.transaction():
+            cursor = await conn.cursor(query, *args)
+            while True:
+                rows = await cursor.fetch(todo_app.EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == 'ndjson':
+                    yield ''.join(todo_app.export_ndjson([rows]))
+                else:
+                    writer.writerows([[todo_app.export_value(value) for value in row] for row in rows])
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+
+async def api_export_tasks(request):
+    export_format = request.query_params.get('format', 'ndjson')
+    if export_format not in todo_app.EXPORT_FORMATS:
+        return JSONResponse({'error': f'Format non supporté: {export_format}'}, status_code=400)
+
+    since = request.query_params.get('since')
+    if since:
+        try:
+            since = datetime.datetime.fromisoformat(since)
+        except ValueError:
+            return JSONResponse({'error': f'Paramètre since invalide: {since}'}, status_code=400)
+    try:
+        fields = todo_app.parse_task_fields(request.query_params, todo_app.EXPORT_COLUMNS)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        watermark = await db_pool.fetchval(todo_app.BACKUP_WATERMARK_QUERY)
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+    _, mimetype, as_json = todo_app.EXPORT_FORMATS[export_format]
+    query, params = todo_app.build_export_query(since, fields, as_json)
+    filename = f"tasks-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        export_stream(query, params, export_format, fields),
+        media_type=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            todo_app.EXPORT_WATERMARK_HEADER: watermark.isoformat(),
+        }
+    )
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+async def claim_idempotency_key(conn, idempotency):
+    # Même protocole que app.run_write : None si la clé est libre (à
+    # enregistrer avec la réponse), sinon la réponse à renvoyer
+    query, args = pg_query(todo_app.IDEMPOTENCY_CLAIM_QUERY, idempotency)
+    if await conn.fetchval(query, *args) is not None:
+        return None
+    query, args = pg_query(todo_app.IDEMPOTENCY_LOOKUP_QUERY, (idempotency[0],))
+    stored = await conn.fetchrow(query, *args)
+    if stored['request_hash'] != idempotency[1]:
+        return JSONResponse({'error': todo_app.IDEMPOTENCY_MISMATCH}, status_code=422)
+    return Response(stored['response'], status_code=stored['status_code'], media_type='application/json',
+                    headers={'Idempotent-Replayed': 'true'})
+
+async def api_bulk_create_tasks(request):
+    try:
+        idempotency = todo_app.idempotency_key(request.method, request.url.path, request.headers, await request.body())
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    data = await read_json(request) or {}
+    items = data.get('tasks') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return JSONResponse({'error': 'Liste tasks requise'}, status_code=400)
+    if len(items) > todo_app.BULK_MAX_ITEMS:
+        return JSONResponse({'error': f'Au plus {todo_app.BULK_MAX_ITEMS} éléments par requête'}, status_code=400)
+
+    results = [None] * len(items)
+    rows = []
+    indexes = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(todo_app.validate_bulk_task(item))
+            indexes.append(index)
+        except (ValueError, TypeError) as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+    if not rows:
+        return JSONResponse({'created': 0, 'results': results}, status_code=400)
+
+    try:
+        async with db_pool.acquire(timeout=todo_app.DB_POOL_TIMEOUT) as conn:
+            async with conn.transaction():
+                if idempotency:
+                    replay = await claim_idempotency_key(conn, idempotency)
+                    if replay is not None:
+                        return replay
+                query, args = pg_query(todo_app.BULK_CATEGORIES_QUERY,
+                                       (sorted({row[2] for row in rows if row[2] is not None}),))
+                known = await conn.fetch(query, *args)
+                rows, indexes = todo_app.reject_unknown_categories(rows, indexes, results, {row['id'] for row in known})
+                if not rows:
+                    response = JSONResponse({'created': 0, 'results': results}, status_code=400)
+                    if idempotency:
+                        query, args = pg_query(todo_app.IDEMPOTENCY_STORE_QUERY,
+                                               (400, response.body.decode(), None, idempotency[0]))
+                        await conn.execute(query, *args)
+                    return response
+                columns = [list(column) for column in zip(*rows)]
+                # Une seule requête par lot : un tableau par colonne, ordre conservé
+                ids = await conn.fetch('''
+                    INSERT INTO tasks (title, description, category_id, priority, status, due_date)
+                    SELECT * FROM unnest($1::varchar[], $2::text[], $3::int[],
+                                         $4::varchar[], $5::varchar[], $6::date[])
+                    RETURNING id
+                ''', *columns)
+                await notify_cache(conn, 'tasks')
+
+                for index, (task_id,) in zip(indexes, ids):
+                    results[index] = {'index': index, 'status': 'created', 'id': task_id}
+                response = JSONResponse({'created': len(rows), 'results': results}, status_code=201)
+                if idempotency:
+                    query, args = pg_query(todo_app.IDEMPOTENCY_STORE_QUERY,
+                                           (201, response.body.decode(), None, idempotency[0]))
+                    await conn.execute(query, *args)
+        return response
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur lors de la création: {str(e)}'}, status_code=500)
+
+async def api_bulk_update_status(request):
+    data = await read_json(request) or {}
+    try:
+        ids = todo_app.parse_bulk_ids(data)
+        if data.get('status') not in todo_app.TASK_STATUSES:
+            raise ValueError(f"Statut invalide: {data.get('status')}")
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        async with db_pool.acquire(timeout=todo_app.DB_POOL_TIMEOUT) as conn:
+            async with conn.transaction():
+                rows = await conn.fetch('''
+                    UPDATE tasks SET status = $1, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ANY($2)
+                    RETURNING id
+                ''', data['status'], ids)
+                await notify_cache(conn, 'tasks')
+
+        updated = [row['id'] for row in rows]
+        return JSONResponse({'updated': len(updated),
+                             'results': todo_app.bulk_id_results(ids, updated, 'updated')})
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur lors de la mise à jour: {str(e)}'}, status_code=500)
+
+async def enqueue_job(conn, kind, payload):
+    # Même table que app.enqueue_job, dans la transaction en cours
+    query, args = pg_query(todo_app.JOB_ENQUEUE_QUERY, (kind, json.dumps(payload), todo_app.JOB_MAX_ATTEMPTS, None))
+    job_id = await conn.fetchval(query, *args)
+    await conn.execute('SELECT pg_notify($1, $2)', todo_app.JOBS_CHANNEL, kind)
+    return job_id
+
+async def api_bulk_delete_tasks(request):
+    try:
+        ids = todo_app.parse_bulk_ids(await read_json(request) or {})
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        async with db_pool.acquire(timeout=todo_app.DB_POOL_TIMEOUT) as conn:
+            async with conn.transaction():
+                rows = await conn.fetch('''
+                    WITH deleted AS (DELETE FROM tasks WHERE id = ANY($1) RETURNING id)
+                    SELECT id, NULL AS blob_name FROM deleted
+                    UNION ALL
+                    SELECT NULL, blob_name FROM task_files WHERE task_id = ANY($1) AND blob_name IS NOT NULL
+                ''', ids)
+                # Blobs supprimés par la file de travaux, une fois la transaction validée
+                blob_names = [row['blob_name'] for row in rows if row['blob_name'] is not None]
+                if blob_names:
+                    await enqueue_job(conn, 'delete_blobs', {'blobs': blob_names})
+                await notify_cache(conn, 'tasks')
+
+        deleted = [row['id'] for row in rows if row['id'] is not None]
+
+        return JSONResponse({'deleted': len(deleted),
+                             'results': todo_app.bulk_id_results(ids, deleted, 'deleted')})
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur lors de la suppression: {str(e)}'}, status_code=500)
+
+async def api_get_job(request):
+    try:
+        body = await fetchval(todo_app.JOB_STATUS_QUERY, (request.path_params['job_id'],))
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+    if body is None:
+        return JSONResponse({'error': 'Travail introuvable'}, status_code=404)
+    return Response(body, media_type='application/json')
+
+async def api_get_categories(request):
+    try:
+        categories = await fetch(todo_app.CATEGORIES_LIST_QUERY)
+        return JSONResponse({'categories': [{
+            'id': cat['id'],
+            'name': cat['name'],
+            'color': cat['color'],
+            'created_at': cat['created_at'].isoformat() if cat['created_at'] else None
+        } for cat in categories]})
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+async def api_get_stats(request):
+    try:
+        days = todo_app.parse_stats_days(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    
+    try:
+        stats = await fetchval(todo_app.STATS_QUERY, (days, days))
+        stats['days'] = days
+        return JSONResponse(stats)
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+def attachment_dict(request, row):
+    return {
+        'id': row['id'],
+        'task_id': row['task_id'],
+        'filename': row['filename'],
+        'content_type': row['content_type'],
+        'size_bytes': row['size_bytes'],
+        'status': row['status'],
+        'uploaded_at': row['uploaded_at'].isoformat() if row['uploaded_at'] else None,
+        'download_url': request.url_for('api_download_task_file',
+                                        task_id=row['task_id'], file_id=row['id']).path
+    }
+
+async def api_create_task_file(request):
+    task_id = request.path_params['task_id']
+    data = await read_json(request)
+    try:
+        filename, content_type, size = todo_app.parse_attachment_request(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        container_client = await get_storage_container()
+        blob_name = f'attachments/{task_id}/{uuid.uuid4().hex}/{filename}'
+        blob_client = container_client.get_blob_client(blob_name)
+
+        file_id = await fetchval('''
+            INSERT INTO task_files (task_id, filename, blob_name, blob_url, content_type, status)
+            SELECT id, %s, %s, %s, %s, 'pending' FROM tasks WHERE id = %s
+            RETURNING id
+        ''', (filename, blob_name, blob_client.url, content_type, task_id))
+        if not file_id:
+            return JSONResponse({'error': 'Tâche introuvable'}, status_code=404)
+
+        chunked = size is not None and size > todo_app.ATTACHMENT_SINGLE_PUT_MAX
+        return JSONResponse({
+            'id': file_id,
+            'upload_url': todo_app.attachment_sas_url(blob_client, BlobSasPermissions(create=True, write=True)),
+            'expires_in': todo_app.ATTACHMENT_SAS_TTL,
+            'method': 'PUT',
+            'headers': {'x-ms-blob-type': 'BlockBlob', 'x-ms-blob-content-type': content_type},
+            'chunked': chunked,
+            'block_size': todo_app.ATTACHMENT_BLOCK_SIZE,
+            'complete_url': request.url_for('api_complete_task_file', task_id=task_id, file_id=file_id).path
+        }, status_code=201)
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+async def api_complete_task_file(request):
+    task_id = request.path_params['task_id']
+    file_id = request.path_params['file_id']
+    try:
+        blob_name = await fetchval('SELECT blob_name FROM task_files WHERE id = %s AND task_id = %s',
+                                   (file_id, task_id))
+        if not blob_name:
+            return JSONResponse({'error': 'Fichier introuvable'}, status_code=404)
+
+        # Le blob doit avoir été validé par le client (Put Blob ou Put Block List)
+        container_client = await get_storage_container()
+        try:
+            properties = await container_client.get_blob_client(blob_name).get_blob_properties()
+        except ResourceNotFoundError:
+            return JSONResponse({'error': 'Envoi du fichier non terminé'}, status_code=409)
+
+        rows = await fetch('''
+            UPDATE task_files
+            SET status = 'uploaded', size_bytes = %s, content_type = %s, uploaded_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            RETURNING *
+        ''', (properties.size, properties.content_settings.content_type, file_id))
+        return JSONResponse(attachment_dict(request, rows[0]))
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+async def api_get_task_files(request):
+    try:
+        files = await fetch('SELECT * FROM task_files WHERE task_id = %s ORDER BY uploaded_at, id',
+                            (request.path_params['task_id'],))
+        return JSONResponse({'files': [attachment_dict(request, row) for row in files]})
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+async def api_download_task_file(request):
+    try:
+        rows = await fetch('''
+            SELECT blob_name, filename FROM task_files
+            WHERE id = %s AND task_id = %s AND status = 'uploaded'
+        ''', (request.path_params['file_id'], request.path_params['task_id']))
+        if not rows:
+            return JSONResponse({'error': 'Fichier introuvable'}, status_code=404)
+
+        blob_name, filename = rows[0]
+        blob_client = (await get_storage_container()).get_blob_client(blob_name)
+        return RedirectResponse(todo_app.attachment_sas_url(
+            blob_client, BlobSasPermissions(read=True),
+            content_disposition=f'attachment; filename="{filename}"'
+        ), status_code=302)
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur: {str(e)}'}, status_code=500)
+
+# Mises à jour en direct : même flux SSE que app.py (/api/events), sans thread
+# par client ; une connexion dédiée écoute les notifications des triggers
+event_subscribers = set()
+
+def publish_event(event):
+    for subscriber in list(event_subscribers):
+        try:
+            subscriber.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent : resynchronisation complète
+            while not subscriber.empty():
+                subscriber.get_nowait()
+            subscriber.put_nowait(todo_app.RELOAD_EVENT)
+
+async def task_change_events(changes):
+    rows = todo_app.parse_task_changes(changes)
+    if rows is None:
+        return [todo_app.RELOAD_EVENT]
+    ids = [task_id for op, task_id, _, _ in rows if op != 'delete']
+    tasks = {}
+    if ids:
+        tasks = {task['id']: todo_app.task_payload(task)
+                 for task in await fetch(todo_app.TASK_EVENTS_QUERY, (ids,))}
+    return todo_app.build_task_events(rows, tasks)
+
+async def task_events_loop():
+    while True:
+        conn = None
+        try:
+            notifications = asyncio.Queue()
+            conn = await asyncpg.connect(**DB_CONNECT_KWARGS)
+            # None : connexion perdue
+            conn.add_termination_listener(lambda conn: notifications.put_nowait(None))
+            await conn.add_listener(todo_app.TASK_EVENTS_CHANNEL,
+                                    lambda conn, pid, channel, payload: notifications.put_nowait(payload))
+            # Des modifications ont pu être manquées avant l'écoute
+            publish_event(todo_app.RELOAD_EVENT)
+            while True:
+                payloads = [await notifications.get()]
+                while not notifications.empty():
+                    payloads.append(notifications.get_nowait())
+                if None in payloads:
+                    raise ConnectionError('connexion fermée')
+                if event_subscribers:
+                    for event in await task_change_events([json.loads(payload) for payload in payloads]):
+                        publish_event(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Écoute des modifications de tâches interrompue: {e}")
+            publish_event(todo_app.RELOAD_EVENT)
+            await asyncio.sleep(5)
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+async def api_task_events(request):
+    subscriber = asyncio.Queue(todo_app.EVENTS_QUEUE_SIZE)
+    event_subscribers.add(subscriber)
+    
+    async def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), todo_app.EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {json.dumps(event)}\n\n'
+        finally:
+            event_subscribers.discard(subscriber)
+    
+    # Content-Encoding explicite : GZipMiddleware retiendrait le flux dans son tampon
+    return StreamingResponse(stream(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'Content-Encoding': 'identity',
+        'X-Accel-Buffering': 'no',
+    })
+
+async def probe_database():
+    await fetchval('SELECT 1')
+
+async def probe_storage():
+    if not blob_service_client:
+        return 'disabled'
+    try:
+        await blob_service_client.get_container_client(todo_app.CONTAINER_NAME).get_container_properties()
+    except ResourceNotFoundError:
+        # Compte joignable, conteneur pas encore créé
+        pass
+
+HEALTH_PROBES = {
+    'database': probe_database,
+    'storage': probe_storage,
+}
+
+async def run_health_probe(name, probe):
+    start = asyncio.get_running_loop().time()
+    try:
+        result = {'status': await probe() or 'ok'}
+    except Exception as e:
+        result = {'status': 'error', 'error': str(e)[:200]}
+    result['latency_ms'] = round((asyncio.get_running_loop().time() - start) * 1000, 2)
+    result['checked_at'] = datetime.datetime.now().isoformat()
+    health_probes[name] = result
+
+async def health_probe_loop():
+    # Sondes en parallèle, en arrière-plan : /health lit le dernier résultat
+    while True:
+        await asyncio.gather(*(run_health_probe(name, probe) for name, probe in HEALTH_PROBES.items()))
+        await asyncio.sleep(todo_app.HEALTH_PROBE_INTERVAL)
+
+async def health_check(request):
+    checks = dict(health_probes)
+    if any(check is None for check in checks.values()):
+        status = 'starting'
+    elif all(check['status'] in ('ok', 'disabled') for check in checks.values()):
+        status = 'healthy'
+    else:
+        status = 'degraded'
+    return JSONResponse({
+        'status': status,
+        'message': 'TodoList Cloud opérationnelle (ASGI)',
+        'timestamp': datetime.datetime.now().isoformat(),
+        'version': '2.0.0',
+        'checks': checks,
+        'db_pool': {
+            'size': db_pool.get_size(),
+            'idle': db_pool.get_idle_size(),
+            'min': db_pool.get_min_size(),
+            'max': db_pool.get_max_size()
+        },
+        'load_shedding': {
+            **todo_app.load_shedding_stats(),
+            'db_handlers': db_limiter.stats() if db_limiter else None,
+        },
+        'event_streams': len(event_subscribers)
+    })
+
+async def metrics(request):
+    # Même registre que app.py (fichiers PROMETHEUS_MULTIPROC_DIR sous gunicorn)
+    return Response(todo_app.metrics_payload(), media_type=todo_app.prometheus_client.CONTENT_TYPE_LATEST)
+
+async def test_storage(request):
+    if not blob_service_client:
+        return JSONResponse({'error': 'Impossible de se connecter au stockage Azure'}, status_code=500)
+
+    try:
+        # Comptage et préparation du conteneur en parallèle, puis envoi
+        task_count, container_client = await asyncio.gather(
+            fetchval('SELECT COUNT(*) FROM tasks'),
+            get_storage_container(),
+        )
+    except (asyncpg.PostgresError, OSError, asyncio.TimeoutError):
+        return JSONResponse({'error': 'Erreur de connexion à la base de données'}, status_code=500)
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur de stockage: {str(e)}'}, status_code=500)
+
+    try:
+        backup_data = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'task_count': task_count,
+            'backup_type': 'test'
+        }
+        blob_client = container_client.get_blob_client(f"backup-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        await blob_client.upload_blob(json.dumps(backup_data), overwrite=True)
+
+        return JSONResponse({
+            'message': 'Test de stockage réussi!',
+            'backup_created': True,
+            'task_count': task_count
+        })
+    except Exception as e:
+        return JSONResponse({'error': f'Erreur de stockage: {str(e)}'}, status_code=500)
+
+# Même limitation que app.py : seau à jetons par client puis places bornées
+# devant asyncpg, occupées jusqu'à la fin de la réponse
+SHEDDING_EXEMPT_PATHS = {'/health', '/metrics'}
+CONCURRENCY_EXEMPT_PATHS = SHEDDING_EXEMPT_PATHS | {'/api/events'}
+
+
+class AsyncConcurrencyLimiter(todo_app.ConcurrencyLimiter):
+    def __init__(self, limit, queue_max, timeout):
+        super().__init__(limit, queue_max, timeout, semaphore=asyncio.Semaphore)
+
+    async def acquire(self):
+        # None si une place est obtenue, sinon la raison du refus
+        if self.slots.locked():
+            if not self.enter_queue():
+                return 'queue_full'
+            try:
+                await asyncio.wait_for(self.slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return 'queue_timeout'
+            finally:
+                self.leave_queue()
+        else:
+            await self.slots.acquire()
+        self.admitted()
+        return None
+
+
+db_limiter = (AsyncConcurrencyLimiter(todo_app.DB_CONCURRENCY_LIMIT, todo_app.DB_QUEUE_MAX, todo_app.DB_QUEUE_TIMEOUT)
+              if todo_app.DB_CONCURRENCY_LIMIT > 0 else None)
+
+async def shed(scope, receive, send, status, reason, message, wait):
+    todo_app.HTTP_SHED_REQUESTS.labels(reason).inc()
+    response = JSONResponse({'error': message}, status_code=status,
+                            headers={'Retry-After': todo_app.retry_after(wait)})
+    await response(scope, receive, send)
+
+
+class LoadSheddingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in SHEDDING_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        limiter = todo_app.rate_limiter
+        if limiter is not None:
+            client = todo_app.rate_limit_client(scope['client'][0] if scope.get('client') else None, Headers(scope=scope))
+            # Redis : aller-retour réseau hors de la boucle
+            if isinstance(limiter, todo_app.RedisTokenBuckets):
+                wait = await asyncio.to_thread(todo_app.take_rate_limit_token, client)
+            else:
+                wait = todo_app.take_rate_limit_token(client)
+            if wait > 0:
+                await shed(scope, receive, send, 429, 'rate_limit', 'Trop de requêtes, réessayez plus tard', wait)
+                return
+        if db_limiter is None or scope['path'] in CONCURRENCY_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        reason = await db_limiter.acquire()
+        if reason is not None:
+            await shed(scope, receive, send, 503, reason, 'Serveur surchargé, réessayez plus tard', todo_app.DB_QUEUE_TIMEOUT)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            db_limiter.release()
+
+@asynccontextmanager
+async def lifespan(app):
+    global db_pool, blob_service_client
+    db_pool = await asyncpg.create_pool(
+        **DB_CONNECT_KWARGS,
+        min_size=todo_app.DB_POOL_MIN,
+        max_size=todo_app.DB_POOL_MAX,
+        max_inactive_connection_lifetime=todo_app.DB_POOL_MAX_IDLE,
+        init=init_connection,
+    )
+    blob_service_client = create_blob_service_client()
+    spawn(health_probe_loop())
+    spawn(task_events_loop())
+    try:
+        yield
+    finally:
+        for task in list(background_tasks):
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if blob_service_client:
+            await blob_service_client.close()
+        await db_pool.close()
+
+routes = [
+    Route('/api/tasks', api_get_tasks, methods=['GET']),
+    Route('/api/dashboard', api_get_dashboard, methods=['GET']),
+    Route('/api/tasks/export', api_export_tasks, methods=['GET']),
+    Route('/api/tasks/bulk', api_bulk_create_tasks, methods=['POST']),
+    Route('/api/tasks/bulk/status', api_bulk_update_status, methods=['POST']),
+    Route('/api/tasks/bulk/delete', api_bulk_delete_tasks, methods=['POST']),
+    Route('/api/categories', api_get_categories, methods=['GET']),
+    Route('/api/stats', api_get_stats, methods=['GET']),
+    Route('/api/events', api_task_events, methods=['GET']),
+    Route('/api/jobs/{job_id:int}', api_get_job, methods=['GET']),
+    Route('/api/tasks/{task_id:int}/files', api_create_task_file, methods=['POST']),
+    Route('/api/tasks/{task_id:int}/files', api_get_task_files, methods=['GET']),
+    Route('/api/tasks/{task_id:int}/files/{file_id:int}/complete', api_complete_task_file, methods=['POST']),
+    Route('/api/tasks/{task_id:int}/files/{file_id:int}', api_download_task_file, methods=['GET']),
+    Route('/health', health_check),
+    Route('/metrics', metrics),
+    Route('/test-storage', test_storage, methods=['POST']),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(LoadSheddingMiddleware),
+        Middleware(GZipMiddleware, minimum_size=todo_app.COMPRESS_MIN_SIZE),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+# =============================================================================
+# Benchmark - TodoList Cloud
+# =============================================================================
+# Remplit une base PostgreSQL locale avec N tâches puis mesure la latence de
+# la page d'accueil via le client de test Flask. Les résultats sont écrits en
+# JSON pour pouvoir comparer deux commits.
+#
+#   DB_HOST=localhost DB_SSLMODE=disable python3 benchmark.py home --sizes 10000 100000 1000000
+#
+# La commande load démarre gunicorn (gunicorn.conf.py) pour chaque modèle de
+# worker et compare requêtes/s et p99 de /, /api/tasks et /health en HTTP réel.
+#
+#   python3 benchmark.py load --worker-classes sync gthread gevent --duration 20
+#
+# La commande async compare app.py (gthread) et app_async.py (uvicorn) sur les
+# mêmes routes, avec des centaines ou milliers de clients simultanés.
+#
+#   python3 benchmark.py async --clients 50 500 2000 --workers 2
+#
+# La commande seed génère un jeu de données reproductible (répartitions
+# réalistes des catégories, statuts, priorités, échéances et pièces jointes) ;
+# suite envoie un mélange pondéré de routes réelles à débit fixe et rapporte
+# débit et p50/p95/p99 par route.
+#
+#   python3 benchmark.py seed --tasks 1000000 --categories 50
+#   python3 benchmark.py --output suite.json suite --rps 200 --duration 60
+#
+# La commande serialize compare, sur la base existante, la sérialisation d'une
+# page de tâches en Python (dictionnaires + json.dumps) et en SQL (row_to_json).
+#
+#   python3 benchmark.py serialize --sizes 50 500 5000
+#
+# La commande prepared mesure, par requête fréquente, la latence d'un envoi
+# du texte SQL (analyse et planification à chaque appel) face à une requête
+# préparée sur la connexion (PREPARE puis EXECUTE).
+#
+#   python3 benchmark.py prepared --iterations 200
+# =============================================================================
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+# Mesure du débit brut : limitation de débit et de concurrence désactivées
+# (y compris pour les serveurs lancés ici), sauf si l'environnement les fixe
+os.environ.setdefault('RATE_LIMIT_RATE', '0')
+os.environ.setdefault('DB_CONCURRENCY_LIMIT', '0')
+
+import app as todo_app
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def check_target(allow_remote):
+    # Le seed vide la table tasks : refuser une base distante par défaut
+    if todo_app.DB_HOST not in LOCAL_HOSTS and not allow_remote:
+        print(f"Refus de remplir la base distante {todo_app.DB_HOST} (utiliser --allow-remote)")
+        sys.exit(1)
+
+
+# Volumes par défaut de la commande seed (et de suite --tasks)
+SEED_CATEGORIES = 20
+SEED_FILES_PER_TASK = 0.1
+
+
+def seed_data(tasks, categories=SEED_CATEGORIES, files=None, seed=42):
+    # Données reproductibles (setseed) et réparties comme en production :
+    # quelques catégories concentrent la plupart des tâches, les anciennes
+    # sont presque toutes terminées, les échéances suivent la création
+    if files is None:
+        files = int(tasks * SEED_FILES_PER_TASK)
+    conn = todo_app.get_db_connection()
+    if not conn:
+        print("Erreur de connexion à la base de données")
+        sys.exit(1)
+    cur = conn.cursor()
+    # Les compteurs matérialisés sont vidés avec tasks (TRUNCATE ne déclenche
+    # pas les triggers) puis reconstruits par les triggers de l'INSERT
+    cur.execute(f"TRUNCATE tasks, {', '.join(todo_app.TASK_STATS_TABLES)} RESTART IDENTITY CASCADE")
+    cur.execute('SELECT setseed(%s)', ((seed % 1000) / 1000,))
+    # Catégories supplémentaires, en plus des quatre créées par init_db()
+    cur.execute('''
+        INSERT INTO categories (name, color)
+        SELECT 'Catégorie ' || i, '#' || lpad(to_hex((i * 2654435761) %% 16777216), 6, '0')
+        FROM generate_series(1, %s) AS i
+        ON CONFLICT (name) DO NOTHING
+    ''', (categories,))
+    cur.execute('''
+        WITH cats AS (SELECT array_agg(id ORDER BY id) AS ids FROM categories),
+        base AS (
+            SELECT i, age, CURRENT_TIMESTAMP - age * interval '365 days' AS created_at,
+                   random() AS r_description, random() AS r_category, random() AS r_priority,
+                   random() AS r_status, random() AS r_due, random() AS r_updated
+            FROM (SELECT i, i::float / %s AS age FROM generate_series(1, %s) AS i) s
+        ),
+        skewed AS (
+            SELECT base.*,
+                   CASE WHEN r_status < age * 0.9 THEN 'completed'
+                        WHEN r_status < age * 0.9 + 0.15 THEN 'in-progress'
+                        ELSE 'pending' END AS status
+            FROM base
+        )
+        INSERT INTO tasks (title, description, category_id, priority, status, due_date, created_at, updated_at)
+        SELECT
+            'Tâche ' || i,
+            CASE WHEN r_description < 0.3 THEN NULL ELSE 'Description de la tâche ' || i END,
+            -- 10 %% sans catégorie, puis loi de puissance sur les catégories
+            CASE WHEN r_category < 0.1 THEN NULL
+                 ELSE ids[1 + floor(power((r_category - 0.1) / 0.9, 3) * array_length(ids, 1))::int] END,
+            CASE WHEN r_priority < 0.2 THEN 'high' WHEN r_priority < 0.7 THEN 'medium' ELSE 'low' END,
+            status,
+            -- Une tâche sur quatre sans échéance, sinon 0 à 60 jours après la création
+            CASE WHEN r_due < 0.25 THEN NULL
+                 ELSE created_at::date + floor(power((r_due - 0.25) / 0.75, 2) * 60)::int END,
+            created_at,
+            CASE WHEN status = 'pending' THEN created_at
+                 ELSE created_at + (CURRENT_TIMESTAMP - created_at) * r_updated END
+        FROM skewed, cats
+    ''', (tasks, tasks))
+    # Pièces jointes concentrées sur quelques tâches récentes, tailles étalées
+    # de 1 Ko à 50 Mo (blobs non créés)
+    cur.execute('''
+        INSERT INTO task_files (task_id, filename, blob_url, uploaded_at, blob_name, content_type, size_bytes, status)
+        SELECT task_id, 'fichier-' || i || ext, NULL, CURRENT_TIMESTAMP,
+               'tasks/' || task_id || '/seed-' || i || ext, content_type,
+               floor(exp(ln(1024) + random() * ln(50 * 1024))), 'uploaded'
+        FROM (
+            SELECT i, 1 + floor(power(random(), 3) * %s)::int AS task_id,
+                   (ARRAY['.pdf', '.png', '.jpg', '.docx', '.txt'])[1 + floor(random() * 5)::int] AS ext
+            FROM generate_series(1, %s) AS i
+        ) f
+        JOIN (VALUES ('.pdf', 'application/pdf'), ('.png', 'image/png'), ('.jpg', 'image/jpeg'),
+                     ('.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+                     ('.txt', 'text/plain')) AS t (extension, content_type) ON t.extension = f.ext
+    ''', (tasks, files if tasks else 0))
+    conn.commit()
+    cur.execute('ANALYZE categories')
+    cur.execute('ANALYZE tasks')
+    cur.execute('ANALYZE task_files')
+    conn.commit()
+    cur.execute('''
+        SELECT (SELECT COUNT(*) FROM categories), (SELECT COUNT(*) FROM tasks), (SELECT COUNT(*) FROM task_files)
+    ''')
+    summary = dict(zip(('categories', 'tasks', 'files'), cur.fetchone()))
+    cur.close()
+    conn.close()
+    return summary
+
+
+def time_requests(client, path, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            print(f"{path} a répondu {response.status_code}")
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+
+    def percentile(p):
+        return round(timings[min(len(timings) - 1, int(len(timings) * p))], 2)
+
+    return {
+        'requests': len(timings),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(timings[-1], 2),
+    }
+
+
+def bench_home(args):
+    check_target(args.allow_remote)
+    todo_app.init_db()
+    client = todo_app.app.test_client()
+    results = []
+    for size in args.sizes:
+        print(f"Remplissage de {size} tâches...")
+        seed_data(size)
+        # Première requête hors mesure (cache du plan, pool chaud)
+        time_requests(client, '/', 1)
+        result = summarize(time_requests(client, '/', args.iterations))
+        result['tasks'] = size
+        print(f"  {size:>8} tâches : p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+        results.append(result)
+    return {'benchmark': 'home', 'results': results}
+
+
+def wait_for_server(base_url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            return False
+        try:
+            if requests.get(base_url + '/health', timeout=2).status_code in (200, 503):
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def drive(base_url, path, clients, duration):
+    # Chaque client garde sa session (keep-alive) et enchaîne les requêtes
+    timings = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        local = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=30)
+                if response.status_code != 200:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            timings.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = summarize(timings) if timings else {'requests': 0}
+    result['requests_per_s'] = round(len(timings) / elapsed, 1)
+    result['errors'] = errors[0]
+    return result
+
+
+def start_gunicorn(app_uri, worker_class, port, workers=None, env=None):
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    env = dict(os.environ, **(env or {}), GUNICORN_BIND=f'127.0.0.1:{port}',
+               GUNICORN_WORKER_CLASS=worker_class, GUNICORN_ACCESSLOG='')
+    if workers:
+        env['GUNICORN_WORKERS'] = str(workers)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', config, app_uri],
+        env=env, cwd=os.path.dirname(config),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def bench_load(args):
+    base_url = f'http://127.0.0.1:{args.port}'
+    results = []
+    for worker_class in args.worker_classes:
+        print(f"Démarrage de gunicorn ({worker_class})...")
+        proc = start_gunicorn('app:app', worker_class, args.port, args.workers)
+        try:
+            if not wait_for_server(base_url, proc):
+                print(f"  gunicorn ({worker_class}) n'a pas démarré")
+                results.append({'worker_class': worker_class, 'error': 'startup failed'})
+                continue
+            for path in args.paths:
+                # Échauffement hors mesure (pools, caches, imports paresseux)
+                drive(base_url, path, args.clients, 1)
+                result = drive(base_url, path, args.clients, args.duration)
+                result.update({'worker_class': worker_class, 'path': path, 'clients': args.clients})
+                print(f"  {worker_class:>8} {path:<12} {result['requests_per_s']:>8} req/s, "
+                      f"p99 {result.get('p99_ms')} ms, {result['errors']} erreurs")
+                results.append(result)
+        finally:
+            stop_server(proc)
+    return {'benchmark': 'load', 'results': results}
+
+
+async def drive_async(base_url, path, clients, duration):
+    # Boucle asyncio côté client : des milliers de connexions simultanées
+    # sans un thread par client
+    import aiohttp
+
+    timings = []
+    errors = 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    connector = aiohttp.TCPConnector(limit=clients)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def client():
+            nonlocal errors
+            while loop.time() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with session.get(base_url + path) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    result = summarize(timings) if timings else {'requests': 0}
+    result['requests_per_s'] = round(len(timings) / elapsed, 1)
+    result['errors'] = errors
+    return result
+
+
+# Routes comparées : (Flask, ASGI) ; le tableau de bord HTML de Flask face à
+# /api/dashboard qui lance ses trois requêtes en parallèle
+ASYNC_ROUTES = [
+    ('/api/tasks', '/api/tasks'),
+    ('/api/categories', '/api/categories'),
+    ('/', '/api/dashboard'),
+    ('/health', '/health'),
+]
+
+SERVERS = {
+    'flask': ('app:app', 'gthread', 0),
+    'asgi': ('app_async:app', 'uvicorn.workers.UvicornWorker', 1),
+}
+
+
+def bench_async(args):
+    base_url = f'http://127.0.0.1:{args.port}'
+    # Sans cache applicatif par défaut : on compare les allers-retours PostgreSQL
+    env = {} if args.cache else {'CACHE_ENABLED': '0'}
+    results = []
+    for server in args.servers:
+        app_uri, worker_class, route_index = SERVERS[server]
+        print(f"Démarrage de {app_uri} ({worker_class})...")
+        proc = start_gunicorn(app_uri, worker_class, args.port, args.workers, env)
+        try:
+            if not wait_for_server(base_url, proc):
+                print(f"  {app_uri} n'a pas démarré")
+                results.append({'server': server, 'error': 'startup failed'})
+                continue
+            for routes in ASYNC_ROUTES:
+                path = routes[route_index]
+                asyncio.run(drive_async(base_url, path, 16, 1))
+                for clients in args.clients:
+                    result = asyncio.run(drive_async(base_url, path, clients, args.duration))
+                    result.update({'server': server, 'path': path, 'clients': clients})
+                    print(f"  {server:>6} {path:<16} {clients:>5} clients {result['requests_per_s']:>8} req/s, "
+                          f"p99 {result.get('p99_ms')} ms, {result['errors']} erreurs")
+                    results.append(result)
+        finally:
+            stop_server(proc)
+    return {'benchmark': 'async', 'results': results}
+
+
+def bench_seed(args):
+    check_target(args.allow_remote)
+    todo_app.init_db()
+    start = time.perf_counter()
+    summary = seed_data(args.tasks, args.categories, args.files, args.seed)
+    summary['seconds'] = round(time.perf_counter() - start, 1)
+    print(f"{summary['tasks']} tâches, {summary['categories']} catégories, "
+          f"{summary['files']} fichiers en {summary['seconds']} s")
+    return {'benchmark': 'seed', 'seed': args.seed, 'results': [summary]}
+
+
+# Sérialisation d'une page de /api/tasks : dictionnaires Python + json.dumps
+# (ancien chemin) face au JSON construit par PostgreSQL, avec ou sans ?fields=
+SERIALIZE_FIELDS = ['id', 'title', 'status']
+
+
+def serialize_python(cur, limit, fields):
+    query, params = todo_app.build_task_page_query({}, 'created', None, limit)
+    cur.execute(query, params)
+    tasks, next_cursor = todo_app.split_task_page('created', cur.fetchall(), limit)
+    tasks = [todo_app.task_dict(task) for task in tasks]
+    if fields:
+        tasks = [{field: task[field] for field in fields} for task in tasks]
+    return json.dumps({'tasks': tasks, 'next_cursor': next_cursor})
+
+
+def serialize_sql(cur, limit, fields):
+    query, params = todo_app.build_task_json_page_query(
+        {}, 'created', None, limit, fields or todo_app.TASK_FIELDS)
+    cur.execute(query, params)
+    return todo_app.task_page_body(*todo_app.split_task_page('created', cur.fetchall(), limit))
+
+
+SERIALIZERS = {'python': serialize_python, 'sql': serialize_sql}
+
+
+def bench_serialize(args):
+    conn = todo_app.get_db_connection()
+    cur = conn.cursor(cursor_factory=todo_app.psycopg2.extras.RealDictCursor)
+    results = []
+    try:
+        for limit in args.sizes:
+            for fields in (None, SERIALIZE_FIELDS):
+                for name, serializer in SERIALIZERS.items():
+                    # Première exécution hors mesure (plan, pages en cache)
+                    body = serializer(cur, limit, fields)
+                    timings = []
+                    for _ in range(args.iterations):
+                        start = time.perf_counter()
+                        serializer(cur, limit, fields)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    result = summarize(timings)
+                    result.update({'serializer': name, 'limit': limit, 'fields': fields, 'bytes': len(body.encode())})
+                    print(f"  {name:<6} {limit:>6} tâches {','.join(fields or ['*']):<16} "
+                          f"p50 {result['p50_ms']} ms, {result['bytes']} octets")
+                    results.append(result)
+    finally:
+        cur.close()
+        conn.close()
+    return {'benchmark': 'serialize', 'results': results}
+
+
+# Requêtes fréquentes exécutées avec cur.execute_prepared par l'application
+def prepared_queries():
+    cursor_priority = todo_app.encode_cursor(
+        'priority', {'priority_rank': 2, 'created_at': todo_app.datetime.datetime.now(), 'id': 1})
+    cursor_created = todo_app.encode_cursor(
+        'created', {'created_at': todo_app.datetime.datetime.now(), 'id': 1})
+    # Écriture annulée après chaque mesure (voir bench_prepared)
+    status_update = (todo_app.TASK_STATUS_UPDATE, ['pending', 1, None, None])
+    return [
+        ('home', *todo_app.build_home_query({})),
+        ('home page suivante', *todo_app.build_home_query({}, cursor_priority)),
+        ('home filtrée', *todo_app.build_home_query({'status': 'pending', 'category_id': 1})),
+        ('home version (ETag)', todo_app.DASHBOARD_STAMP_QUERY, []),
+        ('api tasks', *todo_app.build_task_json_page_query({})),
+        ('api tasks page suivante', *todo_app.build_task_json_page_query({}, 'created', cursor_created)),
+        ('api tasks fields', *todo_app.build_task_json_page_query(
+            {'status': 'pending'}, 'created', None, todo_app.TASKS_PAGE_SIZE, SERIALIZE_FIELDS)),
+        ('api categories', todo_app.CATEGORIES_LIST_QUERY, []),
+        ('statistiques', todo_app.STATS_QUERY, [todo_app.STATS_DAYS, todo_app.STATS_DAYS]),
+        ('statut (UPDATE)', *status_update),
+    ]
+
+
+def bench_prepared(args):
+    # Une connexion par mode, mesures alternées requête par requête pour que
+    # la charge de la machine pèse autant sur les deux
+    modes = ('execute', 'prepared')
+    conns = {mode: todo_app.get_db_connection() for mode in modes}
+    cursors = {mode: conn.cursor() for mode, conn in conns.items()}
+    for mode in modes:
+        # Aucune requête préparée au départ
+        cursors[mode].execute('DEALLOCATE ALL')
+        conns[mode]._prepared.clear()
+    results = []
+    try:
+        for name, query, params in prepared_queries():
+            timings = {mode: [] for mode in modes}
+            # Premières exécutions hors mesure (PREPARE, pages en cache)
+            for i in range(args.iterations + 5):
+                for mode in modes:
+                    cur = cursors[mode]
+                    execute = cur.execute_prepared if mode == 'prepared' else cur.execute
+                    start = time.perf_counter()
+                    execute(query, params)
+                    cur.fetchall()
+                    elapsed = (time.perf_counter() - start) * 1000
+                    conns[mode].rollback()
+                    if i >= 5:
+                        timings[mode].append(elapsed)
+            for mode in modes:
+                result = summarize(timings[mode])
+                result.update({'query': name, 'mode': mode})
+                results.append(result)
+    finally:
+        for mode in modes:
+            cursors[mode].close()
+            conns[mode].close()
+
+    print(f"  {'requête':<26} {'execute':>10} {'prepared':>10}   gain p50")
+    by_query = {}
+    for result in results:
+        by_query.setdefault(result['query'], {})[result['mode']] = result
+    for name, modes in by_query.items():
+        before, after = modes['execute']['p50_ms'], modes['prepared']['p50_ms']
+        print(f"  {name:<26} {before:>7} ms {after:>7} ms   {round((1 - after / before) * 100)} %")
+    return {'benchmark': 'prepared', 'iterations': args.iterations, 'results': results}
+
+
+# Mélange de routes par défaut de la commande suite : (méthode, chemin, poids)
+SUITE_MIX = [
+    ('GET', '/', 30),
+    ('GET', '/api/tasks', 30),
+    ('GET', '/api/categories', 15),
+    ('POST', '/tasks', 20),
+    ('POST', '/test-storage', 5),
+]
+
+
+def parse_route(spec):
+    # "GET:/api/tasks=30" -> ('GET', '/api/tasks', 30)
+    route, _, weight = spec.rpartition('=')
+    method, _, path = route.partition(':')
+    if not path.startswith('/') or not weight.isdigit():
+        raise argparse.ArgumentTypeError(f"Route invalide: {spec} (attendu METHODE:/chemin=poids)")
+    return method.upper(), path, int(weight)
+
+
+def drive_mix(base_url, mix, rps, duration, concurrency, seed):
+    # Charge ouverte : les requêtes partent à cadence fixe quel que soit le
+    # temps de réponse, et la latence est mesurée depuis l'instant prévu
+    # (un serveur saturé n'est pas masqué par des clients qui attendent)
+    rng = random.Random(seed)
+    routes = [(method, path) for method, path, _ in mix]
+    weights = [weight for _, _, weight in mix]
+    timings = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(route, scheduled, body):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path = route
+        try:
+            response = local.session.request(method, base_url + path, data=body, timeout=30,
+                                             headers={'Accept': 'application/json'} if method == 'POST' else None)
+            failed = response.status_code >= 400
+        except requests.RequestException:
+            failed = True
+        elapsed = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            timings[route].append(elapsed)
+            errors[route] += failed
+
+    total = int(rps * duration)
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            route = rng.choices(routes, weights)[0]
+            body = None
+            if route == ('POST', '/tasks'):
+                body = {'title': f'Benchmark {i}', 'priority': rng.choice(['low', 'medium', 'medium', 'high'])}
+            executor.submit(send, route, scheduled, body)
+    elapsed = time.perf_counter() - start
+
+    results = []
+    for route in routes:
+        result = summarize(timings[route]) if timings[route] else {'requests': 0}
+        result.update({
+            'method': route[0],
+            'path': route[1],
+            'requests_per_s': round(len(timings[route]) / elapsed, 1),
+            'errors': errors[route],
+        })
+        results.append(result)
+    overall = summarize([t for route in routes for t in timings[route]]) if total else {'requests': 0}
+    overall['requests_per_s'] = round(total / elapsed, 1)
+    overall['errors'] = sum(errors.values())
+    return results, overall
+
+
+def bench_suite(args):
+    base_url = f'http://127.0.0.1:{args.port}'
+    report = {'benchmark': 'suite', 'target_rps': args.rps, 'duration': args.duration,
+              'worker_class': args.worker_class, 'seed': args.seed}
+    if args.tasks:
+        check_target(args.allow_remote)
+        todo_app.init_db()
+        print(f"Remplissage de {args.tasks} tâches...")
+        report['data'] = seed_data(args.tasks, args.categories, args.files, args.seed)
+    env = {} if args.cache else {'CACHE_ENABLED': '0'}
+    if not todo_app.STORAGE_CONNECTION_STRING and not todo_app.STORAGE_ACCOUNT_KEY:
+        print("Stockage non configuré : /test-storage échouera (STORAGE_CONNECTION_STRING=UseDevelopmentStorage=true pour Azurite)")
+
+    print(f"Démarrage de gunicorn ({args.worker_class})...")
+    proc = start_gunicorn('app:app', args.worker_class, args.port, args.workers, env)
+    try:
+        if not wait_for_server(base_url, proc):
+            print("  gunicorn n'a pas démarré")
+            report['error'] = 'startup failed'
+            return report
+        # Échauffement hors mesure (pools, caches, imports paresseux)
+        drive_mix(base_url, args.mix, min(args.rps, 50), 2, args.concurrency, args.seed)
+        results, overall = drive_mix(base_url, args.mix, args.rps, args.duration, args.concurrency, args.seed)
+    finally:
+        stop_server(proc)
+    for result in results:
+        print(f"  {result['method']:>4} {result['path']:<16} {result['requests_per_s']:>8} req/s, "
+              f"p50 {result.get('p50_ms')} ms, p95 {result.get('p95_ms')} ms, p99 {result.get('p99_ms')} ms, "
+              f"{result['errors']} erreurs")
+    print(f"  total {overall['requests_per_s']} req/s (objectif {args.rps}), p99 {overall.get('p99_ms')} ms")
+    report.update({'results': results, 'overall': overall})
+    return report
+
+
+def add_seed_arguments(parser, tasks):
+    parser.add_argument('--tasks', type=int, default=tasks)
+    parser.add_argument('--categories', type=int, default=SEED_CATEGORIES,
+                        help="catégories ajoutées aux quatre par défaut")
+    parser.add_argument('--files', type=int,
+                        help=f"pièces jointes (défaut : {SEED_FILES_PER_TASK} par tâche)")
+    parser.add_argument('--seed', type=int, default=42, help="graine des données et du mélange de routes")
+
+
+def git_commit():
+    try:
+        # Commit mesuré, suffixé -dirty si l'arbre de travail est modifié
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la TodoList Cloud")
+    parser.add_argument('--output', help="fichier JSON de résultats (sinon stdout)")
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="autoriser le remplissage d'une base non locale")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    home = subparsers.add_parser('home', help="latence de la page d'accueil")
+    home.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    home.add_argument('--iterations', type=int, default=20)
+    home.set_defaults(func=bench_home)
+
+    load = subparsers.add_parser('load', help="débit et latence sous gunicorn par modèle de worker")
+    load.add_argument('--worker-classes', nargs='+', default=['sync', 'gthread', 'gevent'])
+    load.add_argument('--paths', nargs='+', default=['/', '/api/tasks', '/health'])
+    load.add_argument('--workers', type=int, help="nombre de workers (sinon selon le CPU)")
+    load.add_argument('--clients', type=int, default=32)
+    load.add_argument('--duration', type=float, default=20)
+    load.add_argument('--port', type=int, default=5055)
+    load.set_defaults(func=bench_load)
+
+    asgi = subparsers.add_parser('async', help="Flask (gthread) face à app_async (uvicorn) sous forte concurrence")
+    asgi.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    asgi.add_argument('--clients', type=int, nargs='+', default=[50, 500, 2000])
+    asgi.add_argument('--workers', type=int, default=2)
+    asgi.add_argument('--duration', type=float, default=20)
+    asgi.add_argument('--port', type=int, default=5056)
+    asgi.add_argument('--cache', action='store_true', help="garder le cache applicatif de app.py")
+    asgi.set_defaults(func=bench_async)
+
+    seed = subparsers.add_parser('seed', help="remplir la base avec des données réalistes et reproductibles")
+    add_seed_arguments(seed, 100000)
+    seed.set_defaults(func=bench_seed)
+
+    suite = subparsers.add_parser('suite', help="mélange de routes réelles à débit cible (charge ouverte)")
+    add_seed_arguments(suite, 0)
+    suite.add_argument('--rps', type=float, default=100, help="requêtes par seconde visées")
+    suite.add_argument('--duration', type=float, default=30)
+    suite.add_argument('--mix', type=parse_route, nargs='+', default=SUITE_MIX,
+                       help="routes pondérées, ex. GET:/api/tasks=30 POST:/tasks=20")
+    suite.add_argument('--concurrency', type=int, default=64, help="requêtes simultanées au plus côté client")
+    suite.add_argument('--worker-class', default='gthread')
+    suite.add_argument('--workers', type=int, help="nombre de workers (sinon selon le CPU)")
+    suite.add_argument('--port', type=int, default=5057)
+    suite.add_argument('--cache', action='store_true', help="garder le cache applicatif")
+    suite.set_defaults(func=bench_suite)
+
+    serialize = subparsers.add_parser('serialize', help="sérialisation JSON de /api/tasks : Python ou PostgreSQL")
+    serialize.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000],
+                           help="tâches par page")
+    serialize.add_argument('--iterations', type=int, default=20)
+    serialize.set_defaults(func=bench_serialize)
+
+    prepared = subparsers.add_parser('prepared', help="latence par requête : texte SQL ou requête préparée")
+    prepared.add_argument('--iterations', type=int, default=200)
+    prepared.set_defaults(func=bench_prepared)
+
+    args = parser.parse_args()
+    report = args.func(args)
+    report['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    report['commit'] = git_commit()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# =============================================================================
+# Configuration Gunicorn - TodoList Cloud (production)
+# =============================================================================
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# - Migrations exécutées une seule fois, dans le master, avant le fork
+# - Application préchargée dans le master (sauf gevent, voir plus bas)
+# - kill -HUP <master> : redémarrage progressif, les nouveaux workers
+#   démarrent avant l'arrêt gracieux des anciens (nouveau code inclus)
+# =============================================================================
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# sync : un worker par requête ; gthread : threads par worker ; gevent : I/O coopératives
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'sync':
+    default_workers = cpu_count * 2 + 1
+    default_threads = 1
+elif worker_class == 'gthread':
+    default_workers = cpu_count + 1
+    default_threads = 4
+else:
+    default_workers = cpu_count
+    default_threads = 1
+
+workers = int(os.getenv('GUNICORN_WORKERS', str(default_workers)))
+threads = int(os.getenv('GUNICORN_THREADS', str(default_threads)))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# Limitation de débit en mémoire : chaque worker applique sa part du débit
+os.environ['RATE_LIMIT_WORKERS'] = str(workers)
+
+# gevent doit patcher threading/socket avant l'import de l'application :
+# pas de préchargement dans le master pour ce type de worker
+preload_app = os.getenv('GUNICORN_PRELOAD', '0' if worker_class == 'gevent' else '1') == '1'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recyclage périodique des workers (fuites mémoire), décalé entre workers
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+# Métriques Prometheus partagées entre workers : répertoire vidé au premier
+# chargement de la configuration (pas lors d'un rechargement HUP)
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), 'todolist-metrics')
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+pidfile = os.getenv('GUNICORN_PIDFILE') or None
+
+
+def migrate(server):
+    import app as todo_app
+    todo_app.init_db()
+    # Aucune connexion du master ne doit être héritée par les workers
+    todo_app.db_pool.closeall()
+    if not server.cfg.preload_app:
+        sys.modules.pop('app', None)
+
+
+def on_starting(server):
+    server.log.info("Migrations dans le master (%s workers %s)", workers, worker_class)
+    migrate(server)
+
+
+def on_reload(server):
+    # HUP : recharger le code dans le master puis migrer avant de lancer
+    # la nouvelle génération de workers
+    if server.cfg.preload_app:
+        # Module servi (app ou app_async) et app.py qu'il importe
+        sys.modules.pop(server.app.app_uri.split(':')[0], None)
+        sys.modules.pop('app', None)
+        server.app.callable = None
+        server.app.wsgi()
+    migrate(server)
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen absent : psycopg2 bloquera la boucle gevent")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -221,6 +221,13 @@ resource "azurerm_postgresql_flexible_server_database" "db" {
   collation = "en_US.utf8"
 }
 
+// Extensions autorisées : pg_trgm pour la recherche approchée des tâches
+resource "azurerm_postgresql_flexible_server_configuration" "extensions" {
+  name      = "azure.extensions"
+  server_id = azurerm_postgresql_flexible_server.db_server.id
+  value     = "PG_TRGM"
+}
+
 // Règle de pare-feu pour permettre l'accès depuis la VM
 resource "azurerm_postgresql_flexible_server_firewall_rule" "vm_access" {
   name             = "AllowVMAccess"
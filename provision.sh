@@ -142,6 +142,8 @@ azure-storage-blob==12.17.0
 python-dotenv==1.0.0
 Werkzeug==2.3.7
 requests==2.31.0
+gunicorn==21.2.0
+prometheus-client==0.17.1
 EOF
     fi
     
@@ -190,7 +192,11 @@ Type=simple
 User=$user
 WorkingDirectory=$app_dir
 Environment=PATH=$app_dir/venv/bin
-ExecStart=/usr/bin/python3 $app_dir/app.py
+Environment=PYTHONUNBUFFERED=1
+ExecStart=/usr/bin/python3 -m gunicorn -c $app_dir/gunicorn.conf.py app:app
+ExecReload=/bin/kill -s HUP \$MAINPID
+KillMode=mixed
+TimeoutStopSec=40
 Restart=always
 RestartSec=10
 